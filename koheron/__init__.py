@@ -1,11 +1,56 @@
+import sys
+
 from .version import __version__
 
-from .koheron import KoheronClient
-from .koheron import command
-from .koheron import ConnectionError
-from .koheron import connect
-from .koheron import load_instrument # deprecated use connect instead
-from .koheron import run_instrument
-from .koheron import upload_instrument
-from .common import Common
+# The public names are imported from the submodules on first use,
+# so that importing koheron (e.g. for the command line interface)
+# does not load numpy and requests.
+_lazy_imports = {
+    'KoheronClient': ('.koheron', 'KoheronClient'),
+    'command': ('.koheron', 'command'),
+    'ConnectionError': ('.http', 'ConnectionError'),
+    'Pipeline': ('.koheron', 'Pipeline'),
+    'connect': ('.koheron', 'connect'),
+    'load_instrument': ('.koheron', 'load_instrument'), # deprecated use connect instead
+    'run_instrument': ('.http', 'run_instrument'),
+    'upload_instrument': ('.http', 'upload_instrument'),
+    'Common': ('.common', 'Common'),
+    'KoheronPool': ('.pool', 'KoheronPool'),
+    'Stream': ('.stream', 'Stream'),
+    'Recording': ('.record', 'Recording'),
+    'load_recording': ('.record', 'load_recording'),
+    'KoheronFleet': ('.fleet', 'KoheronFleet'),
+    'AsyncKoheronClient': ('.aio', 'AsyncKoheronClient'), # Python >= 3.5
+    'async_command': ('.aio', 'command'),
+    'FramePublisher': ('.shm', 'FramePublisher'), # Python >= 3.8
+    'FrameSubscriber': ('.shm', 'FrameSubscriber'),
+}
+
+def __getattr__(name):
+    if name not in _lazy_imports:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+    import importlib
+    module_name, attr = _lazy_imports[name]
+    value = getattr(importlib.import_module(module_name, __name__), attr)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_imports))
+
+# Names only available on recent interpreters: their modules are not imported on older ones
+_min_versions = {
+    'AsyncKoheronClient': (3, 5),
+    'async_command': (3, 5),
+    'FramePublisher': (3, 8),
+    'FrameSubscriber': (3, 8),
+}
 
+if sys.version_info < (3, 7): # No module __getattr__ (PEP 562)
+    for _name in _lazy_imports:
+        if sys.version_info < _min_versions.get(_name, (0,)):
+            continue
+        try:
+            __getattr__(_name)
+        except ImportError:
+            pass
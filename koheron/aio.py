@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+''' asyncio client for koheron-server (Python >= 3.5)
+
+Drivers use the command decorator of this module and coroutine functions:
+
+    class Common(object):
+        def __init__(self, client):
+            self.client = client
+
+        @command()
+        async def get_dna(self):
+            return await self.client.recv_uint64()
+
+    client = await AsyncKoheronClient('192.168.1.100').connect()
+    dna = await Common(client).get_dna()
+
+A command is written to the socket as soon as the method is called, so many
+requests can be outstanding on one connection. The replies are decoded in the
+order the commands were sent.
+'''
+
+import asyncio
+import json
+import socket
+import struct
+import numpy as np
+
+from .koheron import (ConnectionError, KoheronClientBase, check_server_version, bound_command,
+                      check_out_array, OutputTooSmallError, CommandError, is_error_reply, error_reply_length,
+                      is_std_tuple, _header, _dynamic_header, _error_reserved)
+
+# --------------------------------------------
+# Command decorator
+# --------------------------------------------
+
+def command(classname=None, funcname=None):
+    def real_command(func):
+        def wrapper(self, *args, **kwargs):
+            cmd = bound_command(self, func, classname, funcname)
+            parts = cmd.encoder.encode_parts(cmd.device_id, cmd.id, args)
+            return self.client.request(parts, cmd, func, self, args, kwargs)
+        return wrapper
+    return real_command
+
+# --------------------------------------------
+# AsyncKoheronClient
+# --------------------------------------------
+
+class AsyncKoheronClient(KoheronClientBase):
+    def __init__(self, host='', port=36000, unixsock=''):
+        ''' asyncio client for koheron-server
+
+        The connection is opened by the connect() coroutine.
+
+        Args:
+            host: A string with the IP address
+            port: Port of the TCP connection (must be an integer)
+        '''
+        if type(host) != str:
+            raise TypeError('IP address must be a string')
+
+        if type(port) != int:
+            raise TypeError('Port number must be an integer')
+
+        if host == '' and unixsock == '':
+            raise ValueError('Unknown socket type')
+
+        self.host = host
+        self.port = port
+        self.unixsock = unixsock
+        self.is_connected = False
+        self.reader = None
+        self.writer = None
+        # Completed when the reply of the last command sent has been read
+        self.last_reply = None
+        # Serializes writer.drain() (concurrent drains fail before Python 3.10)
+        self.drain_lock = None
+        # Writer closed by close(), awaited by wait_closed()
+        self.closing_writer = None
+
+    async def connect(self):
+        self.drain_lock = asyncio.Lock()
+        if self.host != '':
+            try:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                raise ConnectionError('Failed to connect to {}:{} : {}'.format(self.host, self.port, e))
+            sock = self.writer.get_extra_info('socket')
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.unixsock)
+            except OSError as e:
+                raise ConnectionError('Failed to connect to unix socket address ' + self.unixsock)
+
+        self.is_connected = True
+        await self.check_version()
+        await self.load_devices()
+        return self
+
+    def close(self):
+        ''' Close the connection (see wait_closed) '''
+        if self.writer is not None:
+            self.writer.close()
+            self.closing_writer = self.writer
+            self.writer = None
+        self.is_connected = False
+
+    async def wait_closed(self):
+        ''' Wait until the connection closed by close() is closed '''
+        writer = self.closing_writer
+        if writer is not None and hasattr(writer, 'wait_closed'): # Python >= 3.7
+            self.closing_writer = None
+            try:
+                await writer.wait_closed()
+            except (OSError, ConnectionError):
+                pass
+
+    async def __aenter__(self):
+        if not self.is_connected:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+        await self.wait_closed()
+        return False
+
+    async def check_version(self):
+        self.server_version = await self.call(1, 0, self.recv_string, check_type=False)
+        check_server_version(self.server_version)
+
+    async def load_devices(self):
+        self.set_commands(await self.call(1, 1, self.recv_json, check_type=False))
+
+    def call(self, device_id, cmd_id, recv_func, **kwargs):
+        ''' Send a command without arguments and decode its reply with recv_func '''
+        async def decode(_, **kwargs):
+            return await recv_func(**kwargs)
+        parts = [_header.pack(0, device_id, cmd_id)]
+        return self.request(parts, None, decode, None, (), kwargs)
+
+    # -------------------------------------------------------
+    # Send/Receive
+    # -------------------------------------------------------
+
+    def request(self, parts, cmd, func, driver, args, kwargs):
+        ''' Write a command and return an awaitable on its decoded reply '''
+        self.writer.writelines(parts)
+        previous_reply = self.last_reply
+        reply = asyncio.get_event_loop().create_future()
+        self.last_reply = reply
+        task = asyncio.ensure_future(self.read_reply(previous_reply, reply, cmd, func, driver, args, kwargs))
+        # Cancelling the caller must not interrupt the decoding,
+        # otherwise the following replies would be misread.
+        return asyncio.shield(task)
+
+    async def read_reply(self, previous_reply, reply, cmd, func, driver, args, kwargs):
+        try:
+            async with self.drain_lock:
+                await self.writer.drain()
+            if previous_reply is not None:
+                await previous_reply
+            self.last_command = cmd
+            return await func(driver, *args, **kwargs)
+        finally:
+            reply.set_result(None)
+
+    async def recv_all(self, n_bytes):
+        '''Receive exactly n_bytes bytes.'''
+        try:
+            return await self.reader.readexactly(n_bytes)
+        except asyncio.IncompleteReadError:
+            raise ConnectionError('recv_all: Socket connection closed by peer.')
+
+    async def recv_error_reply(self, data):
+        ''' Receive the rest of the error reply starting with data and raise it '''
+        if len(data) < _dynamic_header.size:
+            data += await self.recv_all(_dynamic_header.size - len(data))
+        n_bytes = error_reply_length(data)
+        if len(data) > n_bytes: # The next reply has been read
+            self.close()
+            raise ConnectionError('Error reply shorter than the expected reply: connection closed.')
+        data += await self.recv_all(n_bytes - len(data))
+        raise CommandError(data[_dynamic_header.size:].decode('utf8').rstrip())
+
+    async def recv_dynamic_length(self):
+        data = await self.recv_all(_dynamic_header.size)
+        reserved, class_id, func_id, length = _dynamic_header.unpack(data)
+        if reserved == _error_reserved:
+            await self.recv_error_reply(data)
+        assert reserved == 0
+        return length
+
+    async def recv_dynamic_payload(self):
+        return await self.recv_all(await self.recv_dynamic_length())
+
+    async def recv(self, fmt='I'):
+        fmt_ = '>IHH' + fmt
+        data = await self.recv_all(struct.calcsize(fmt_))
+        t = struct.unpack(fmt_, data)
+        if t[0] == _error_reserved:
+            await self.recv_error_reply(data)
+        t = t[3:]
+        if len(t) == 1:
+            return t[0]
+        else:
+            return t
+
+    async def recv_uint32(self):
+        self.check_ret_type(['uint32_t', 'unsigned int'])
+        return await self.recv()
+
+    async def recv_uint64(self):
+        self.check_ret_type(['uint64_t', 'unsigned long'])
+        return await self.recv(fmt='Q')
+
+    async def recv_int32(self):
+        self.check_ret_type(['int32_t', 'int'])
+        return await self.recv(fmt='i')
+
+    async def recv_float(self):
+        self.check_ret_type(['float'])
+        return await self.recv(fmt='f')
+
+    async def recv_double(self):
+        self.check_ret_type(['double'])
+        return await self.recv(fmt='d')
+
+    async def recv_bool(self):
+        self.check_ret_type(['bool'])
+        return await self.recv(fmt='?')
+
+    async def recv_string(self, check_type=True):
+        if check_type:
+            self.check_ret_type(['std::string', 'const char *', 'const char*'])
+        return (await self.recv_dynamic_payload()).decode('utf8')
+
+    async def recv_json(self, check_type=True):
+        if check_type:
+            self.check_ret_type(['std::string', 'const char *', 'const char*'])
+        return json.loads(await self.recv_string(check_type=False))
+
+    async def recv_vector(self, dtype='uint32', check_type=True, out=None):
+        '''Receive a numpy array with unknown length.'''
+        if check_type:
+            self.check_ret_vector(dtype)
+        dtype = np.dtype(dtype).newbyteorder('<')
+        buff = await self.recv_dynamic_payload()
+        if out is None:
+            return np.frombuffer(buff, dtype=dtype)
+        check_out_array(out, dtype)
+        if out.nbytes < len(buff):
+            raise OutputTooSmallError('Output array too small. Expected at least {} bytes but has {}.'
+                                      .format(len(buff), out.nbytes), len(buff))
+        out = out.reshape(-1)[:len(buff) // dtype.itemsize]
+        out[:] = np.frombuffer(buff, dtype=dtype)
+        return out
+
+    async def recv_array(self, shape, dtype='uint32', check_type=True, out=None):
+        '''Receive a numpy array with known shape.'''
+        arr_len = int(np.prod(shape))
+        if check_type:
+            self.check_ret_array(dtype, arr_len)
+        dtype = np.dtype(dtype).newbyteorder('<')
+        await self.recv(fmt='')
+        buff = await self.recv_all(dtype.itemsize * arr_len)
+        if out is None:
+            return np.frombuffer(buff, dtype=dtype).reshape(shape)
+        # Checked after the reply is read, to keep the stream in sync
+        check_out_array(out, dtype)
+        if out.size != arr_len:
+            raise ValueError('Invalid output array length. Expected {} but has {}.'
+                             .format(arr_len, out.size))
+        out.reshape(-1)[:] = np.frombuffer(buff, dtype=dtype)
+        return out
+
+    async def recv_tuple(self, fmt=None, check_type=True):
+        tuple_struct = self.last_command.tuple_struct
+        if check_type:
+            try:
+                self.check_ret_tuple(fmt)
+            except TypeError:
+                # Keep the stream in sync
+                if tuple_struct is not None:
+                    await self.recv_tuple_data(tuple_struct)
+                elif is_std_tuple(self.last_command.ret_type):
+                    self.close()
+                raise
+        if fmt is not None and (tuple_struct is None or not check_type):
+            values = await self.recv(fmt.lstrip('@=<>!'))
+            return values if isinstance(values, tuple) else (values,)
+        return tuple_struct.unpack(await self.recv_tuple_data(tuple_struct))
+
+    async def recv_tuple_data(self, tuple_struct):
+        data = await self.recv_all(tuple_struct.size)
+        if is_error_reply(data):
+            await self.recv_error_reply(data)
+        return data
+
+async def connect_all(hosts, port=36000):
+    ''' Connect concurrently to several koheron-servers
+
+    Returns:
+        The list of connected AsyncKoheronClient, in the order of hosts
+
+    If a connection fails, the other clients are closed and the error is raised.
+    '''
+    clients = [AsyncKoheronClient(host, port) for host in hosts]
+    results = await asyncio.gather(*[client.connect() for client in clients], return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        for client in clients:
+            client.close()
+        await asyncio.gather(*[client.wait_closed() for client in clients])
+        raise errors[0]
+    return results
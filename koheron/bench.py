@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+''' Latency and throughput benchmarks against a live koheron-server
+
+A workload calls one command repeatedly and measures each round trip
+(encoding, send, wait, and reception of the raw reply, without decoding).
+'''
+
+import re
+import numpy as np
+
+from .koheron import (cpp_to_struct_fmt, cpp_to_np_types, is_std_array, is_std_vector,
+                      is_std_string, get_std_array_params, get_std_vector_params)
+from .proxy import reply_framing, recv_framed
+from .stats import timer
+
+# Names of the integer arguments giving a number of elements (size, n_pts, num_samples...)
+_size_arg = re.compile(r'(^|_)(n|num|size|len|length|count|npts|pts|points|samples)($|_)')
+
+def make_args(cmd_args, size):
+    ''' Arguments for a command: size for the size-like integers and containers of size elements
+
+    The other integers are set to 1. Returns None if the command does not depend on size.
+    '''
+    args = []
+    sized = False
+    for arg in cmd_args:
+        _type = arg['type'].strip()
+        if _type in cpp_to_struct_fmt:
+            fmt = cpp_to_struct_fmt[_type]
+            if fmt in 'fd':
+                args.append(0.0)
+            elif fmt == '?':
+                args.append(False)
+            elif _size_arg.search(arg.get('name', '').lower()):
+                # Clipped to the range of the argument type
+                args.append(min(size, int(np.iinfo(np.dtype('>' + fmt)).max)))
+                sized = True
+            else:
+                args.append(1)
+        elif is_std_array(_type):
+            params = get_std_array_params(_type)
+            args.append(np.zeros(int(params['N']), dtype=cpp_to_np_types[params['T']]))
+        elif is_std_vector(_type):
+            args.append(np.zeros(size, dtype=cpp_to_np_types[get_std_vector_params(_type)['T']]))
+            sized = True
+        elif is_std_string(_type):
+            args.append('x' * size)
+            sized = True
+        else:
+            raise ValueError('Unsupported type "' + arg['type'] + '"')
+    return args if sized else None
+
+def latency_stats(times):
+    ''' Percentiles (us) and log-binned histogram of the round trip times (s) '''
+    times_us = 1E6 * np.asarray(times)
+    if times_us.size == 0:
+        return {'p50': 0.0, 'p99': 0.0, 'p99.9': 0.0, 'mean': 0.0, 'max': 0.0,
+                'histogram': {'edges_us': [], 'counts': []}}
+    # Times below the timer resolution are in the first bin
+    min_us = max(times_us.min(), 1E-3)
+    edges = 2.0 ** np.arange(np.floor(np.log2(min_us)), np.ceil(np.log2(max(times_us.max(), min_us))) + 2)
+    counts, edges = np.histogram(np.maximum(times_us, edges[0]), bins=edges)
+    return {
+        'p50': float(np.percentile(times_us, 50)),
+        'p99': float(np.percentile(times_us, 99)),
+        'p99.9': float(np.percentile(times_us, 99.9)),
+        'mean': float(times_us.mean()),
+        'max': float(times_us.max()),
+        'histogram': {'edges_us': edges.tolist(), 'counts': counts.tolist()}
+    }
+
+def run_workload(client, device_name, cmd_name, args=(), iterations=1000, warmup=10):
+    device_id, cmd_id, encoder = client.get_encoder(device_name, cmd_name)
+    ret_type = client.cmds_ret_types_list[device_id][cmd_name]
+    framing = reply_framing(ret_type)
+    parts = encoder.encode_parts(device_id, cmd_id, args)
+    bytes_out = sum(len(part) for part in parts)
+
+    times = np.zeros(iterations)
+    bytes_in = 0
+    for i in range(warmup + iterations):
+        start = timer()
+        parts = encoder.encode_parts(device_id, cmd_id, args)
+        client.send_all(parts)
+        reply = recv_framed(client.sock, framing, [])
+        if i >= warmup:
+            times[i - warmup] = timer() - start
+            bytes_in += sum(len(part) for part in reply)
+
+    total_time = times.sum()
+    return {
+        'command': '{}.{}'.format(device_name, cmd_name),
+        'args': [getattr(arg, 'size', arg) if not isinstance(arg, str) else len(arg) for arg in args],
+        'iterations': iterations,
+        'bytes_out': bytes_out * iterations,
+        'bytes_in': bytes_in,
+        'latency_us': latency_stats(times),
+        'commands_per_s': iterations / total_time if total_time > 0 else 0.0,
+        'mb_per_s': (bytes_out * iterations + bytes_in) / total_time / 1E6 if total_time > 0 else 0.0
+    }
+
+def default_workloads(client):
+    ''' Commands of the Benchmarks device returning arrays, or taking array arguments '''
+    recv_cmds, send_cmds = [], []
+    device_id = client.devices_idx.get('Benchmarks')
+    if device_id is None:
+        return recv_cmds, send_cmds
+    for cmd_name, cmd_args in client.cmds_args_list[device_id].items():
+        ret_type = client.cmds_ret_types_list[device_id][cmd_name] or ''
+        if any(is_std_array(arg['type']) or is_std_vector(arg['type']) for arg in cmd_args):
+            send_cmds.append('Benchmarks.' + cmd_name)
+        elif is_std_array(ret_type) or is_std_vector(ret_type):
+            recv_cmds.append('Benchmarks.' + cmd_name)
+    return sorted(recv_cmds), sorted(send_cmds)
+
+def run_benchmarks(client, recv_cmds=(), send_cmds=(), sizes=(1024,), iterations=1000):
+    ''' Run the round trip workload (KServer.get_version) then the recv and send workloads '''
+    results = [dict(run_workload(client, 'KServer', 'get_version', iterations=iterations), workload='latency')]
+    for workload, cmds in (('recv', recv_cmds), ('send', send_cmds)):
+        for cmd in cmds:
+            device_name, cmd_name = cmd.split('.')
+            cmd_args = client.get_ids(device_name, cmd_name)[2]
+            for size in sizes:
+                args = make_args(cmd_args, size)
+                if args is None: # Not depending on size: run once
+                    args = make_args(cmd_args, 0) or []
+                    results.append(dict(run_workload(client, device_name, cmd_name, args, iterations), workload=workload))
+                    break
+                results.append(dict(run_workload(client, device_name, cmd_name, args, iterations), workload=workload))
+    return results
+
+def format_results(results):
+    lines = ['{:<8} {:<36} {:>10} {:>10} {:>10} {:>12} {:>10}'.format(
+             'workload', 'command', 'p50 (us)', 'p99 (us)', 'p99.9 (us)', 'commands/s', 'MB/s')]
+    for r in results:
+        lines.append('{:<8} {:<36} {:>10.1f} {:>10.1f} {:>10.1f} {:>12.0f} {:>10.2f}'.format(
+                     r['workload'], r['command'] + str(r['args']) if r['args'] else r['command'],
+                     r['latency_us']['p50'], r['latency_us']['p99'], r['latency_us']['p99.9'],
+                     r['commands_per_s'], r['mb_per_s']))
+    return '\n'.join(lines)
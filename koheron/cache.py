@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+import json
+import tempfile
+
+def default_cache_dir():
+    cache_home = os.getenv('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.getenv('KOHERON_CACHE_DIR', os.path.join(cache_home, 'koheron'))
+
+class MetadataCache(object):
+    ''' On-disk cache of the metadata downloaded from koheron-server
+
+    The entries (commands table, instrument config...) are stored in one
+    JSON file per key, so they must be JSON serializable. The key identifies the server version and the live
+    instrument, so a cached table is never used with another build.
+    '''
+    def __init__(self, path=None):
+        self.path = path or default_cache_dir()
+
+    def filename(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def load(self, key):
+        ''' Return the dict of entries stored for key (empty if not cached) '''
+        try:
+            with open(self.filename(key)) as f:
+                data = json.load(f)
+        except Exception:
+            return {}
+        if data.get('key') != key:
+            return {}
+        return data['entries']
+
+    def get(self, key, name):
+        return self.load(key).get(name)
+
+    def set(self, key, name, value):
+        entries = self.load(key)
+        entries[name] = value
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            # Atomic write: concurrent processes only see complete files
+            fd, tmp_filename = tempfile.mkstemp(dir=self.path)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'key': key, 'entries': entries}, f)
+            os.rename(tmp_filename, self.filename(key))
+        except (IOError, OSError):
+            pass # The cache is optional
+
+    def clear(self):
+        if os.path.exists(self.path):
+            for filename in os.listdir(self.path):
+                if filename.endswith('.json'):
+                    os.remove(os.path.join(self.path, filename))
+
+def open_cache(cache):
+    ''' MetadataCache from True (default directory), a directory or a MetadataCache (None if disabled) '''
+    if not cache:
+        return None
+    if isinstance(cache, MetadataCache):
+        return cache
+    return MetadataCache(None if cache is True else cache)
@@ -9,6 +9,19 @@ class ConnectionType(object):
         self.host = host
         self.unixsock = unixsock
 
+def _connect(conn_type):
+    ''' Connect through the local proxy of the host if it is running '''
+    from .koheron import KoheronClient, ConnectionError
+    if conn_type.host != "" and conn_type.unixsock == "":
+        from .proxy import default_proxy_path, is_user_socket
+        proxy_path = default_proxy_path(conn_type.host)
+        if is_user_socket(proxy_path):
+            try:
+                return KoheronClient(unixsock=proxy_path)
+            except ConnectionError:
+                pass
+    return KoheronClient(host=conn_type.host, unixsock=conn_type.unixsock, cache=True)
+
 @click.group()
 @click.option('--host', default='', help='Host ip address', envvar='HOST')
 @click.option('--unixsock', default='', help='Unix Socket path', envvar='UNIX_SOCK')
@@ -29,8 +42,7 @@ def version():
 @click.argument('args', nargs=-1, type=click.INT)
 def common(conn_type, cmd, args):
     ''' Call the common commands '''
-    from .koheron import KoheronClient
-    client = KoheronClient(host=conn_type.host, unixsock=conn_type.unixsock)
+    client = _connect(conn_type)
     from .common import Common
     driver = Common(client)
     func = getattr(driver, cmd, None)
@@ -43,8 +55,7 @@ def common(conn_type, cmd, args):
 @click.pass_obj
 def devices(conn_type):
     ''' Get the list of devices '''
-    from .koheron import KoheronClient
-    client = KoheronClient(host=conn_type.host, unixsock=conn_type.unixsock)
+    client = _connect(conn_type)
     click.echo(client.devices_idx)
 
 @cli.command()
@@ -52,14 +63,71 @@ def devices(conn_type):
 @click.option('--device', default=None)
 def commands(conn_type, device):
     ''' Get the list of commands for a specified device '''
-    from .koheron import KoheronClient
-    client = KoheronClient(host=conn_type.host, unixsock=conn_type.unixsock)
+    client = _connect(conn_type)
     if device is None:
         click.echo(client.commands)
     else:
         device_idx = client.devices_idx[device]
         click.echo(client.commands[device_idx])
 
+@cli.command()
+@click.pass_obj
+@click.option('--path', default=None, help='Unix socket path of the proxy')
+def proxy(conn_type, path):
+    ''' Share the connection to the host between local processes '''
+    if conn_type is None or conn_type.host == "":
+        raise click.UsageError('The proxy requires a --host')
+    from .proxy import KoheronProxy
+    proxy = KoheronProxy(host=conn_type.host, path=path)
+    click.echo('Proxy to {} listening on {}'.format(conn_type.host, proxy.path))
+    proxy.serve_forever()
+
+@cli.command()
+@click.pass_obj
+@click.option('-n', '--iterations', default=1000, help='Number of calls per workload')
+@click.option('--sizes', default='1024,65536,1048576', help='Comma separated sizes of the sent and received containers')
+@click.option('--recv', multiple=True, help='DEVICE.COMMAND returning a container (default: Benchmarks device)')
+@click.option('--send', multiple=True, help='DEVICE.COMMAND taking container arguments (default: Benchmarks device)')
+@click.option('--json', 'as_json', is_flag=True, help='Output the results in JSON')
+def bench(conn_type, iterations, sizes, recv, send, as_json):
+    ''' Measure latency and throughput '''
+    import json
+    from .koheron import KoheronClient
+    from .bench import default_workloads, run_benchmarks, format_results
+    if conn_type is None:
+        raise click.UsageError('The benchmark requires a --host or a --unixsock')
+    # Not through the proxy: measure the server
+    client = KoheronClient(host=conn_type.host, unixsock=conn_type.unixsock, cache=True)
+    if not recv and not send:
+        recv, send = default_workloads(client)
+    sizes = [int(size) for size in sizes.split(',')]
+    results = run_benchmarks(client, recv, send, sizes=sizes, iterations=iterations)
+    if as_json:
+        click.echo(json.dumps(results, indent=2))
+    else:
+        click.echo(format_results(results))
+
+@cli.command()
+@click.pass_obj
+@click.argument('cmd')
+@click.argument('path')
+@click.argument('args', nargs=-1, type=click.INT)
+@click.option('-n', '--frames', default=None, type=int, help='Number of frames (default: until interrupted)')
+@click.option('--chunk-frames', default=1024, help='Number of frames by which the file grows')
+def record(conn_type, cmd, path, args, frames, chunk_frames):
+    ''' Record the frames returned by DEVICE.COMMAND to a file '''
+    if '.' not in cmd:
+        raise click.UsageError('The command must be DEVICE.COMMAND')
+    client = _connect(conn_type)
+    device_name, cmd_name = cmd.split('.', 1)
+    method = getattr(client.driver(device_name), cmd_name)
+    recording = client.record(method, path, frames=frames, args=args, chunk_frames=chunk_frames)
+    try:
+        recording.wait()
+    except KeyboardInterrupt:
+        recording.stop()
+    click.echo('Recorded {} frames to {}'.format(recording.n_written, path))
+
 # --------------------------------------------
 # Call HTTP API
 # --------------------------------------------
@@ -68,27 +136,38 @@ def commands(conn_type, device):
 @click.pass_obj
 def live(conn_type):
     ''' Get name and version of live instrument '''
-    from .koheron import live_instrument
+    from .http import live_instrument
     name, version = live_instrument(conn_type.host)
     click.echo('{}-{}'.format(name, version))
 
+def _upload(upload_func, host, instrument_zip, run, force):
+    with click.progressbar(length=1, label='Uploading') as bar:
+        def progress(n_bytes, total_bytes):
+            bar.length = total_bytes
+            bar.update(n_bytes - bar.pos)
+        uploaded = upload_func(host, instrument_zip, run=run, force=force, cache=True, progress=progress)
+    if not uploaded:
+        click.echo('{} already uploaded'.format(instrument_zip))
+
 @cli.command()
 @click.pass_obj
 @click.argument('instrument_zip')
 @click.option('--run', is_flag=True)
-def upload(conn_type, instrument_zip, run):
+@click.option('--force', is_flag=True, help='Upload even if the instrument version is already uploaded')
+def upload(conn_type, instrument_zip, run, force):
     ''' Upload instrument.zip '''
-    from .koheron import upload_instrument
-    upload_instrument(conn_type.host, instrument_zip, run=run)
+    from .http import upload_instrument
+    _upload(upload_instrument, conn_type.host, instrument_zip, run, force)
 
 @cli.command()
 @click.pass_obj
 @click.argument('instrument_zip')
 @click.option('--run', is_flag=True)
-def update(conn_type, instrument_zip, run):
+@click.option('--force', is_flag=True, help='Upload even if the instrument version is already uploaded')
+def update(conn_type, instrument_zip, run, force):
     ''' Update instrument.zip '''
-    from .koheron import update_instrument
-    update_instrument(conn_type.host, instrument_zip, run=run)
+    from .http import update_instrument
+    _upload(update_instrument, conn_type.host, instrument_zip, run, force)
 
 @cli.command()
 @click.pass_obj
@@ -97,9 +176,34 @@ def update(conn_type, instrument_zip, run):
 @click.option('--restart', is_flag=True)
 def run(conn_type, instrument_name, instrument_version, restart):
     ''' Run a given instrument '''
-    from .koheron import run_instrument
+    from .http import run_instrument
     run_instrument(conn_type.host, instrument_name, instrument_version, restart=restart)
 
+@cli.command()
+@click.argument('instrument_zip')
+@click.option('--hosts', multiple=True, required=True, help='Hosts ip addresses (comma separated or repeated)')
+@click.option('--run', is_flag=True)
+@click.option('--no-update', is_flag=True, help='Do not delete the other local versions of the instrument')
+@click.option('--force', is_flag=True, help='Upload even if the instrument version is already uploaded')
+@click.option('--workers', default=8, help='Maximum number of concurrent deployments')
+@click.option('--retries', default=2, help='Number of retries per host')
+@click.option('--timeout', default=60.0, help='Timeout of the HTTP requests (s)')
+def deploy(instrument_zip, hosts, run, no_update, force, workers, retries, timeout):
+    ''' Upload instrument.zip to several hosts '''
+    from .deploy import deploy
+    hosts = [host for hosts_ in hosts for host in hosts_.split(',') if host]
+    def report(result):
+        if result.ok:
+            click.echo('{}: OK, {} ({:.1f} s)'.format(result.host, 'uploaded' if result.uploaded else 'already uploaded',
+                                                     result.elapsed))
+        else:
+            click.echo('{}: FAILED after {} attempts: {}'.format(result.host, result.attempts, result.error))
+    results = deploy(hosts, instrument_zip, update=not no_update, run=run, force=force, cache=True,
+                     workers=workers, retries=retries, timeout=timeout, callback=report)
+    n_failed = sum(not result.ok for result in results.values())
+    if n_failed > 0:
+        raise click.ClickException('Deployment failed on {} of {} hosts'.format(n_failed, len(results)))
+
 # --------------------------------------------
 # Call koheron-sdk
 # --------------------------------------------
@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import collections
+import numpy as np
+
 from .koheron import command
 
 class MemMap(object):
@@ -15,8 +18,37 @@ class MemMap(object):
         msg = 'map {} at offset {} and range {}'
         print(msg.format(self.name, self.offset, self.range))
 
+# Status registers wider than 32 bits
+sts_formats = {'bitstream_id': ('<u4', 8), 'dna': '<u8'}
+
+def register_dtype(offsets, size, formats={}):
+    ''' Structured dtype of a register map of size bytes, with a field per register (uint32 by default) '''
+    names = sorted(offsets, key=lambda name: offsets[name])
+    return np.dtype({'names': names, 'formats': [formats.get(name, '<u4') for name in names],
+                     'offsets': [offsets[name] for name in names], 'itemsize': size})
+
+class BitField(object):
+    ''' Bits [lsb, lsb + width) of a 32 bits register, decoded and encoded on arrays of register values '''
+    def __init__(self, name, lsb, width):
+        if lsb < 0 or width < 1 or lsb + width > 32:
+            raise ValueError('Invalid bit field {}: lsb {} and width {}'.format(name, lsb, width))
+        self.name = name
+        self.lsb = np.uint32(lsb)
+        self.width = width
+        self.mask = np.uint32(((1 << width) - 1) << lsb)
+
+    def decode(self, values):
+        return (np.asarray(values, dtype='uint32') & self.mask) >> self.lsb
+
+    def encode(self, values, field):
+        ''' Values with the bit field set to field '''
+        field = np.asarray(field, dtype='uint32')
+        if self.width < 32 and (field >> np.uint32(self.width)).any():
+            raise ValueError('Value does not fit in the {} bits of {}'.format(self.width, self.name))
+        return (np.asarray(values, dtype='uint32') & ~self.mask) | (field << self.lsb)
+
 class MemoryConfig(object):
-     def __init__(self, dic):
+     def __init__(self, dic, bitfields=None):
         # List of memory maps
         self.mmaps = {}
         # Config and Status registers
@@ -38,10 +70,203 @@ class MemoryConfig(object):
         self.sts['bitstream_id'] = 0
         self.sts['dna'] = 4 * 8
 
+        # Structured dtypes of the config and status maps (see RegisterSnapshot)
+        self.cfg_dtype = register_dtype(self.cfg, self.mmaps['config'].range) if 'config' in self.mmaps else None
+        self.sts_dtype = (register_dtype(self.sts, self.mmaps['status'].range, sts_formats)
+                          if 'status' in self.mmaps else None)
+
+        # Bit fields by register: {register: {field: [lsb, width]}}
+        self.bitfields = {}
+        definitions = dict(dic.get('bitfields', {}))
+        definitions.update(bitfields or {})
+        for register, fields in definitions.items():
+            self.add_bitfields(register, fields)
+
+     def offset(self, register):
+        ''' Byte offset of a status or config register '''
+        if register in self.sts:
+            return self.sts[register]
+        return self.cfg[register]
+
+     def add_bitfields(self, register, fields):
+        self.offset(register)
+        fields = sorted(fields.items(), key=lambda field: field[1][0])
+        self.bitfields[register] = collections.OrderedDict(
+            (name, BitField(name, lsb, width)) for name, (lsb, width) in fields)
+
+     def decode(self, register, data):
+        ''' Bit fields of register in data
+
+        data is a map returned by cfg_read_all or sts_read_all, or a stack of
+        them (shape (..., words)). Returns a dict of the field arrays.
+        '''
+        values = np.asarray(data)[..., self.offset(register) // 4]
+        return collections.OrderedDict((name, field.decode(values))
+                                       for name, field in self.bitfields[register].items())
+
+     def encode(self, register, value=0, **fields):
+        ''' Value(s) of register with the given bit fields set
+
+            cfg['control'] = mem_cfg.encode('control', cfg['control'], enable=1, mode=2)
+        '''
+        bitfields = self.bitfields[register]
+        for name, field in fields.items():
+            value = bitfields[name].encode(value, field)
+        return np.asarray(value, dtype='uint32')[()]
+
+def register_records(data, dtype):
+    ''' Named view on register maps
+
+    data is the uint32 array returned by cfg_read_all or sts_read_all, or a stack
+    of them (shape (..., words)). The view has a record per map:
+
+        records = register_records(np.stack(snapshots), common.mem_cfg.sts_dtype)
+        records['dna'] # Array of the DNA in all the snapshots
+    '''
+    data = np.ascontiguousarray(data, dtype='<u4')
+    return data.view(dtype)[..., 0]
+
+class RegisterSnapshot(object):
+    ''' Registers of the config or status map read in a single call
+
+        sts = common.sts_snapshot()
+        sts['dna'], sts.dna
+        sts.as_dict()
+
+    data is the raw uint32 array of the map and values its record (see register_records).
+    '''
+    def __init__(self, data, dtype):
+        self.data = data
+        self.values = register_records(data, dtype)
+
+    def keys(self):
+        return list(self.values.dtype.names)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.values.dtype.names)
+
+    def __contains__(self, name):
+        return name in self.values.dtype.names
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    def __getattr__(self, name):
+        values = self.__dict__.get('values')
+        if values is None or name not in values.dtype.names:
+            raise AttributeError(name)
+        return values[name]
+
+    def items(self):
+        return [(name, self.values[name]) for name in self.keys()]
+
+    def as_dict(self):
+        return dict((name, self.values[name].tolist()) for name in self.keys())
+
+    def __repr__(self):
+        return 'RegisterSnapshot({})'.format(self.as_dict())
+
+class ConfigCache(object):
+    ''' Write-back shadow of the config registers, seeded with cfg_read_all
+
+        with common.cfg_cache() as cfg:
+            cfg['dac0'] = 100
+            cfg.write(common.mem_cfg.cfg['dac1'], 200)
+        # The changed registers are written in a single send at exit
+
+    Registers are given by name or byte offset. A write of the value the register
+    already has on the board is dropped and the writes to the same register are
+    coalesced: flush() sends one cfg_write per changed register, in a pipeline.
+    The context flushes on exit unless an exception was raised.
+
+    In a pipeline already open on the client, the writes are only queued: they
+    are taken as done on the board once the pipeline is executed.
+
+    The shadow assumes the config registers are only written through this cache.
+    '''
+    def __init__(self, common):
+        self.common = common
+        self.refresh()
+
+    def refresh(self):
+        ''' Reload the registers from the board, discarding the pending writes '''
+        self.board = self.common.cfg_read_all().copy() # Values on the board
+        self.values = self.board.copy() # Values including the pending writes
+        self.dirty = collections.OrderedDict() # Word indices of the pending writes
+        self.queued = {} # Value, result and pipeline of the writes queued in an open pipeline, by word index
+
+    def word(self, register):
+        if isinstance(register, (int, np.integer)):
+            if register % 4 != 0 or not 0 <= register < 4 * self.values.size:
+                raise ValueError('Invalid config register offset {}'.format(register))
+            return register // 4
+        return self.common.mem_cfg.cfg[register] // 4
+
+    def sync(self):
+        ''' Take the writes queued in an executed pipeline as done on the board '''
+        for word, (value, result, pipe) in list(self.queued.items()):
+            if result.done():
+                self.board[word] = value
+                if self.values[word] == value:
+                    self.dirty.pop(word, None)
+            elif self.common.client.pipe is pipe:
+                continue # Not executed yet
+            # Else the pipeline failed: the write stays pending
+            del self.queued[word]
+
+    def write(self, register, value):
+        word = self.word(register)
+        if not 0 <= value <= 0xffffffff:
+            raise ValueError('Invalid config register value {}: not a uint32'.format(value))
+        self.sync()
+        self.values[word] = value
+        if self.values[word] == self.board[word]:
+            self.dirty.pop(word, None)
+        else:
+            self.dirty[word] = True
+
+    def read(self, register):
+        ''' Value of the register, including the pending writes '''
+        return self.values[self.word(register)]
+
+    __setitem__ = write
+    __getitem__ = read
+
+    def flush(self):
+        ''' Write the changed registers and return the number of cfg_write sent (or queued) '''
+        self.sync()
+        words = list(self.dirty)
+        if not words:
+            return 0
+        client = self.common.client
+        if client.pipe is not None:
+            # Queued in the pipeline already open on the client
+            for word in words:
+                value = int(self.values[word])
+                self.queued[word] = (value, self.common.cfg_write(4 * word, value), client.pipe)
+            return len(words)
+        with client.pipeline():
+            for word in words:
+                self.common.cfg_write(4 * word, int(self.values[word]))
+        self.board[words] = self.values[words]
+        self.dirty.clear()
+        return len(words)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        return False
+
 class Common(object):
-    def __init__(self, client):
+    def __init__(self, client, bitfields=None):
         self.client = client
-        self.mem_cfg = MemoryConfig(self.get_instrument_config())
+        self.mem_cfg = MemoryConfig(self.client.cached('instrument_config', self.get_instrument_config), bitfields)
 
     @command()
     def get_bitstream_id(self):
@@ -83,16 +308,28 @@ class Common(object):
 
     @command()
     def cfg_read_all(self):
-        return self.client.recv_array(self.mem_cfg.mmaps['config'].range/4, dtype='uint32')
+        return self.client.recv_array(self.mem_cfg.mmaps['config'].range // 4, dtype='uint32')
 
     @command()
     def sts_read_all(self):
-        return self.client.recv_array(self.mem_cfg.mmaps['status'].range/4, dtype='uint32')
+        return self.client.recv_array(self.mem_cfg.mmaps['status'].range // 4, dtype='uint32')
 
     @command()
     def get_instrument_config(self):
         return self.client.recv_json()
 
+    def cfg_snapshot(self):
+        ''' Config registers read in a single call (see RegisterSnapshot) '''
+        return RegisterSnapshot(self.cfg_read_all(), self.mem_cfg.cfg_dtype)
+
+    def cfg_cache(self):
+        ''' Write-back cache of the config registers (see ConfigCache) '''
+        return ConfigCache(self)
+
+    def sts_snapshot(self):
+        ''' Status registers read in a single call (see RegisterSnapshot) '''
+        return RegisterSnapshot(self.sts_read_all(), self.mem_cfg.sts_dtype)
+
     def status(self):
        print('bitstream id = {}'.format(self.get_bitstream_id()))
        print('DNA = {}'.format(self.get_dna()))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+''' Concurrent deployment of an instrument to many boards over the HTTP API
+
+    results = deploy(['192.168.1.10', '192.168.1.11'], 'led_blinker-0691eed.zip', run=True)
+    for host, result in results.items():
+        print(host, result.ok, result.error)
+
+Each host has its own requests.Session, so its HTTP connection is reused
+across the delete, upload and run requests. At most workers hosts are
+deployed at the same time. A failed host deployment is retried.
+The upload is skipped on the hosts that already have the instrument version
+(see upload_instrument).
+'''
+
+import time
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .http import update_instrument, upload_instrument
+
+class TimeoutSession(requests.Session):
+    ''' Session with a default timeout (s) on all requests '''
+    def __init__(self, timeout=None):
+        super(TimeoutSession, self).__init__()
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super(TimeoutSession, self).request(*args, **kwargs)
+
+class DeployResult(object):
+    def __init__(self, host):
+        self.host = host
+        self.ok = False
+        self.uploaded = False
+        self.error = None
+        self.attempts = 0
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        return {
+            'host': self.host,
+            'ok': self.ok,
+            'uploaded': self.uploaded,
+            'error': None if self.error is None else str(self.error),
+            'attempts': self.attempts,
+            'elapsed': self.elapsed
+        }
+
+    def __repr__(self):
+        return 'DeployResult({!r}, ok={}, attempts={})'.format(self.host, self.ok, self.attempts)
+
+def deploy_host(host, filename, update=True, run=False, force=False, cache=None, retries=2, retry_delay=1.0,
+                timeout=60, session=None):
+    ''' Deploy filename to host, retrying on connection and HTTP errors
+
+    If update is True, the local versions of the instrument are deleted before the upload.
+    '''
+    result = DeployResult(host)
+    session = session or TimeoutSession(timeout)
+    start = time.time()
+    while True:
+        result.attempts += 1
+        try:
+            deploy_func = update_instrument if update else upload_instrument
+            result.uploaded = deploy_func(host, filename, run=run, session=session, force=force, cache=cache)
+            result.ok = True
+            result.error = None
+            break
+        except (requests.RequestException, ValueError) as e:
+            result.error = e
+            if result.attempts > retries:
+                break
+            time.sleep(retry_delay * 2 ** (result.attempts - 1))
+    session.close()
+    result.elapsed = time.time() - start
+    return result
+
+def deploy(hosts, filename, update=True, run=False, force=False, cache=None, workers=8, retries=2,
+           retry_delay=1.0, timeout=60, callback=None):
+    ''' Deploy filename to all hosts concurrently
+
+    Returns a dict of DeployResult by host. If provided, callback(result) is called as soon
+    as a host deployment ends.
+    '''
+    def deploy_one(host):
+        result = deploy_host(host, filename, update=update, run=run, force=force, cache=cache,
+                             retries=retries, retry_delay=retry_delay, timeout=timeout)
+        if callback is not None:
+            callback(result)
+        return result
+
+    hosts = list(hosts)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(hosts)))) as executor:
+        results = list(executor.map(deploy_one, hosts))
+    return dict((result.host, result) for result in results)
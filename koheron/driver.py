@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+''' Driver classes generated from the commands table
+
+    tests = client.driver('Tests')
+    tests.set_float(12.5)
+
+Each method sends its arguments with the encoder of the command and
+decodes the reply with a decoder selected from the return type, so no
+@command stub needs to be written. The generated classes are shared by
+the clients with the same device table (same instrument version).
+'''
+
+import json
+
+from .koheron import (command, cpp_to_struct_fmt, cpp_to_np_types, is_std_array, is_std_vector,
+                      is_std_tuple, get_std_array_params, get_std_vector_params, TupleStruct)
+
+def make_decoder(ret_type):
+    ''' Function decoding the reply of a command returning ret_type: decode(client, out=None) '''
+    ret_type = (ret_type or '').strip()
+    if ret_type in ('', 'void'):
+        return lambda client, out=None: None
+    if ret_type in cpp_to_struct_fmt:
+        fmt = cpp_to_struct_fmt[ret_type]
+        return lambda client, out=None: client.recv(fmt)
+    if is_std_array(ret_type):
+        params = get_std_array_params(ret_type)
+        shape, dtype = int(params['N']), cpp_to_np_types[params['T']]
+        return lambda client, out=None: client.recv_array(shape, dtype=dtype, check_type=False, out=out)
+    if is_std_vector(ret_type):
+        dtype = cpp_to_np_types[get_std_vector_params(ret_type)['T']]
+        return lambda client, out=None: client.recv_vector(dtype=dtype, check_type=False, out=out)
+    if ret_type in ('std::string', 'const char *', 'const char*'):
+        return lambda client, out=None: client.recv_string(check_type=False)
+    if is_std_tuple(ret_type):
+        reply = TupleStruct(ret_type)
+        return lambda client, out=None: reply.unpack(client.recv_tuple_data(reply))
+    raise ValueError('Unsupported return type "' + ret_type + '"')
+
+def make_method(device_name, cmd):
+    try:
+        decode = make_decoder(cmd.get('ret_type'))
+    except ValueError as e:
+        # The other commands of the device can still be called
+        error = '{}::{}: {}'.format(device_name, cmd['name'], e)
+        def method(self, *args, **kwargs):
+            raise ValueError(error)
+    else:
+        def method(self, *args, **kwargs):
+            return decode(self.client, **kwargs)
+        method = command(classname=device_name, funcname=cmd['name'])(method)
+    method.__name__ = str(cmd['name'])
+    method.__doc__ = '{} {}({})'.format(cmd.get('ret_type') or 'void', cmd['name'],
+                                         ', '.join('{} {}'.format(arg['type'], arg['name']) for arg in cmd['args']))
+    return method
+
+def make_driver_class(device):
+    ''' Driver class of a device of the commands table '''
+    namespace = {'__doc__': 'Driver of the {} device (generated from the commands table)'.format(device['class'])}
+    for cmd in device['functions']:
+        namespace[str(cmd['name'])] = make_method(device['class'], cmd)
+
+    def __init__(self, client):
+        self.client = client
+    namespace['__init__'] = __init__
+    return type(str(device['class']), (object,), namespace)
+
+# Generated classes indexed by device table
+_driver_classes = {}
+
+def driver_class(device):
+    key = json.dumps(device, sort_keys=True)
+    cls = _driver_classes.get(key)
+    if cls is None:
+        cls = _driver_classes[key] = make_driver_class(device)
+    return cls
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+''' Same command on many boards running the same instrument
+
+    fleet = KoheronFleet(['192.168.1.10', '192.168.1.11'], timeout=1.0)
+    dna = fleet.driver(Common).get_dna() # {host: dna}
+    frames = fleet.call(Adc, 'get_adc', stack=True) # numpy array (host, ...)
+
+The command is called in a pipeline of each board from a thread pool, so
+the boards process it concurrently and a call takes about one round trip
+instead of one per board.
+
+A board that fails (connection error, no reply before the timeout, error
+decoding the reply) is closed, recorded in errors and left out of the next
+calls until reconnect().
+'''
+
+import collections
+import socket
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .koheron import KoheronClient, ConnectionError
+
+def parse_host(host, port=36000):
+    ''' 'host' or 'host:port' '''
+    if ':' in host:
+        host, port = host.rsplit(':', 1)
+    return host, int(port)
+
+class FleetDriver(object):
+    ''' Driver whose methods are called on all the boards of a fleet (see KoheronFleet.call) '''
+    def __init__(self, fleet, cls):
+        self.fleet = fleet
+        self.cls = cls
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            return self.fleet.call(self.cls, name, *args, **kwargs)
+        return call
+
+class KoheronFleet(object):
+    ''' Connections to several koheron-servers
+
+    Args:
+        hosts: List of 'host' or 'host:port'
+        port: Default port
+        timeout: Maximum time (s) to connect to a host and to get the replies of a call
+        client_kwargs: Passed to KoheronClient (e.g. cache)
+    '''
+    def __init__(self, hosts, port=36000, timeout=None, **client_kwargs):
+        self.hosts = list(hosts)
+        self.port = port
+        self.timeout = timeout
+        self.client_kwargs = client_kwargs
+        self.clients = collections.OrderedDict()
+        self.errors = {}
+        # Driver instances indexed by (host, driver class)
+        self.drivers = {}
+        self.executor = ThreadPoolExecutor(max_workers=max(1, min(32, len(self.hosts))))
+        self.connect(self.hosts)
+
+    def connect(self, hosts):
+        ''' Open the connections to hosts concurrently '''
+        def connect_one(host):
+            host_, port = parse_host(host, self.port)
+            return KoheronClient(host_, port, timeout=self.timeout, **self.client_kwargs)
+
+        futures = [(host, self.executor.submit(connect_one, host)) for host in hosts]
+        for host, future in futures:
+            try:
+                self.clients[host] = future.result()
+                self.errors.pop(host, None)
+            except ConnectionError as e:
+                self.errors[host] = e
+        self.clients = collections.OrderedDict((host, self.clients[host]) for host in self.hosts
+                                               if host in self.clients)
+
+    def reconnect(self):
+        ''' Reconnect to the failed hosts '''
+        self.connect([host for host in self.hosts if host in self.errors])
+
+    def fail(self, host, error):
+        self.errors[host] = error
+        client = self.clients.pop(host)
+        client.sock.close()
+        for key in [key for key in self.drivers if key[0] == host]:
+            del self.drivers[key]
+
+    def driver(self, cls):
+        return FleetDriver(self, cls)
+
+    def get_driver(self, host, cls):
+        key = (host, cls)
+        if key not in self.drivers:
+            self.drivers[key] = cls(self.clients[host])
+        return self.drivers[key]
+
+    def call_host(self, driver, method_name, args, kwargs):
+        ''' Call method_name of driver in a pipeline of its client, bounded by the timeout
+
+        Returns the result and True, or the error and False if the call failed
+        before anything was sent (e.g. invalid arguments).
+        '''
+        client = driver.client
+        with client.pipeline():
+            try:
+                result = getattr(driver, method_name)(*args, **kwargs)
+            except Exception as e:
+                # The pipeline is not executed: the connection is still in sync
+                return e, False
+            client.sock.settimeout(self.timeout)
+        client.sock.settimeout(None)
+        return result.result(), True
+
+    def call(self, cls, method_name, *args, **kwargs):
+        ''' Call the @command method_name of driver class cls on all the connected hosts
+
+        Returns an OrderedDict of the results by host, in the order of hosts.
+        The hosts that fail are left out (see errors). If stack is True, the
+        results are stacked in a numpy array instead (empty if no host replied).
+        Errors other than connection errors are raised once all the hosts have replied.
+        The hosts are not failed on errors raised before sending (e.g. invalid arguments).
+        '''
+        stack = kwargs.pop('stack', False)
+        futures = [(host, self.executor.submit(self.call_host, self.get_driver(host, cls), method_name, args, kwargs))
+                   for host in self.clients]
+        results = collections.OrderedDict()
+        error = None
+        for host, future in futures:
+            try:
+                result, sent = future.result()
+            except Exception as e:
+                self.fail(host, e)
+                if not isinstance(e, (ConnectionError, socket.error)) and error is None:
+                    error = e
+                continue
+            if sent:
+                results[host] = result
+            elif error is None:
+                error = result
+        if error is not None:
+            raise error
+
+        if stack:
+            return np.stack(list(results.values())) if results else np.array([])
+        return results
+
+    def close(self):
+        for client in self.clients.values():
+            client.sock.close()
+        self.clients.clear()
+        self.drivers.clear()
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
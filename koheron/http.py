@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import io
+import hashlib
+import uuid
+import requests
+
+ConnectionError = requests.ConnectionError
+
+# --------------------------------------------
+# HTTP API
+# --------------------------------------------
+
+# The functions accept an optional requests.Session,
+# to reuse its connection to the host between calls.
+
+# Default timeout (s) of the API requests, unless set by the session (see deploy.TimeoutSession)
+api_timeout = 30
+
+def api_get(host, path, session=None, timeout=None):
+    if timeout is None and getattr(session, 'timeout', None) is None:
+        timeout = api_timeout
+    kwargs = {} if timeout is None else {'timeout': timeout}
+    r = (session or requests).get('http://{}/api/instruments/{}'.format(host, path), **kwargs)
+    r.raise_for_status()
+    return r
+
+def live_instrument(host, session=None, timeout=None):
+    live_instrument = api_get(host, 'live', session, timeout=timeout).json()
+    name = live_instrument['name']
+    version = live_instrument['sha']
+    return name, version
+
+def local_instruments(host, session=None):
+    ''' Dict of the versions in the local store, by instrument name '''
+    return api_get(host, 'local', session).json()
+
+def get_name_version(filename):
+    # filename = 'path/to/name-version.zip'
+    tokens = os.path.basename(filename).split('.')[0].split('-')
+    name = '-'.join(tokens[:-1])
+    version = tokens[-1]
+    return name, version
+
+def upload_instrument(host, filename, run=False, session=None, force=False, cache=None, progress=None):
+    ''' Upload filename to the local store of host
+
+    The upload is skipped if the instrument version is already in the store (see is_uploaded),
+    unless force is True. If run is True, the instrument is run, unless it is already live
+    and has not been uploaded again. Returns True if the file has been uploaded.
+
+    Args:
+        cache: Record of the content hashes of the uploaded files (see open_cache)
+        progress: Called with (bytes sent, total bytes) during the upload
+    '''
+    uploaded = force or not is_uploaded(host, filename, session=session, cache=cache)
+    return _upload_and_run(host, filename, uploaded, run=run, session=session, cache=cache, progress=progress)
+
+def _upload_and_run(host, filename, upload, run=False, session=None, cache=None, progress=None):
+    ''' Upload filename if upload is True, then run it (see upload_instrument) '''
+    name, version = get_name_version(filename)
+    if upload:
+        body = MultipartFile(filename, filename, progress=progress)
+        try:
+            url = 'http://{}/api/instruments/upload'.format(host)
+            r = (session or requests).post(url, data=body, headers={'Content-Type': body.content_type})
+            r.raise_for_status()
+        finally:
+            body.close()
+        record_upload(host, filename, cache)
+    if run and upload:
+        api_get(host, 'run/{}/{}'.format(name, version), session)
+    elif run:
+        run_instrument(host, name, version, session=session)
+    return upload
+
+def delete_instrument(host, name, version, session=None):
+    api_get(host, 'delete/{}/{}'.format(name, version), session)
+
+def update_instrument(host, filename, run=False, session=None, force=False, cache=None, progress=None):
+    ''' Delete the other versions of the instrument from the local store of host, then upload filename
+
+    Returns True if the file has been uploaded (see upload_instrument).
+    '''
+    name, version = get_name_version(filename)
+    versions = local_instruments(host, session).get(name, [])
+    present = not force and is_uploaded(host, filename, versions=versions, cache=cache)
+    for version_ in versions:
+        if version_ != version or not present:
+            delete_instrument(host, name, version_, session)
+    return _upload_and_run(host, filename, not present, run=run, session=session, cache=cache, progress=progress)
+
+def run_instrument(host, name=None, version=None, restart=False, session=None):
+    instrument_running = False
+    instrument_in_store = False
+
+    live_name, live_version = live_instrument(host, session)
+    name_ok = (live_name == name)
+    version_ok = ((version is None) or (live_version == version))
+    
+    if (name is None) or (name_ok and version_ok): # Instrument already running
+        name, version = live_name, live_version
+        instrument_running = True
+
+    if not instrument_running: # Find the instrument in the local store:
+        instruments = local_instruments(host, session)
+        versions = instruments.get(name)
+        if versions is None:
+            raise ValueError('Instrument %s not found' % name)
+
+        if version is None:
+            # Use the first version found by default
+            version = versions[0]
+        if version in versions:
+            instrument_in_store = True
+        else:
+            raise ValueError('Did not found version {} for instrument {}'.format(version, name))
+
+    if instrument_in_store or (instrument_running and restart):
+        api_get(host, 'run/{}/{}'.format(name, version), session)
+
+    return name, version
+
+# --------------------------------------------
+# Uploads
+# --------------------------------------------
+
+def file_hash(filename, block_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def upload_cache_key(host):
+    return 'uploads/{}'.format(host)
+
+def record_upload(host, filename, cache):
+    from .cache import open_cache
+    cache = open_cache(cache)
+    if cache is not None:
+        name, version = get_name_version(filename)
+        cache.set(upload_cache_key(host), '{}-{}'.format(name, version), file_hash(filename))
+
+def is_uploaded(host, filename, session=None, cache=None, versions=None):
+    ''' True if the instrument version of filename is in the local store of host
+
+    If the upload of this version has been recorded in the cache, the content hash
+    of filename must also match (the file has been rebuilt otherwise).
+    '''
+    name, version = get_name_version(filename)
+    if versions is None:
+        versions = local_instruments(host, session).get(name, [])
+    if version not in versions:
+        return False
+    from .cache import open_cache
+    cache = open_cache(cache)
+    if cache is None:
+        return True
+    uploaded_hash = cache.get(upload_cache_key(host), '{}-{}'.format(name, version))
+    return uploaded_hash is None or uploaded_hash == file_hash(filename)
+
+class MultipartFile(object):
+    ''' multipart/form-data body of a file upload, read by blocks
+
+    The file is streamed instead of being loaded in memory. If provided,
+    progress(bytes read, total bytes) is called after each block.
+    '''
+    def __init__(self, field, filename, progress=None):
+        self.boundary = uuid.uuid4().hex
+        head = ('--{}\r\nContent-Disposition: form-data; name="{}"; filename="{}"\r\n'
+                'Content-Type: application/octet-stream\r\n\r\n'
+                .format(self.boundary, field, os.path.basename(filename)).encode('utf8'))
+        tail = '\r\n--{}--\r\n'.format(self.boundary).encode('utf8')
+        self.file = open(filename, 'rb')
+        self.parts = [io.BytesIO(head), self.file, io.BytesIO(tail)]
+        self.length = len(head) + os.path.getsize(filename) + len(tail)
+        self.n_read = 0
+        self.progress = progress
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary={}'.format(self.boundary)
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        data = b''
+        while self.parts and (size < 0 or len(data) < size):
+            block = self.parts[0].read(-1 if size < 0 else size - len(data))
+            if not block:
+                self.parts.pop(0)
+                continue
+            data += block
+        self.n_read += len(data)
+        if self.progress is not None and data:
+            self.progress(self.n_read, self.length)
+        return data
+
+    def close(self):
+        self.file.close()
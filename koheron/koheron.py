@@ -3,80 +3,31 @@
 
 import socket
 import struct
+import re
 import numpy as np
 import string
 import json
-import requests
 import time
+import threading
+import hashlib
+import numbers
+import logging
 
 from .version import __version__
+from .stats import StatsRecorder, prometheus_text, timer
+from .http import ConnectionError
+from .http import live_instrument, get_name_version, upload_instrument, update_instrument, run_instrument
 
-ConnectionError = requests.ConnectionError
+logger = logging.getLogger(__name__)
 
 # --------------------------------------------
-# HTTP API
+# Connection
 # --------------------------------------------
 
-def live_instrument(host):
-    live_instrument = requests.get('http://{}/api/instruments/live'.format(host)).json()
-    name = live_instrument['name']
-    version = live_instrument['sha']
-    return name, version
-
-def get_name_version(filename):
-    # filename = 'name-version.zip'
-    tokens = filename.split('.')[0].split('-')
-    name = '-'.join(tokens[:-1])
-    version = tokens[-1]
-    return name, version
-
-def upload_instrument(host, filename, run=False):
-    with open(filename, 'rb') as fileobj:
-        url = 'http://{}/api/instruments/upload'.format(host)
-        r = requests.post(url, files={filename: fileobj})
-    if run:
-        name, version = get_name_version(filename)
-        r = requests.get('http://{}/api/instruments/run/{}/{}'.format(host, name, version))
-
-def update_instrument(host, filename, run=False):
-    name, version = get_name_version(filename)
-    local_instruments = requests.get('http://{}/api/instruments/local'.format(host)).json()
-    for version in local_instruments[name]:
-        r = requests.get('http://{}/api/instruments/delete/{}/{}'.format(host, name, version))
-    upload_instrument(host, filename, run=run)
-
-def run_instrument(host, name=None, version=None, restart=False):
-    instrument_running = False
-    instrument_in_store = False
-
-    live_name, live_version = live_instrument(host)
-    name_ok = (live_name == name)
-    version_ok = ((version is None) or (live_version == version))
-    
-    if (name is None) or (name_ok and version_ok): # Instrument already running
-        name, version = live_name, live_version
-        instrument_running = True
-
-    if not instrument_running: # Find the instrument in the local store:
-        instruments = requests.get('http://{}/api/instruments/local'.format(host)).json()
-        versions = instruments.get(name)
-        if versions is None:
-            raise ValueError('Instrument %s not found' % name)
-
-        if version is None:
-            # Use the first version found by default
-            version = versions[0]
-        if version in versions:
-            instrument_in_store = True
-        else:
-            raise ValueError('Did not found version {} for instrument {}'.format(version, name))
-
-    if instrument_in_store or (instrument_running and restart):
-        r = requests.get('http://{}/api/instruments/run/{}/{}'.format(host, name, version))
-
 def connect(host, *args, **kwargs):
-    run_instrument(host, *args, **kwargs)
-    client = KoheronClient(host)
+    cache = kwargs.pop('cache', None)
+    name, version = run_instrument(host, *args, **kwargs)
+    client = KoheronClient(host, cache=cache, instrument='{}-{}'.format(name, version))
     return client
 
 def load_instrument(host, instrument='blink', always_restart=False):
@@ -91,107 +42,233 @@ def load_instrument(host, instrument='blink', always_restart=False):
 
 def command(classname=None, funcname=None):
     def real_command(func):
-        def wrapper(self, *args):
-            device_name = classname or self.__class__.__name__
-            cmd_name = funcname or func.__name__
-            device_id, cmd_id, cmd_args = self.client.get_ids(device_name, cmd_name)
-            self.client.send_command(device_id, cmd_id, cmd_args, *args)
-            self.client.last_device_called = device_name
-            self.client.last_cmd_called = cmd_name
-            return func(self, *args)
+        # Keyword arguments are not sent: they are only passed to the decorated function
+        # (e.g. to provide an output buffer to recv_array).
+        def wrapper(self, *args, **kwargs):
+            cmd = bound_command(self, func, classname, funcname)
+            # The command and the decoding of its reply are atomic for thread-safe clients
+            with self.client.lock:
+                if self.client.pipe is not None:
+                    parts = cmd.encoder.encode_parts(cmd.device_id, cmd.id, args)
+                    return self.client.pipe.push(parts, cmd, func, self, args, kwargs)
+                recorder = self.client.recorder
+                if recorder is None:
+                    self.client.send_command(cmd.device_id, cmd.id, cmd.encoder, *args)
+                    self.client.last_command = cmd
+                    return func(self, *args, **kwargs)
+                recorder.begin(cmd.device_name, cmd.name)
+                try:
+                    self.client.send_command(cmd.device_id, cmd.id, cmd.encoder, *args)
+                    self.client.last_command = cmd
+                    return func(self, *args, **kwargs)
+                finally:
+                    recorder.end()
         return wrapper
     return real_command
 
+def bound_command(driver, func, classname=None, funcname=None):
+    ''' CommandInfo of the @command function func of driver
+
+    Resolved on the first call and kept by the driver, until the driver
+    client changes or the client reloads its commands table.
+    '''
+    client = driver.client
+    try:
+        cmd_client, cmd = driver._koheron_commands[func]
+        if cmd_client is client and cmd.valid:
+            return cmd
+    except AttributeError:
+        driver._koheron_commands = {}
+    except KeyError:
+        pass
+    cmd = client.get_command(classname or driver.__class__.__name__, funcname or func.__name__)
+    driver._koheron_commands[func] = (client, cmd)
+    return cmd
+
 # --------------------------------------------
 # Helper functions
 # --------------------------------------------
 
-def make_command(*args):
-    buff = bytearray()
-    append(buff, 0, 4)        # RESERVED
-    append(buff, args[0], 2)  # dev_id
-    append(buff, args[1], 2)  # op_id
-    # Payload
+def command_parts(*args):
+    # args = (dev_id, op_id[, cmd_args or CommandEncoder, *values])
     if len(args[2:]) > 0:
-        buff += build_payload(args[2], args[3:])
-    else:
-        append(buff, 0, 8)
-    return buff
+        encoder = args[2]
+        if not isinstance(encoder, CommandEncoder):
+            encoder = CommandEncoder(encoder)
+        return encoder.encode_parts(args[0], args[1], args[3:])
+    return [_empty_command.pack(0, args[0], args[1], 0)]
 
-def append(buff, value, size):
-    if size <= 4:
-        for i in reversed(range(size)):
-            buff.append((value >> (8 * i)) & 0xff)
-    elif size == 8:
-        append(buff, value >> 32, 4)
-        append(buff, value, 4)
+def make_command(*args):
+    parts = command_parts(*args)
+    if len(parts) == 1:
+        return parts[0]
+    return b''.join(parts)
 
-def append_vector(buff, array, array_params):
-    if cpp_to_np_types[array_params['T']] != array.dtype:
-        raise TypeError('Invalid array type. Expected {} but received {}.'
-                        .format(cpp_to_np_types[array_params['T']], array.dtype))
+def build_payload(cmd_args, args):
+    return make_command(0, 0, cmd_args, *args)[_header.size:]
+
+# --------------------------------------------
+# Command encoder
+# --------------------------------------------
+
+_header = struct.Struct('>IHH')
+_empty_command = struct.Struct('>IHHQ')
+_length = struct.Struct('>I')
+# Maximum number of buffers per sendmsg call
+_iov_max = 1024
+# RESERVED, class_id, func_id, length
+_dynamic_header = struct.Struct('>IHHI')
+# Error reply (e.g. of the proxy to a command it does not support): dynamic reply with
+# RESERVED set to _error_reserved and an utf8 message padded to at least _error_min_length bytes,
+# so that reading it as a scalar or tuple reply does not read past its end
+_error_reserved = 0xffffffff
+_error_min_length = 64
+
+cpp_to_struct_fmt = {
+  'bool': '?',
+  'uint8_t': 'B', 'int8_t': 'b',
+  'uint16_t': 'H', 'int16_t': 'h',
+  'uint32_t': 'I', 'unsigned int': 'I',
+  'int32_t': 'i', 'int': 'i',
+  'uint64_t': 'Q', 'int64_t': 'q',
+  'float': 'f',
+  'double': 'd'
+}
+
+def array_buffer(array):
+    ''' Bytes view on the array data (no copy for C-contiguous arrays of any shape) '''
+    return memoryview(np.ascontiguousarray(array).reshape(-1).view(np.uint8))
+
+class OutputTooSmallError(ValueError):
+    ''' The out array is smaller than the n_bytes of the reply (which was discarded) '''
+    def __init__(self, message, n_bytes):
+        ValueError.__init__(self, message)
+        self.n_bytes = n_bytes
+
+class CommandError(RuntimeError):
+    ''' Error replied to a command instead of its result '''
 
-    arr_bytes = bytearray(array)
-    append(buff, len(arr_bytes), 4)
-    buff += arr_bytes
+def error_reply(class_id, func_id, message):
+    data = message.encode('utf8').ljust(_error_min_length)
+    return _dynamic_header.pack(_error_reserved, class_id, func_id, len(data)) + data
 
-def append_array(buff, array, array_params):
-    if int(array_params['N']) != len(array):
+def is_error_reply(data):
+    return _length.unpack_from(data)[0] == _error_reserved
+
+def error_reply_length(data):
+    ''' Total length of the error reply starting with data (at least _dynamic_header.size bytes) '''
+    return _dynamic_header.size + _dynamic_header.unpack_from(data)[3]
+
+def check_out_array(out, dtype):
+    if out.dtype != dtype:
+        raise TypeError('Invalid output array type. Expected {} but has {}.'.format(dtype, out.dtype))
+    if not out.flags['C_CONTIGUOUS'] or not out.flags['WRITEABLE']:
+        raise ValueError('Output array must be C-contiguous and writeable.')
+
+def encode_array(parts, array, array_params):
+    if int(array_params['N']) != array.size:
         raise ValueError('Invalid array length. Expected {} but received {}.'
-                         .format(array_params['N'], len(array)))
+                         .format(array_params['N'], array.size))
 
     if cpp_to_np_types[array_params['T']] != array.dtype:
         raise TypeError('Invalid array type. Expected {} but received {}.'
                         .format(cpp_to_np_types[array_params['T']], array.dtype))
 
-    buff += bytearray(array)
+    parts.append(array_buffer(array))
 
-# http://stackoverflow.com/questions/14431170/get-the-bits-of-a-float-in-python
-def float_to_bits(f):
-    return struct.unpack('>l', struct.pack('>f', f))[0]
-
-def double_to_bits(d):
-    return struct.unpack('>q', struct.pack('>d', d))[0]
+def encode_vector(parts, array, array_params):
+    if cpp_to_np_types[array_params['T']] != array.dtype:
+        raise TypeError('Invalid array type. Expected {} but received {}.'
+                        .format(cpp_to_np_types[array_params['T']], array.dtype))
 
-def build_payload(cmd_args, args):
-    payload = bytearray()
-
-    if len(cmd_args) != len(args):
-        raise ValueError('Invalid number of arguments. Expected {} but received {}.'
-                         .format(len(cmd_args), len(args)))
-
-    if len(cmd_args) == 0:
-        return payload
-
-    for i, arg in enumerate(cmd_args):
-        if arg['type'] in ['uint8_t','int8_t']:
-            append(payload, args[i], 1)
-        elif arg['type'] in ['uint16_t','int16_t']:
-            append(payload, args[i], 2)
-        elif arg['type'] in ['uint32_t','int32_t']:
-            append(payload, args[i], 4)
-        elif arg['type'] in ['uint64_t','int64_t']:
-            append(payload, args[i], 8)
-        elif arg['type'] == 'float':
-            append(payload, float_to_bits(args[i]), 4)
-        elif arg['type'] == 'double':
-            append(payload, double_to_bits(args[i]), 8)
-        elif arg['type'] == 'bool':
-            if args[i]:
-                append(payload, 1, 1)
+    parts.append(_length.pack(array.nbytes))
+    parts.append(array_buffer(array))
+
+def encode_string(parts, string, params):
+    str_bytes = string.encode()
+    parts.append(_length.pack(len(str_bytes)))
+    parts.append(str_bytes)
+
+def encode_unsupported(parts, value, params):
+    raise ValueError('Unsupported type "' + params['type'] + '"')
+
+class CommandEncoder(object):
+    ''' Encoder compiled once from the arguments signature of a command
+
+    Consecutive scalar arguments are packed with a single struct.Struct
+    (the first one also packs the command header).
+    std::array, std::vector and std::string arguments are encoded in slots
+    between the scalar segments. The array data is not copied: the slots
+    hold memoryviews on the numpy buffers.
+    '''
+    def __init__(self, cmd_args):
+        self.n_args = len(cmd_args)
+        # List of (arg index, slot encoder, slot params, tail struct, tail end index)
+        self.slots = []
+        # List of (arg index, struct format) of the scalar arguments
+        self.scalars = []
+
+        fmt = '>IHH' # RESERVED, dev_id, op_id
+
+        for i, arg in enumerate(cmd_args):
+            _type = arg['type'].strip()
+            if _type in cpp_to_struct_fmt:
+                fmt += cpp_to_struct_fmt[_type]
+                self.scalars.append((i, cpp_to_struct_fmt[_type]))
+                continue
+            self._close_segment(fmt, i)
+            if is_std_array(_type):
+                slot = (i, encode_array, get_std_array_params(_type))
+            elif is_std_vector(_type):
+                slot = (i, encode_vector, get_std_vector_params(_type))
+            elif is_std_string(_type):
+                slot = (i, encode_string, None)
             else:
-                append(payload, 0, 1)
-        elif is_std_array(arg['type']):
-            append_array(payload, args[i], get_std_array_params(arg['type']))
-        elif is_std_vector(arg['type']):
-            append_vector(payload, args[i], get_std_vector_params(arg['type']))
-        elif is_std_string(arg['type']):
-            append(payload, len(args[i]), 4)
-            payload.extend(args[i].encode())
+                slot = (i, encode_unsupported, {'type': arg['type']})
+            self.slots.append(slot)
+            fmt = '>'
+
+        self._close_segment(fmt, self.n_args)
+
+    def _close_segment(self, fmt, end):
+        if not self.slots:
+            self.prefix = struct.Struct(fmt)
+            self.prefix_end = end
         else:
-            raise ValueError('Unsupported type "' + arg['type'] + '"')
+            idx, encode, params = self.slots[-1][:3]
+            tail = struct.Struct(fmt) if len(fmt) > 1 else None
+            self.slots[-1] = (idx, encode, params, tail, end)
 
-    return payload
+    def encode_parts(self, device_id, cmd_id, args):
+        ''' Return the list of buffers making up the command '''
+        if len(args) != self.n_args:
+            raise ValueError('Invalid number of arguments. Expected {} but received {}.'
+                             .format(self.n_args, len(args)))
+
+        try:
+            if not self.slots:
+                return [self.prefix.pack(0, device_id, cmd_id, *args)]
+
+            parts = [self.prefix.pack(0, device_id, cmd_id, *args[:self.prefix_end])]
+            for idx, encode, params, tail, end in self.slots:
+                encode(parts, args[idx], params)
+                if tail is not None:
+                    parts.append(tail.pack(*args[idx + 1:end]))
+            return parts
+        except struct.error as e:
+            if self.has_invalid_type(args):
+                raise TypeError('Invalid argument type: {}'.format(e))
+            raise ValueError('Invalid argument value: {}'.format(e)) # e.g. out of range
+
+    def has_invalid_type(self, args):
+        ''' True if a scalar argument is not a number of the kind of its format '''
+        for i, fmt in self.scalars:
+            if fmt in 'fd':
+                if not isinstance(args[i], numbers.Real):
+                    return True
+            elif fmt != '?' and not isinstance(args[i], numbers.Integral):
+                return True
+        return False
 
 def is_std_array(_type):
     return _type.split('<')[0].strip() == 'std::array'
@@ -215,6 +292,23 @@ def get_std_array_params(_type):
 def get_std_vector_params(_type):
     return {'T': _type.split('<')[1].split('>')[0].strip()}
 
+def get_std_tuple_types(_type):
+    ''' Template arguments, split on the top-level commas only (std::tuple<uint32_t, std::array<float, 4>>) '''
+    args = _type.split('<', 1)[1].rsplit('>', 1)[0]
+    types = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(args):
+        if c == '<':
+            depth += 1
+        elif c == '>':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            types.append(args[start:i].strip())
+            start = i + 1
+    types.append(args[start:].strip())
+    return types
+
 cpp_to_np_types = {
   'bool': 'bool',
   'uint8_t': 'uint8', 'int8_t': 'int8',
@@ -226,17 +320,573 @@ cpp_to_np_types = {
   'double': 'float64'
 }
 
+class TupleStruct(object):
+    ''' Compiled format of a std::tuple reply, decoded in a single unpack
+
+    The scalars are big-endian. The std::array elements are raw (little-endian)
+    data, decoded into numpy arrays.
+    '''
+    def __init__(self, ret_type):
+        fmt = ''
+        self.arrays = [] # (field index, dtype)
+        for i, _type in enumerate(get_std_tuple_types(ret_type)):
+            if _type in cpp_to_struct_fmt:
+                fmt += cpp_to_struct_fmt[_type]
+            elif is_std_array(_type):
+                params = get_std_array_params(_type)
+                dtype = np.dtype(cpp_to_np_types[params['T']]).newbyteorder('<')
+                fmt += '{}s'.format(int(params['N']) * dtype.itemsize)
+                self.arrays.append((i, dtype))
+            else:
+                raise ValueError('Unsupported type "' + _type + '" in "' + ret_type + '"')
+        self.fmt = fmt
+        self.struct = struct.Struct('>IHH' + fmt)
+        self.size = self.struct.size
+
+    def unpack(self, data):
+        values = self.struct.unpack(data)[3:]
+        if self.arrays:
+            values = list(values)
+            for i, dtype in self.arrays:
+                values[i] = np.frombuffer(values[i], dtype=dtype).copy()
+            values = tuple(values)
+        return values
+
+    def pack(self, device_id, cmd_id, values):
+        values = list(values)
+        for i, dtype in self.arrays:
+            values[i] = np.ascontiguousarray(values[i], dtype=dtype).tobytes()
+        return self.struct.pack(0, device_id, cmd_id, *values)
+
+def struct_codes(fmt):
+    ''' Codes of a struct format, with the repeat counts expanded ('2I4s' -> ['I', 'I', '4s']) '''
+    codes = []
+    for count, code in re.findall(r'(\d*)([a-zA-Z?])', fmt.lstrip('@=<>!')):
+        if code in 'sp':
+            codes.append((count or '1') + code)
+        else:
+            codes += [code] * int(count or 1)
+    return codes
+
+def same_struct_format(fmt1, fmt2):
+    ''' True if the big-endian formats fmt1 and fmt2 are equivalent (e.g. '>2I' and 'II') '''
+    return (struct.calcsize('>' + fmt1.lstrip('@=<>!')) == struct.calcsize('>' + fmt2.lstrip('@=<>!'))
+            and struct_codes(fmt1) == struct_codes(fmt2))
+
+# --------------------------------------------
+# Socket helpers
+# --------------------------------------------
+
+def sock_send_all(sock, parts):
+    '''Send a list of buffers, gathered in as few system calls as possible.'''
+    try:
+        if not hasattr(sock, 'sendmsg'):
+            for part in parts:
+                sock.sendall(part)
+            return
+
+        views = [memoryview(part) for part in parts]
+        while views:
+            n_sent = sock.sendmsg(views[:_iov_max])
+            if n_sent == 0:
+                raise ConnectionError('send_all: Socket connection broken.')
+            # Drop the buffers fully sent and resume after a short write
+            i = 0
+            while i < len(views) and n_sent >= len(views[i]):
+                n_sent -= len(views[i])
+                i += 1
+            views = views[i:]
+            if n_sent > 0:
+                views[0] = views[0][n_sent:]
+    except ConnectionError:
+        raise
+    except socket.error as e:
+        raise ConnectionError('send_all: Socket connection broken ({}).'.format(e))
+
+def sock_recv_into(sock, buff):
+    '''Fill the writable bytes buffer buff (bytearray or memoryview).'''
+    view = memoryview(buff)
+    n_bytes = len(view)
+    n_rcv = 0
+    while n_rcv < n_bytes:
+        try:
+            n = sock.recv_into(view[n_rcv:], n_bytes - n_rcv)
+        except socket.error:
+            raise ConnectionError('recv_all: Socket connection broken.')
+        if n == 0:
+            raise ConnectionError('recv_all: Socket connection closed by peer.')
+        n_rcv += n
+    return buff
+
+def sock_recv_all(sock, n_bytes):
+    '''Receive exactly n_bytes bytes.'''
+    return sock_recv_into(sock, bytearray(n_bytes))
+
+class VectorChunks(object):
+    ''' Iterator on the chunks of a std::vector reply (see KoheronClient.recv_vector_chunks)
+
+    Each chunk is a view on a buffer of chunk_size bytes that is reused for the
+    next chunk. The client is locked until all the chunks are received or the
+    iterator is closed (or garbage collected): close() discards the chunks not
+    received yet, so the connection stays in sync. The chunks are received by
+    the thread that called the command, which holds the lock of thread-safe
+    clients: the iterator cannot be used from another thread.
+    '''
+    def __init__(self, client, length, dtype, chunk_size):
+        self.client = client
+        self.length = length
+        self.remaining = length
+        self.dtype = dtype
+        n_elements = max(1, chunk_size // dtype.itemsize)
+        self.buffer = np.empty(min(n_elements, length // dtype.itemsize), dtype=dtype)
+        # Chunks read after the end of the command are counted afterwards (see StatsRecorder.add_late_recv)
+        self.recorder = client.recorder
+        self.key = None if self.recorder is None else self.recorder.key
+        self.thread = threading.current_thread()
+        client.lock.acquire()
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def check_thread(self):
+        if threading.current_thread() is not self.thread:
+            raise RuntimeError('The chunks must be received by the thread that called the command')
+
+    def __next__(self):
+        self.check_thread()
+        if self.remaining == 0:
+            self.close()
+            raise StopIteration
+        chunk = self._recv_chunk()
+        if self.remaining == 0:
+            self.close()
+        return chunk
+
+    next = __next__ # Python 2
+
+    def _recv_chunk(self):
+        chunk = self.buffer[:min(self.buffer.size, self.remaining // self.dtype.itemsize)]
+        try:
+            self._recv_into(array_buffer(chunk))
+        except ConnectionError:
+            self.remaining = 0
+            self.close()
+            raise
+        self.remaining -= chunk.nbytes
+        return chunk
+
+    def readinto(self, buff):
+        ''' Receive the remaining data into the writable buffer buff (mmap, bytearray, numpy array) '''
+        self.check_thread()
+        view = array_buffer(buff) if isinstance(buff, np.ndarray) else memoryview(buff)
+        n_bytes = self.remaining
+        if len(view) < n_bytes:
+            self.close()
+            raise ValueError('Output buffer too small. Expected at least {} bytes but has {}.'
+                             .format(n_bytes, len(view)))
+        try:
+            self._recv_into(view[:n_bytes])
+        finally:
+            self.remaining = 0
+            self.close()
+        return n_bytes
+
+    def _recv_into(self, view):
+        recorder = self.recorder
+        if recorder is None or self.key is None or recorder.key is not None:
+            return self.client.recv_into(view)
+        start = timer()
+        sock_recv_into(self.client.sock, view)
+        recorder.add_late_recv(self.key, timer() - start, len(view))
+
+    def close(self):
+        if self.closed:
+            return
+        self.check_thread()
+        self.closed = True
+        try:
+            while self.remaining > 0:
+                self._recv_chunk()
+        finally:
+            self.client.lock.release()
+
+    def __del__(self):
+        if getattr(self, 'closed', True):
+            return
+        if threading.current_thread() is not self.thread:
+            # The lock cannot be released from this thread
+            self.client.sock.close()
+            return
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+# --------------------------------------------
+# Pipeline
+# --------------------------------------------
+
+class PipelineResult(object):
+    ''' Result of a command queued in a pipeline '''
+    def __init__(self):
+        self._done = False
+        self._value = None
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        if not self._done:
+            raise RuntimeError('Pipeline not executed yet')
+        return self._value
+
+    def set_result(self, value):
+        self._value = value
+        self._done = True
+
+class Pipeline(object):
+    ''' Batch of commands sent at once, whose replies are decoded in order
+
+    Within the context, @command calls return a PipelineResult instead of
+    the decoded value. The commands are sent in a single write when the
+    context exits, then the replies are decoded by the driver functions
+    in the order of the calls:
+
+        with client.pipeline() as pipe:
+            for offset in offsets:
+                common.sts_read(offset)
+        values = pipe.results
+
+    Arrays passed as arguments are not copied: they must not be modified
+    before the pipeline is executed.
+
+    The commands are sent by groups of at most max_send_bytes, each group
+    after the replies of the previous one are read, so the socket buffers
+    cannot fill up in both directions. If a reply fails to decode, the
+    following replies cannot be read: the connection is closed.
+    '''
+    # Maximum size of the commands sent before reading their replies
+    max_send_bytes = 1 << 16
+
+    def __init__(self, client):
+        self.client = client
+        self.queue = []
+        self.sent = []
+        self.results = []
+
+    def push(self, parts, cmd, func, driver, args, kwargs):
+        result = PipelineResult()
+        self.queue.append((parts, cmd, func, driver, args, kwargs, result))
+        return result
+
+    def execute(self):
+        ''' Send the queued commands and decode the replies '''
+        queue, self.queue = self.queue, []
+        results = []
+        while queue:
+            n_cmds = 0
+            n_bytes = 0
+            for cmd in queue:
+                cmd_bytes = sum(len(part) for part in cmd[0])
+                if n_cmds > 0 and n_bytes + cmd_bytes > self.max_send_bytes:
+                    break
+                n_cmds += 1
+                n_bytes += cmd_bytes
+            self.queue, queue = queue[:n_cmds], queue[n_cmds:]
+            self.send()
+            results += self.receive()
+        self.results = results
+        return results
+
+    def send(self):
+        ''' Send the queued commands, whose replies are decoded by receive() '''
+        queue, self.queue = self.queue, []
+        self.sent = queue
+        # Coalesce the small buffers, keep the array data as views
+        parts = []
+        buff = bytearray()
+        for cmd in queue:
+            for part in cmd[0]:
+                if isinstance(part, bytes):
+                    buff += part
+                else:
+                    if buff:
+                        parts.append(buff)
+                        buff = bytearray()
+                    parts.append(part)
+        if buff:
+            parts.append(buff)
+        self.client.send_all(parts)
+
+    def receive(self):
+        ''' Decode the replies of the sent commands '''
+        queue, self.sent = self.sent, []
+        self.results = []
+        try:
+            for _, cmd, func, driver, args, kwargs, result in queue:
+                self.client.last_command = cmd
+                result.set_result(func(driver, *args, **kwargs))
+                self.results.append(result.result())
+        except Exception:
+            # The position in the stream of replies is lost
+            self.client.sock.close()
+            raise
+        return self.results
+
+    def __enter__(self):
+        # Other threads wait for the pipeline execution on thread-safe clients
+        self.client.lock.acquire()
+        if self.client.pipe is not None:
+            self.client.lock.release()
+            raise RuntimeError('A pipeline is already open on this client')
+        self.client.pipe = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.execute()
+        finally:
+            self.client.pipe = None
+            self.client.lock.release()
+        return False
+
+# --------------------------------------------
+# Thread safety
+# --------------------------------------------
+
+class NoLock(object):
+    ''' Lock doing nothing, used by the clients that are not thread-safe '''
+    def acquire(self, *args):
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+# --------------------------------------------
+# Commands metadata
+# --------------------------------------------
+
+class CommandInfo(object):
+    ''' Ids, arguments, return type and encoder of a command of the commands table
+
+    valid is set to False when the client reloads its commands table.
+    '''
+    __slots__ = ('device_name', 'name', 'device_id', 'id', 'args', 'ret_type', 'encoder', 'valid',
+                 '_tuple_struct')
+
+    def __init__(self, device_name, device_id, cmd):
+        self.device_name = device_name
+        self.name = cmd['name']
+        self.device_id = device_id
+        self.id = cmd['id']
+        self.args = cmd['args']
+        self.ret_type = cmd.get('ret_type', None)
+        self.encoder = CommandEncoder(cmd['args'])
+        self.valid = True
+        self._tuple_struct = None
+
+    @property
+    def tuple_struct(self):
+        ''' TupleStruct of the std::tuple return type (compiled on first use)
+
+        None if the return type is not a std::tuple or has types not supported by TupleStruct.
+        '''
+        if self._tuple_struct is None and is_std_tuple(self.ret_type):
+            try:
+                self._tuple_struct = TupleStruct(self.ret_type)
+            except ValueError:
+                self._tuple_struct = False
+        return self._tuple_struct or None
+
+def check_server_version(server_version):
+    server_version_ = server_version.split('.')
+    client_version_ = __version__.split('.')
+    if  (client_version_[0] != server_version_[0]) or (client_version_[1] < server_version_[1]):
+        print('Warning: your client version {} is incompatible with the server version {}'
+               .format(__version__, server_version))
+        print('Upgrade your client with "pip install --upgrade koheron"')
+
+class KoheronClientBase(object):
+    ''' Devices and commands tables shared by the synchronous and asyncio clients '''
+
+    cache = None
+    cache_key = None
+    cache_timeout = 2.0 # Timeout (s) of the HTTP request of the live instrument
+    cmds_info = {}
+    last_command = None
+
+    def init_cache(self, cache, instrument=None):
+        ''' Enable the on-disk cache of the metadata
+
+        Args:
+            cache: True for the default cache directory, a directory or a MetadataCache
+            instrument: Name and version of the live instrument
+                        (retrieved with the HTTP API if None)
+
+        If the live instrument is unknown (unix socket, HTTP API unavailable),
+        the commands table is downloaded and the cache is keyed on it (see load_devices).
+        '''
+        if not cache:
+            return
+        from .cache import open_cache
+        self.cache = open_cache(cache)
+        if instrument is None and self.host != '':
+            try:
+                instrument = '-'.join(live_instrument(self.host, timeout=self.cache_timeout))
+            except Exception as e:
+                logger.warning('Failed to get the live instrument of %s (%s): '
+                               'the metadata cache is keyed on the commands table', self.host, e)
+        if instrument is not None:
+            self.cache_key = '{}/{}'.format(self.server_version, instrument)
+
+    def commands_cache_key(self, commands):
+        ''' Cache key of a server with this commands table '''
+        digest = hashlib.sha1(json.dumps(commands, sort_keys=True).encode()).hexdigest()
+        return '{}/commands-{}'.format(self.server_version, digest)
+
+    def cached(self, name, func):
+        ''' Return the metadata name from the cache, or from func if it is not cached '''
+        if self.cache is None or self.cache_key is None:
+            return func()
+        value = self.cache.get(self.cache_key, name)
+        if value is None:
+            value = func()
+            self.cache.set(self.cache_key, name, value)
+        return value
+
+    def set_commands(self, commands):
+        # The commands bound to the drivers must be resolved again
+        for cmd in self.cmds_info.values():
+            cmd.valid = False
+        self.cmds_info = {}
+
+        self.commands = commands
+        # pprint.pprint(self.commands)
+        self.devices_idx = {}
+        self.cmds_idx_list = [None]*(2 + len(self.commands))
+        self.cmds_args_list = [None]*(2 + len(self.commands))
+        self.cmds_ret_types_list = [None]*(2 + len(self.commands))
+        self.cmds_encoders_list = [None]*(2 + len(self.commands))
+
+        for device in self.commands:
+            self.devices_idx[device['class']] = device['id']
+            cmds_idx = {}
+            cmds_args = {}
+            cmds_ret_type = {}
+            cmds_encoder = {}
+            for cmd in device['functions']:
+                info = CommandInfo(device['class'], device['id'], cmd)
+                self.cmds_info[(device['class'], cmd['name'])] = info
+                cmds_idx[cmd['name']] = cmd['id']
+                cmds_args[cmd['name']] = cmd['args']
+                cmds_ret_type[cmd['name']] = info.ret_type
+                cmds_encoder[cmd['name']] = info.encoder
+            self.cmds_idx_list[device['id']] = cmds_idx
+            self.cmds_args_list[device['id']] = cmds_args
+            self.cmds_ret_types_list[device['id']] = cmds_ret_type
+            self.cmds_encoders_list[device['id']] = cmds_encoder
+
+    def get_command(self, device_name, command_name):
+        ''' CommandInfo of device_name::command_name '''
+        try:
+            return self.cmds_info[(device_name, command_name)]
+        except KeyError:
+            # Same errors as the lookups in the commands table
+            device_id = self.devices_idx[device_name]
+            self.cmds_idx_list[device_id][command_name]
+            raise
+
+    @property
+    def last_device_called(self):
+        return self.last_command.device_name
+
+    @property
+    def last_cmd_called(self):
+        return self.last_command.name
+
+    def get_ids(self, device_name, command_name):
+        device_id = self.devices_idx[device_name]
+        cmd_id = self.cmds_idx_list[device_id][command_name]
+        cmd_args = self.cmds_args_list[device_id][command_name]
+        return device_id, cmd_id, cmd_args
+
+    def get_encoder(self, device_name, command_name):
+        device_id = self.devices_idx[device_name]
+        cmd_id = self.cmds_idx_list[device_id][command_name]
+        encoder = self.cmds_encoders_list[device_id][command_name]
+        return device_id, cmd_id, encoder
+
+    def check_ret_type(self, expected_types):
+        ret_type = self.last_command.ret_type
+        if ret_type not in expected_types:
+            raise TypeError('{}::{} returns a {}.'.format(self.last_device_called, self.last_cmd_called, ret_type))
+
+    def check_ret_array(self, dtype, arr_len):
+        ret_type = self.last_command.ret_type
+        if not is_std_array(ret_type):
+            raise TypeError('Expect call to rcv_array [{}::{} returns a {}].'.format(self.last_device_called, self.last_cmd_called, ret_type))
+        params = get_std_array_params(ret_type)
+        if dtype != cpp_to_np_types[params['T']]:
+            raise TypeError('{}::{} expects elements of type {}.'.format(self.last_device_called, self.last_cmd_called, params['T']))
+        if arr_len != int(params['N']):
+            raise ValueError('{}::{} expects {} elements.'.format(self.last_device_called, self.last_cmd_called, params['N']))
+
+    def check_ret_vector(self, dtype):
+        ret_type = self.last_command.ret_type
+        if not is_std_vector(ret_type):
+            raise TypeError('Expect call to rcv_vector [{}::{} returns a {}].'.format(self.last_device_called, self.last_cmd_called, ret_type))
+        vect_type = get_std_vector_params(ret_type)['T']
+        if dtype != cpp_to_np_types[vect_type]:
+            raise TypeError('{}::{} expects elements of type {}.'.format(self.last_device_called, self.last_cmd_called, vect_type))
+
+    def check_ret_tuple(self, fmt=None):
+        ''' Check fmt against the return type (not checked if the type is not supported by TupleStruct) '''
+        ret_type = self.last_command.ret_type
+        if not is_std_tuple(ret_type):
+            raise TypeError('{}::{} returns a {} not a std::tuple.'.format(self.last_device_called, self.last_cmd_called, ret_type))
+        tuple_struct = self.last_command.tuple_struct
+        if tuple_struct is None:
+            if fmt is None:
+                raise TypeError('{}::{} returns a {}: the format must be provided.'.format(
+                                self.last_device_called, self.last_cmd_called, ret_type))
+        elif fmt is not None and not same_struct_format(fmt, tuple_struct.fmt):
+            raise TypeError('{}::{} returns a {} (format "{}").'.format(self.last_device_called, self.last_cmd_called,
+                            ret_type, tuple_struct.fmt))
+
 # --------------------------------------------
 # KoheronClient
 # --------------------------------------------
 
-class KoheronClient:
-    def __init__(self, host='', port=36000, unixsock=''):
+class KoheronClient(KoheronClientBase):
+    def __init__(self, host='', port=36000, unixsock='', thread_safe=False, cache=None, instrument=None,
+                 stats=False, timeout=None):
         ''' Initialize connection with koheron-server
 
         Args:
             host: A string with the IP address
             port: Port of the TCP connection (must be an integer)
+            thread_safe: If True, a command and the reading of its reply
+                         are atomic, so the client can be shared between threads
+            cache: If True (or a cache directory), the commands table and the
+                   instrument config are cached on disk (see init_cache)
+            instrument: 'name-version' of the live instrument, used as cache key
+            stats: If True, record per command statistics (see enable_stats)
+            timeout: Maximum time (s) to connect and to get the server version and commands table
         '''
         if type(host) != str:
             raise TypeError('IP address must be a string')
@@ -248,6 +898,9 @@ class KoheronClient:
         self.port = port
         self.unixsock = unixsock
         self.is_connected = False
+        self.pipe = None
+        self.lock = threading.RLock() if thread_safe else NoLock()
+        self.recorder = None
 
         if host != '':
             try:
@@ -263,6 +916,7 @@ class KoheronClient:
                 assert tcp_nodelay == 1
 
                 # Connect to Kserver
+                self.sock.settimeout(timeout)
                 self.sock.connect((host, port))
                 self.is_connected = True
             except BaseException as e:
@@ -270,6 +924,7 @@ class KoheronClient:
         elif unixsock != '':
             try:
                 self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.settimeout(timeout)
                 self.sock.connect(unixsock)
                 self.is_connected = True
             except BaseException as e:
@@ -279,118 +934,144 @@ class KoheronClient:
 
         if self.is_connected:
             self.check_version()
+            self.init_cache(cache, instrument)
             self.load_devices()
+            self.sock.settimeout(None)
+
+        if stats:
+            self.enable_stats()
 
     def check_version(self):
         try:
             self.send_command(1, 0)
         except:
             raise ConnectionError('Failed to retrieve the server version')
-        server_version = self.recv_string(check_type=False)
-        server_version_ = server_version.split('.')
-        client_version_ = __version__.split('.')
-        if  (client_version_[0] != server_version_[0]) or (client_version_[1] < server_version_[1]):
-            print('Warning: your client version {} is incompatible with the server version {}'
-                   .format(__version__, server_version))
-            print('Upgrade your client with "pip install --upgrade koheron"')
-        
+        self.server_version = self.recv_string(check_type=False)
+        check_server_version(self.server_version)
+
     def load_devices(self):
+        if self.cache is not None and self.cache_key is None:
+            # Unknown instrument: the commands table keys the other metadata
+            commands = self.download_commands()
+            self.cache_key = self.commands_cache_key(commands)
+        else:
+            commands = self.cached('commands', self.download_commands)
+        self.set_commands(commands)
+
+    def download_commands(self):
         try:
             self.send_command(1, 1)
         except:
             raise ConnectionError('Failed to send initialization command')
 
-        self.commands = self.recv_json(check_type=False)
-        # pprint.pprint(self.commands)
-        self.devices_idx = {}
-        self.cmds_idx_list = [None]*(2 + len(self.commands))
-        self.cmds_args_list = [None]*(2 + len(self.commands))
-        self.cmds_ret_types_list = [None]*(2 + len(self.commands))
+        return self.recv_json(check_type=False)
 
-        for device in self.commands:
-            self.devices_idx[device['class']] = device['id']
-            cmds_idx = {}
-            cmds_args = {}
-            cmds_ret_type = {}
-            for cmd in device['functions']:
-                cmds_idx[cmd['name']] = cmd['id']
-                cmds_args[cmd['name']] = cmd['args']
-                cmds_ret_type[cmd['name']] = cmd.get('ret_type', None)
-            self.cmds_idx_list[device['id']] = cmds_idx
-            self.cmds_args_list[device['id']] = cmds_args
-            self.cmds_ret_types_list[device['id']] = cmds_ret_type
+    def pipeline(self):
+        ''' Return a Pipeline to send a batch of commands at once '''
+        return Pipeline(self)
 
-    def get_ids(self, device_name, command_name):
-        device_id = self.devices_idx[device_name]
-        cmd_id = self.cmds_idx_list[device_id][command_name]
-        cmd_args = self.cmds_args_list[device_id][command_name]
-        return device_id, cmd_id, cmd_args
+    def driver(self, device_name):
+        ''' Return a driver of device_name generated from the commands table (see driver.py) '''
+        from .driver import driver_class
+        self.devices_idx[device_name]
+        device = next(device for device in self.commands if device['class'] == device_name)
+        return driver_class(device)(self)
 
-    def check_ret_type(self, expected_types):
-        device_id = self.devices_idx[self.last_device_called]
-        ret_type = self.cmds_ret_types_list[device_id][self.last_cmd_called]
-        if ret_type not in expected_types:
-            raise TypeError('{}::{} returns a {}.'.format(self.last_device_called, self.last_cmd_called, ret_type))
+    def stream(self, method, depth=64, args=(), frames=None, max_length=None):
+        ''' Start acquiring method repeatedly into a ring buffer of depth frames (see Stream) '''
+        from .stream import Stream
+        return Stream(method, depth=depth, args=args, frames=frames, max_length=max_length).start()
 
-    def check_ret_array(self, dtype, arr_len):
-        device_id = self.devices_idx[self.last_device_called]
-        ret_type = self.cmds_ret_types_list[device_id][self.last_cmd_called]
-        if not is_std_array(ret_type):
-            raise TypeError('Expect call to rcv_array [{}::{} returns a {}].'.format(self.last_device_called, self.last_cmd_called, ret_type))
-        params = get_std_array_params(ret_type)
-        if dtype != cpp_to_np_types[params['T']]:
-            raise TypeError('{}::{} expects elements of type {}.'.format(self.last_device_called, self.last_cmd_called, params['T']))
-        if arr_len != int(params['N']):
-            raise ValueError('{}::{} expects {} elements.'.format(self.last_device_called, self.last_cmd_called, params['N']))
+    def record(self, method, path, frames=None, args=(), chunk_frames=1024):
+        ''' Start acquiring method repeatedly into the file at path (see Recording) '''
+        from .record import Recording
+        return Recording(method, path, frames=frames, args=args, chunk_frames=chunk_frames).start()
 
-    def check_ret_vector(self, dtype):
-        device_id = self.devices_idx[self.last_device_called]
-        ret_type = self.cmds_ret_types_list[device_id][self.last_cmd_called]
-        if not is_std_vector(ret_type):
-            raise TypeError('Expect call to rcv_vector [{}::{} returns a {}].'.format(self.last_device_called, self.last_cmd_called, ret_type))
-        vect_type = get_std_vector_params(ret_type)['T']
-        if dtype != cpp_to_np_types[vect_type]:
-            raise TypeError('{}::{} expects elements of type {}.'.format(self.last_device_called, self.last_cmd_called, vect_type))
+    # -------------------------------------------------------
+    # Statistics
+    # -------------------------------------------------------
 
-    # TODO add types check
-    def check_ret_tuple(self):
-        device_id = self.devices_idx[self.last_device_called]
-        ret_type = self.cmds_ret_types_list[device_id][self.last_cmd_called]
-        if not is_std_tuple(ret_type):
-            raise TypeError('{}::{} returns a {} not a std::tuple.'.format(self.last_device_called, self.last_cmd_called, ret_type))
+    def enable_stats(self, callback=None):
+        ''' Record calls, bytes and time per phase of the @command methods (see StatsRecorder)
+
+        If provided, callback(device_name, cmd_name, sample) is called after each command.
+        '''
+        self.recorder = StatsRecorder(callback)
+
+    def disable_stats(self):
+        self.recorder = None
+
+    def stats(self):
+        ''' Dict of the counters keyed by (device name, command name) '''
+        if self.recorder is None:
+            return {}
+        return self.recorder.stats()
+
+    def stats_prometheus(self):
+        ''' Statistics in the Prometheus text format '''
+        return prometheus_text(self.stats())
 
     # -------------------------------------------------------
     # Send/Receive
     # -------------------------------------------------------
 
     def send_command(self, device_id, cmd_id, cmd_args=[], *args):
-        cmd = make_command(device_id, cmd_id, cmd_args, *args)
-        if self.sock.send(cmd) == 0:
-            raise ConnectionError('send_command: Socket connection broken')
+        if self.recorder is None:
+            self.send_all(command_parts(device_id, cmd_id, cmd_args, *args))
+            return
+        start = timer()
+        parts = command_parts(device_id, cmd_id, cmd_args, *args)
+        encoded = timer()
+        self.send_all(parts)
+        self.recorder.add_send(encoded - start, timer() - encoded, sum(len(part) for part in parts))
+
+    def send_all(self, parts):
+        '''Send a list of buffers, gathered in as few system calls as possible.'''
+        sock_send_all(self.sock, parts)
+
+    def recv_into(self, buff):
+        '''Fill the writable bytes buffer buff (bytearray or memoryview).'''
+        if self.recorder is None:
+            return sock_recv_into(self.sock, buff)
+        start = timer()
+        sock_recv_into(self.sock, buff)
+        self.recorder.add_recv(timer() - start, len(memoryview(buff)))
+        return buff
 
     def recv_all(self, n_bytes):
         '''Receive exactly n_bytes bytes.'''
-        data = []
-        n_rcv = 0
-        while n_rcv < n_bytes:
-            try:
-                chunk = self.sock.recv(n_bytes - n_rcv)
-                if chunk == '':
-                    break
-                n_rcv += len(chunk)
-                data.append(chunk)
-            except:
-                raise ConnectionError('recv_all: Socket connection broken.')
-        return b''.join(data)
+        return self.recv_into(bytearray(n_bytes))
+
+    def recv_error_reply(self, data):
+        ''' Receive the rest of the error reply starting with data and raise it '''
+        data = bytes(data)
+        if len(data) < _dynamic_header.size:
+            data += bytes(self.recv_all(_dynamic_header.size - len(data)))
+        n_bytes = error_reply_length(data)
+        if len(data) > n_bytes: # The next reply has been read
+            self.sock.close()
+            raise ConnectionError('Error reply shorter than the expected reply: connection closed.')
+        data += bytes(self.recv_all(n_bytes - len(data)))
+        raise CommandError(data[_dynamic_header.size:].decode('utf8').rstrip())
+
+    def recv_dynamic_length(self):
+        data = self.recv_all(_dynamic_header.size)
+        reserved, class_id, func_id, length = _dynamic_header.unpack(data)
+        if reserved == _error_reserved:
+            self.recv_error_reply(data)
+        assert reserved == 0
+        return length
 
     def recv_dynamic_payload(self):
-        reserved, class_id, func_id, length = struct.unpack('>IHHI', self.recv_all(struct.calcsize('>IHHI')))
-        assert reserved == 0
-        return self.recv_all(length)
+        return self.recv_all(self.recv_dynamic_length())
 
     def recv(self, fmt='I'):
         fmt_ = '>IHH' + fmt
-        t = struct.unpack(fmt_, self.recv_all(struct.calcsize(fmt_)))[3:]
+        data = self.recv_all(struct.calcsize(fmt_))
+        t = struct.unpack(fmt_, data)
+        if t[0] == _error_reserved:
+            self.recv_error_reply(data)
+        t = t[3:]
         if len(t) == 1:
             return t[0]
         else:
@@ -430,28 +1111,121 @@ class KoheronClient:
             self.check_ret_type(['std::string', 'const char *', 'const char*'])
         return json.loads(self.recv_string(check_type=False))
 
-    def recv_vector(self, dtype='uint32', check_type=True):
-        '''Receive a numpy array with unknown length.'''
+    def recv_vector(self, dtype='uint32', check_type=True, out=None):
+        '''Receive a numpy array with unknown length.
+
+        If out is provided, the data are received in place into this array
+        (which must be large enough) and a view on the received elements is returned.
+        '''
         if check_type:
             self.check_ret_vector(dtype)
-        dtype = np.dtype(dtype)
-        buff = self.recv_dynamic_payload()
-        return np.frombuffer(buff, dtype=dtype.newbyteorder('<'))
+        dtype = np.dtype(dtype).newbyteorder('<')
+        length = self.recv_dynamic_length()
+        try:
+            if length % dtype.itemsize != 0:
+                raise ValueError('Invalid vector length. {} bytes is not a multiple of the {} bytes of {}.'
+                                 .format(length, dtype.itemsize, dtype.name))
+            if out is not None:
+                check_out_array(out, dtype)
+                if out.nbytes < length:
+                    raise OutputTooSmallError('Output array too small. Expected at least {} bytes but has {}.'
+                                              .format(length, out.nbytes), length)
+        except (TypeError, ValueError):
+            self.recv_all(length) # Keep the stream in sync
+            raise
+        if out is None:
+            out = np.empty(length // dtype.itemsize, dtype=dtype)
+        else:
+            out = out.reshape(-1)[:length // dtype.itemsize]
+        self.recv_into(array_buffer(out))
+        return out
+
+    def recv_vector_chunks(self, dtype='uint32', chunk_size=1 << 20, check_type=True):
+        '''Receive a std::vector in chunks of at most chunk_size bytes, as they arrive.
 
-    def recv_array(self, shape, dtype='uint32', check_type=True):
-        '''Receive a numpy array with known shape.'''
+        Returns a VectorChunks iterator: the memory used does not depend on the
+        length of the vector. The chunks must be consumed (or the iterator closed)
+        before the next command, so it cannot be used in a pipeline.
+        '''
+        if self.pipe is not None:
+            raise RuntimeError('The chunks of a std::vector cannot be received in a pipeline')
+        if check_type:
+            self.check_ret_vector(dtype)
+        dtype = np.dtype(dtype).newbyteorder('<')
+        length = self.recv_dynamic_length()
+        if length % dtype.itemsize != 0:
+            # The vector cannot be split in elements of dtype
+            self.sock.close()
+            raise ValueError('Invalid vector length. {} bytes is not a multiple of the {} bytes of {}.'
+                             .format(length, dtype.itemsize, dtype.name))
+        return VectorChunks(self, length, dtype, chunk_size)
+
+    def recv_vector_to(self, sink, dtype='uint32', chunk_size=1 << 20, check_type=True):
+        '''Receive a std::vector into sink and return the number of bytes received.
+
+        sink is either a file object, written chunk by chunk, or a writable
+        buffer (mmap, bytearray, numpy array) the data are received into.
+        '''
+        chunks = self.recv_vector_chunks(dtype=dtype, chunk_size=chunk_size, check_type=check_type)
+        if not hasattr(sink, 'write'):
+            return chunks.readinto(sink)
+        with chunks:
+            for chunk in chunks:
+                sink.write(array_buffer(chunk))
+        return chunks.length
+
+    def recv_array(self, shape, dtype='uint32', check_type=True, out=None):
+        '''Receive a numpy array with known shape.
+
+        If out is provided, the data are received in place into this array.
+        '''
         arr_len = int(np.prod(shape))
         if check_type:
             self.check_ret_array(dtype, arr_len)
-        dtype = np.dtype(dtype)
+        dtype = np.dtype(dtype).newbyteorder('<')
         self.recv(fmt='')
-        buff = self.recv_all(dtype.itemsize * arr_len)
-        return np.frombuffer(buff, dtype=dtype.newbyteorder('<')).reshape(shape)
-
-    def recv_tuple(self, fmt, check_type=True):
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        else:
+            try:
+                check_out_array(out, dtype)
+                if out.size != arr_len:
+                    raise ValueError('Invalid output array length. Expected {} but has {}.'
+                                     .format(arr_len, out.size))
+            except (TypeError, ValueError):
+                self.recv_all(arr_len * dtype.itemsize) # Keep the stream in sync
+                raise
+        self.recv_into(array_buffer(out))
+        return out
+
+    def recv_tuple(self, fmt=None, check_type=True):
+        ''' Receive a std::tuple
+
+        The format is compiled from the return type of the command, fmt is only
+        checked against it (if check_type is True). fmt is used if the return
+        type is not supported by TupleStruct, or if check_type is False.
+        '''
+        tuple_struct = self.last_command.tuple_struct
         if check_type:
-            self.check_ret_tuple()
-        return tuple(self.recv(fmt))
+            try:
+                self.check_ret_tuple(fmt)
+            except TypeError:
+                # Keep the stream in sync
+                if tuple_struct is not None:
+                    self.recv_tuple_data(tuple_struct)
+                elif is_std_tuple(self.last_command.ret_type):
+                    self.sock.close()
+                raise
+        if fmt is not None and (tuple_struct is None or not check_type):
+            values = self.recv(fmt.lstrip('@=<>!'))
+            return values if isinstance(values, tuple) else (values,)
+        return tuple_struct.unpack(self.recv_tuple_data(tuple_struct))
+
+    def recv_tuple_data(self, tuple_struct):
+        data = self.recv_all(tuple_struct.size)
+        if is_error_reply(data):
+            self.recv_error_reply(data)
+        return data
 
     def __del__(self):
         if hasattr(self, 'sock'):
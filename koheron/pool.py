@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+from contextlib import contextmanager
+
+try:
+    import queue
+except ImportError: # Python 2
+    import Queue as queue
+
+from .koheron import KoheronClient, ConnectionError
+
+# Queued in place of an idle connection
+_free_slot = object() # A connection was discarded: a new one can be opened
+_closed = object() # The pool is closed
+
+class KoheronPool(object):
+    ''' Pool of connections to a koheron-server
+
+    Each connection is used by a single thread at a time, so several threads
+    can call commands in parallel:
+
+        pool = KoheronPool('192.168.1.100', size=4)
+        with pool.driver(Common) as common:
+            common.sts_read(0)
+
+    The connections are opened on demand, up to size connections.
+    '''
+    def __init__(self, host='', size=4, port=36000, unixsock='', timeout=None):
+        if size < 1:
+            raise ValueError('Pool size must be at least 1')
+        self.host = host
+        self.port = port
+        self.unixsock = unixsock
+        self.size = size
+        self.timeout = timeout
+        self.clients = []
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        # Driver instances indexed by (client, driver class)
+        self.drivers = {}
+        self.closed = False
+
+    def acquire(self, timeout=None):
+        ''' Take a connection out of the pool (blocks if all connections are in use) '''
+        if timeout is None:
+            timeout = self.timeout
+        if self.closed:
+            raise ConnectionError('The pool is closed')
+        try:
+            client = self.idle.get_nowait()
+        except queue.Empty:
+            client = self.create()
+            if client is None:
+                try:
+                    client = self.idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise ConnectionError('No connection available in the pool')
+        if client is _closed:
+            self.idle.put(_closed) # Wake the next waiter
+            raise ConnectionError('The pool is closed')
+        if client is _free_slot:
+            return self.acquire(timeout)
+        return client
+
+    def create(self):
+        ''' Open a new connection, or return None if the pool is full '''
+        with self.lock:
+            if len(self.clients) >= self.size:
+                return None
+            self.clients.append(None) # Reserve the slot
+        try:
+            client = KoheronClient(host=self.host, port=self.port, unixsock=self.unixsock)
+        except:
+            with self.lock:
+                self.clients.remove(None)
+            raise
+        with self.lock:
+            if not self.closed:
+                self.clients[self.clients.index(None)] = client
+                return client
+        client.sock.close()
+        raise ConnectionError('The pool is closed')
+
+    def release(self, client):
+        ''' Give a connection back to the pool (closed if the pool is closed) '''
+        with self.lock:
+            if not self.closed:
+                self.idle.put(client)
+                return
+        client.sock.close()
+
+    def discard(self, client):
+        ''' Close a connection taken out of the pool and free its slot '''
+        client.sock.close()
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+            for key in [key for key in self.drivers if key[0] == id(client)]:
+                del self.drivers[key]
+            if not self.closed:
+                self.idle.put(_free_slot) # Wake a waiter to open a new connection
+
+    @contextmanager
+    def connection(self, timeout=None):
+        ''' Connection of the pool, closed if the block raises (it may be out of sync) '''
+        client = self.acquire(timeout)
+        try:
+            yield client
+        except:
+            self.discard(client)
+            raise
+        self.release(client)
+
+    @contextmanager
+    def driver(self, cls, timeout=None):
+        ''' Driver of class cls bound to a connection of the pool
+
+        The driver instances are created once per connection.
+        '''
+        with self.connection(timeout) as client:
+            key = (id(client), cls)
+            if key not in self.drivers:
+                self.drivers[key] = cls(client)
+            yield self.drivers[key]
+
+    def close(self):
+        ''' Close the idle connections, the connections in use are closed when released '''
+        with self.lock:
+            self.closed = True
+            self.clients = []
+            self.drivers = {}
+        while True:
+            try:
+                client = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if client is not _free_slot:
+                client.sock.close()
+        self.idle.put(_closed) # Wake the waiters
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+''' Local proxy sharing one connection to a koheron-server between processes
+
+The proxy listens on a unix socket and speaks the koheron-server protocol,
+so clients connect to it with KoheronClient(unixsock=path). The server
+version and the commands table are answered by the proxy itself.
+A command the proxy cannot frame gets an error reply (see CommandError).
+
+Requests are framed with the commands table and served one at a time,
+taking each client in turn (round robin), so a client sending many
+commands at once does not delay the others.
+'''
+
+import collections
+import json
+import os
+import socket
+import stat
+import struct
+import tempfile
+import threading
+import numpy as np
+
+from .koheron import (KoheronClient, ConnectionError, sock_send_all, sock_recv_all,
+                      cpp_to_struct_fmt, cpp_to_np_types, is_std_array, is_std_vector,
+                      is_std_string, is_std_tuple, get_std_array_params, TupleStruct, error_reply,
+                      _header, _length, _dynamic_header)
+
+def proxy_dir():
+    ''' Directory of the proxy sockets, only accessible by the user '''
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return runtime_dir
+    return os.path.join(tempfile.gettempdir(), 'koheron-{}'.format(os.getuid()))
+
+def default_proxy_path(host, port=36000):
+    return os.path.join(proxy_dir(), 'koheron-{}-{}.sock'.format(host, port))
+
+def make_proxy_dir():
+    ''' Create the directory of the proxy sockets and check it is only accessible by the user '''
+    directory = proxy_dir()
+    try:
+        os.makedirs(directory, 0o700)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+    st = os.stat(directory)
+    if st.st_uid != os.getuid() or stat.S_IMODE(st.st_mode) & 0o077:
+        raise RuntimeError('The proxy directory {} must be only accessible by its owner'.format(directory))
+    return directory
+
+def is_user_socket(path):
+    ''' True if path is a unix socket owned by the user (a proxy not started by another user) '''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid()
+
+# --------------------------------------------
+# Framing
+# --------------------------------------------
+
+# A framing is a list of steps: an int is a number of bytes to read,
+# None is a 4 bytes length followed by as many bytes.
+
+def request_framing(cmd_args):
+    framing = []
+    n_bytes = 0
+    for arg in cmd_args:
+        _type = arg['type'].strip()
+        if _type in cpp_to_struct_fmt:
+            n_bytes += struct.calcsize('>' + cpp_to_struct_fmt[_type])
+        elif is_std_array(_type):
+            params = get_std_array_params(_type)
+            n_bytes += int(params['N']) * np.dtype(cpp_to_np_types[params['T']]).itemsize
+        elif is_std_vector(_type) or is_std_string(_type):
+            if n_bytes > 0:
+                framing.append(n_bytes)
+                n_bytes = 0
+            framing.append(None)
+        else:
+            raise ValueError('Unsupported type "' + arg['type'] + '"')
+    if n_bytes > 0:
+        framing.append(n_bytes)
+    return framing
+
+def reply_framing(ret_type):
+    if ret_type is None or ret_type.strip() in ('', 'void'):
+        return []
+    ret_type = ret_type.strip()
+    if ret_type in cpp_to_struct_fmt:
+        return [_header.size + struct.calcsize('>' + cpp_to_struct_fmt[ret_type])]
+    if is_std_array(ret_type):
+        params = get_std_array_params(ret_type)
+        return [_header.size + int(params['N']) * np.dtype(cpp_to_np_types[params['T']]).itemsize]
+    if is_std_vector(ret_type) or ret_type in ('std::string', 'const char *', 'const char*'):
+        return [_header.size, None]
+    if is_std_tuple(ret_type):
+        return [TupleStruct(ret_type).size]
+    raise ValueError('Unsupported return type "' + ret_type + '"')
+
+def recv_framed(sock, framing, parts):
+    ''' Receive a message framed by framing, appending its buffers to parts '''
+    for step in framing:
+        if step is None:
+            length = sock_recv_all(sock, _length.size)
+            parts.append(length)
+            step = _length.unpack(length)[0]
+        parts.append(sock_recv_all(sock, step))
+    return parts
+
+# --------------------------------------------
+# Proxy
+# --------------------------------------------
+
+class ProxySession(object):
+    ''' Connection of a local client '''
+    def __init__(self, sock):
+        self.sock = sock
+        self.requests = collections.deque()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR) # Interrupt recv() in read_requests
+        except socket.error:
+            pass
+        self.sock.close()
+
+class KoheronProxy(object):
+    def __init__(self, host='', port=36000, unixsock='', path=None):
+        self.board = KoheronClient(host=host, port=port, unixsock=unixsock)
+        if path is None:
+            make_proxy_dir()
+            path = default_proxy_path(host or os.path.basename(unixsock), port)
+        self.path = path
+        self.framings = {}
+        self.errors = {} # Error messages of the commands not available through the proxy
+        for device in self.board.commands:
+            for cmd in device['functions']:
+                key = (device['id'], cmd['id'])
+                name = '{}::{}'.format(device['class'], cmd['name'])
+                try:
+                    req_framing = request_framing(cmd['args'])
+                except (ValueError, KeyError) as e:
+                    self.errors[key] = '{}: {}'.format(name, e)
+                    continue
+                try:
+                    rep_framing = reply_framing(cmd.get('ret_type'))
+                except ValueError as e:
+                    self.errors[key] = '{}: {}'.format(name, e)
+                    rep_framing = None
+                self.framings[key] = (req_framing, rep_framing)
+
+        # KServer::get_version and KServer::get_cmds are answered by the proxy
+        self.local_replies = {
+            (1, 0): self.dynamic_reply(1, 0, self.board.server_version),
+            (1, 1): self.dynamic_reply(1, 1, json.dumps(self.board.commands))
+        }
+
+        # Sessions with pending requests, served in turn
+        self.ready = collections.deque()
+        self.cond = threading.Condition()
+        self.running = False
+        self.listener = None
+        self.sessions = set()
+
+    @staticmethod
+    def dynamic_reply(class_id, func_id, string):
+        data = string.encode('utf8')
+        return _dynamic_header.pack(0, class_id, func_id, len(data)) + data
+
+    def serve_forever(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        os.chmod(self.path, 0o600) # Only the user of the proxy can connect to it
+        self.listener.listen(64)
+        self.running = True
+        worker = threading.Thread(target=self.serve_board)
+        worker.daemon = True
+        worker.start()
+        try:
+            while self.running:
+                try:
+                    sock, _ = self.listener.accept()
+                except socket.error:
+                    break
+                session = ProxySession(sock)
+                with self.cond:
+                    if not self.running:
+                        session.close()
+                        break
+                    self.sessions.add(session)
+                thread = threading.Thread(target=self.read_requests, args=(session,))
+                thread.daemon = True
+                thread.start()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+            listener, self.listener = self.listener, None
+            sessions, self.sessions = self.sessions, set()
+        # The clients waiting for a reply get a ConnectionError
+        for session in sessions:
+            session.close()
+        if listener is not None:
+            try:
+                listener.shutdown(socket.SHUT_RDWR) # Interrupt accept()
+            except socket.error:
+                pass
+            listener.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def read_requests(self, session):
+        close = True
+        try:
+            while self.running:
+                header = sock_recv_all(session.sock, _header.size)
+                _, device_id, cmd_id = _header.unpack(header)
+                key = (device_id, cmd_id)
+                if key in self.local_replies:
+                    self.push(session, (None, self.local_replies[key]))
+                    continue
+                if key not in self.framings:
+                    # The arguments cannot be framed: reply with an error, then close the session
+                    message = self.errors.get(key, 'Unknown command {}::{}'.format(device_id, cmd_id))
+                    self.push(session, (None, error_reply(device_id, cmd_id, message)))
+                    self.push(session, (None, None))
+                    close = False
+                    break
+                req_framing, rep_framing = self.framings[key]
+                request = recv_framed(session.sock, req_framing, [header])
+                if rep_framing is None:
+                    self.push(session, (None, error_reply(device_id, cmd_id, self.errors[key])))
+                else:
+                    self.push(session, (request, rep_framing))
+        except (ConnectionError, socket.error):
+            pass
+        finally:
+            if close:
+                self.close_session(session)
+
+    def close_session(self, session):
+        with self.cond:
+            self.sessions.discard(session)
+        session.close()
+
+    def push(self, session, request):
+        with self.cond:
+            session.requests.append(request)
+            if len(session.requests) == 1:
+                self.ready.append(session)
+                self.cond.notify()
+
+    def pop(self):
+        ''' Take one request of the next session (round robin) '''
+        with self.cond:
+            while not self.ready and self.running:
+                self.cond.wait()
+            if not self.running:
+                return None, None
+            session = self.ready.popleft()
+            request = session.requests.popleft()
+            if session.requests:
+                self.ready.append(session)
+            return session, request
+
+    def serve_board(self):
+        while True:
+            session, request = self.pop()
+            if session is None:
+                return
+            parts, framing = request
+            if parts is None and framing is None: # End of the session
+                self.close_session(session)
+                continue
+            if parts is None: # Local reply
+                reply = [framing]
+            else:
+                try:
+                    sock_send_all(self.board.sock, parts)
+                    # The reply is always read, to keep the board connection in sync
+                    reply = recv_framed(self.board.sock, framing, [])
+                except ConnectionError:
+                    self.shutdown()
+                    return
+            if reply and not session.closed:
+                try:
+                    sock_send_all(session.sock, reply)
+                except ConnectionError:
+                    pass
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+import numpy as np
+
+# One entry per recorded frame: sequence number, timestamp (s) and number of elements
+index_dtype = np.dtype([('seq', '<u8'), ('timestamp', '<f8'), ('length', '<u4')])
+
+class RecordChunk(object):
+    ''' Frames [start, start + size) of the data file, mapped in memory '''
+    def __init__(self, data_file, start, size, shape, dtype):
+        self.start = start
+        offset = start * int(np.prod(shape)) * dtype.itemsize
+        self.frames = np.memmap(data_file, dtype=dtype, mode='r+', offset=offset, shape=(size,) + shape)
+        self.index = np.zeros(size, dtype=index_dtype)
+
+class Recording(object):
+    ''' Background acquisition into a file
+
+    The method (a @command method of a driver) is called repeatedly, like in
+    Stream, and each frame is received in place into a memory-mapped slot of
+    the data file at path:
+
+        with client.record(adc.get_adc, 'adc.bin', frames=100000) as recording:
+            recording.wait()
+        frames, index = load_recording('adc.bin')
+
+    The file grows by chunks of chunk_frames frames. A writer thread maps the
+    next chunks ahead of the acquisition, and flushes the full chunks and
+    their index (path + '.index', see index_dtype) to disk, so the acquisition
+    thread never waits for the disk. The dtype, shape and number of frames are
+    written to path + '.json'.
+
+    A frame of a std::vector can be shorter than the first frame (its length is
+    in the index) but not longer.
+    '''
+    def __init__(self, method, path, frames=None, args=(), chunk_frames=1024, ahead=2):
+        if chunk_frames < 1:
+            raise ValueError('chunk_frames must be at least 1')
+        self.method = method
+        self.path = path
+        self.frames = frames
+        self.args = args
+        self.chunk_frames = chunk_frames
+        self.ahead = ahead
+        self.chunks = {} # Mapped chunks by chunk number
+        self.n_acquired = 0
+        self.n_written = 0
+        self.error = None
+        self.running = False
+        self.acquisition_thread = None
+        self.writer_thread = None
+        self.cond = threading.Condition()
+
+    def start(self):
+        ''' Acquire the first frame to size the file and start the acquisition and writer threads '''
+        timestamp = time.time()
+        frame = np.asarray(self.method(*self.args))
+        self.shape = frame.shape
+        self.dtype = frame.dtype
+        self.frame_nbytes = frame.nbytes
+        self.data_file = open(self.path, 'w+b')
+        self.index_file = open(self.path + '.index', 'wb')
+        self._write_header()
+        self._map(0)
+        self._store(self.chunks[0], 0, 0, timestamp, frame)
+        self.n_acquired = 1
+        self.running = True
+        self.acquisition_thread = threading.Thread(target=self._acquire)
+        self.writer_thread = threading.Thread(target=self._write)
+        for thread in (self.acquisition_thread, self.writer_thread):
+            thread.daemon = True
+            thread.start()
+        return self
+
+    def _write_header(self):
+        with open(self.path + '.json', 'w') as f:
+            json.dump({'dtype': self.dtype.str, 'shape': list(self.shape), 'frames': self.n_written}, f)
+
+    def _map(self, n):
+        start = n * self.chunk_frames
+        self.data_file.truncate((start + self.chunk_frames) * self.frame_nbytes)
+        chunk = RecordChunk(self.data_file, start, self.chunk_frames, self.shape, self.dtype)
+        with self.cond:
+            self.chunks[n] = chunk
+            self.cond.notify_all()
+
+    def _store(self, chunk, slot, seq, timestamp, frame):
+        if not np.may_share_memory(frame, chunk.frames[slot]):
+            chunk.frames[slot].reshape(-1)[:frame.size] = frame.reshape(-1)
+        chunk.index[slot] = (seq, timestamp, frame.size)
+
+    def _acquire(self):
+        try:
+            while self.running and (self.frames is None or self.n_acquired < self.frames):
+                seq = self.n_acquired
+                n, slot = divmod(seq, self.chunk_frames)
+                with self.cond:
+                    while n not in self.chunks and self.running:
+                        self.cond.wait()
+                    if not self.running:
+                        break
+                    chunk = self.chunks[n]
+                timestamp = time.time()
+                frame = self.method(*self.args, out=chunk.frames[slot])
+                self._store(chunk, slot, seq, timestamp, frame)
+                with self.cond:
+                    self.n_acquired += 1
+                    self.cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.cond:
+                self.running = False
+                self.cond.notify_all()
+
+    def _flush(self, n, n_frames):
+        with self.cond:
+            chunk = self.chunks.pop(n)
+        chunk.frames.flush()
+        self.index_file.write(chunk.index[:n_frames].tobytes())
+        self.index_file.flush()
+        self.n_written += n_frames
+
+    def _write(self):
+        n_mapped = 1 # Number of chunks mapped
+        n_flushed = 0 # Number of chunks written
+        try:
+            while True:
+                with self.cond:
+                    while (self.running and n_mapped > self.n_acquired // self.chunk_frames + self.ahead
+                           and n_flushed == self.n_acquired // self.chunk_frames):
+                        self.cond.wait()
+                    running = self.running
+                    n_full = self.n_acquired // self.chunk_frames
+                if running and n_mapped <= n_full + self.ahead:
+                    self._map(n_mapped)
+                    n_mapped += 1
+                elif n_flushed < n_full:
+                    self._flush(n_flushed, self.chunk_frames)
+                    n_flushed += 1
+                elif not running:
+                    break
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+            with self.cond:
+                self.running = False
+                self.cond.notify_all()
+        # The last frame may still be received into its chunk
+        self.acquisition_thread.join()
+        try:
+            while self.n_written < self.n_acquired:
+                self._flush(n_flushed, min(self.chunk_frames, self.n_acquired - self.n_written))
+                n_flushed += 1
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+        finally:
+            self._close()
+
+    def _close(self):
+        # Unmap before truncating the file to the recorded frames
+        self.chunks.clear()
+        self.data_file.truncate(self.n_written * self.frame_nbytes)
+        self.data_file.close()
+        self.index_file.close()
+        self._write_header()
+
+    def stop(self):
+        ''' Stop the acquisition and wait for the frames to be written '''
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.wait()
+
+    def wait(self, timeout=None):
+        ''' Wait for the end of the recording (frames recorded, stop or error) '''
+        for thread in (self.acquisition_thread, self.writer_thread):
+            if thread is not None and thread is not threading.current_thread():
+                thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        if not self.running and self.acquisition_thread is None:
+            self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+def load_recording(path, mode='r'):
+    ''' Frames (memory-mapped array of shape (frames,) + frame shape) and index of a recording '''
+    with open(path + '.json') as f:
+        header = json.load(f)
+    dtype = np.dtype(header['dtype'])
+    shape = (header['frames'],) + tuple(header['shape'])
+    if header['frames'] == 0:
+        frames = np.empty(shape, dtype=dtype)
+    else:
+        frames = np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+    return frames, np.fromfile(path + '.index', dtype=index_dtype)
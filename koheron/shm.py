@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+''' Fan-out of acquired frames to several processes through shared memory (Python >= 3.8)
+
+One process owns the connection to the board and publishes the frames
+into a ring buffer in shared memory:
+
+    publisher = FramePublisher('adc', shape=1024, dtype='float32', depth=64)
+    publisher.run(adc.get_adc) # adc.get_adc(out=...) receives in place
+
+Other processes subscribe to the ring buffer and get numpy views on the frames:
+
+    subscriber = FrameSubscriber('adc')
+    for seq, timestamp, frame in subscriber:
+        process(frame)
+
+A frame view is valid until the publisher wraps around to its slot,
+which can be checked with subscriber.is_valid(seq).
+'''
+
+import time
+import numpy as np
+
+from multiprocessing import shared_memory
+
+_magic = 0x4b4f4845524f4e31 # 'KOHERON1'
+_max_ndim = 8
+_dtype_len = 32
+
+# Header fields (int64)
+_MAGIC = 0
+_DEPTH = 1
+_NDIM = 2
+_SHAPE = 3
+_PUBLISHED = _SHAPE + _max_ndim
+_DTYPE = _PUBLISHED + 1
+_header_len = _DTYPE + _dtype_len // 8
+
+# Names of the blocks created by the publishers of this process (and inherited by its forks)
+_published = set()
+
+def _align(n_bytes, alignment=64):
+    return (n_bytes + alignment - 1) // alignment * alignment
+
+class FrameRing(object):
+    ''' Layout of the ring buffer in shared memory
+
+    Header, then per slot sequence numbers, timestamps and lengths, then the frames.
+    A slot sequence number is -1 while the frame is being written.
+    '''
+    def __init__(self, shm, depth, shape, dtype):
+        self.shm = shm
+        self.depth = depth
+        self.shape = shape
+        self.dtype = dtype
+        buf = shm.buf
+        offset = 0
+        self.header = np.ndarray((_header_len,), dtype='int64', buffer=buf, offset=offset)
+        offset = _align(offset + self.header.nbytes)
+        self.seqs = np.ndarray((depth,), dtype='int64', buffer=buf, offset=offset)
+        offset = _align(offset + self.seqs.nbytes)
+        self.timestamps = np.ndarray((depth,), dtype='float64', buffer=buf, offset=offset)
+        offset = _align(offset + self.timestamps.nbytes)
+        self.lengths = np.ndarray((depth,), dtype='int64', buffer=buf, offset=offset)
+        offset = _align(offset + self.lengths.nbytes)
+        self.frames = np.ndarray((depth,) + shape, dtype=dtype, buffer=buf, offset=offset)
+
+    @staticmethod
+    def size(depth, shape, dtype):
+        frame_nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        return (_align(8 * _header_len) + 3 * _align(8 * depth) + depth * frame_nbytes)
+
+    def frame(self, slot):
+        frame = self.frames[slot]
+        if self.lengths[slot] != frame.size:
+            frame = frame.reshape(-1)[:self.lengths[slot]]
+        return frame
+
+class FramePublisher(object):
+    ''' Owner of a shared memory ring buffer of frames
+
+    Args:
+        name: Name of the shared memory block
+        shape: Shape of a frame (maximum length for std::vector frames)
+        dtype: Type of the frame elements
+        depth: Number of frames in the ring buffer
+    '''
+    def __init__(self, name, shape, dtype='uint32', depth=64):
+        if depth < 2:
+            raise ValueError('Ring depth must be at least 2')
+        shape = tuple(int(n) for n in np.atleast_1d(shape))
+        if len(shape) > _max_ndim:
+            raise ValueError('Frames can have at most {} dimensions'.format(_max_ndim))
+        dtype = np.dtype(dtype)
+        self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                              size=FrameRing.size(depth, shape, dtype))
+        _published.add(self.shm._name)
+        self.ring = FrameRing(self.shm, depth, shape, dtype)
+        header = self.ring.header
+        header[:] = 0
+        header[_DEPTH] = depth
+        header[_NDIM] = len(shape)
+        header[_SHAPE:_SHAPE + len(shape)] = shape
+        header[_DTYPE:].view('S{}'.format(_dtype_len))[0] = dtype.str.encode()
+        self.ring.seqs[:] = -1
+        header[_MAGIC] = _magic
+        self.n_published = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _begin(self):
+        seq = self.n_published
+        slot = seq % self.ring.depth
+        self.ring.seqs[slot] = -1
+        return seq, slot
+
+    def _commit(self, seq, slot, timestamp, length):
+        self.ring.timestamps[slot] = timestamp
+        self.ring.lengths[slot] = length
+        self.ring.seqs[slot] = seq
+        self.n_published = seq + 1
+        self.ring.header[_PUBLISHED] = self.n_published
+        return seq
+
+    def publish(self, frame, timestamp=None):
+        ''' Copy a frame into the ring buffer and return its sequence number '''
+        frame = np.asarray(frame)
+        seq, slot = self._begin()
+        self.ring.frames[slot].reshape(-1)[:frame.size] = frame.reshape(-1)
+        return self._commit(seq, slot, timestamp or time.time(), frame.size)
+
+    def receive(self, method, *args):
+        ''' Receive a frame in place by calling method(*args, out=slot)
+
+        The method is a @command method passing out to recv_array or recv_vector.
+        '''
+        seq, slot = self._begin()
+        timestamp = time.time()
+        frame = method(*args, out=self.ring.frames[slot])
+        return self._commit(seq, slot, timestamp, frame.size)
+
+    def run(self, method, args=(), frames=None):
+        ''' Receive frames until frames have been published (forever if None) '''
+        n_frames = 0
+        while frames is None or n_frames < frames:
+            self.receive(method, *args)
+            n_frames += 1
+
+    def close(self):
+        self.ring = None
+        self.shm.close()
+        self.shm.unlink()
+        _published.discard(self.shm._name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+def _attach(name):
+    # Subscribers must not unlink the shared memory when they exit
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError: # Python < 3.13: the block is registered to the resource tracker
+        shm = shared_memory.SharedMemory(name=name)
+        # The registration of a block created here is the one of its publisher:
+        # the resource tracker keeps one per name
+        if shm._name not in _published:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+class FrameSubscriber(object):
+    ''' Reader of the ring buffer of a FramePublisher
+
+    Iterating yields (sequence number, timestamp, frame) for the frames
+    published after the subscription. Frames overwritten before being read
+    are counted in dropped.
+    '''
+    def __init__(self, name, poll_interval=1e-4):
+        self.shm = _attach(name)
+        header = np.ndarray((_header_len,), dtype='int64', buffer=self.shm.buf)
+        if header[_MAGIC] != _magic:
+            raise ValueError('{} is not a koheron frame ring'.format(name))
+        depth = int(header[_DEPTH])
+        shape = tuple(int(n) for n in header[_SHAPE:_SHAPE + header[_NDIM]])
+        dtype = np.dtype(header[_DTYPE:].view('S{}'.format(_dtype_len))[0].decode())
+        self.ring = FrameRing(self.shm, depth, shape, dtype)
+        self.poll_interval = poll_interval
+        self.next_seq = int(self.ring.header[_PUBLISHED])
+        self.dropped = 0
+
+    def is_valid(self, seq):
+        ''' True if frame seq has not been overwritten '''
+        return self.ring.seqs[seq % self.ring.depth] == seq
+
+    def read(self, timeout=None):
+        ''' Wait for the next frame and return (sequence number, timestamp, frame)
+
+        Returns None on timeout.
+        '''
+        start = time.time()
+        depth = self.ring.depth
+        while True:
+            published = int(self.ring.header[_PUBLISHED])
+            if published > self.next_seq:
+                # The slot of frame published - depth may be being overwritten
+                oldest = published - depth + 1
+                if self.next_seq < oldest:
+                    self.dropped += oldest - self.next_seq
+                    self.next_seq = oldest
+                seq = self.next_seq
+                self.next_seq += 1
+                slot = seq % depth
+                timestamp = self.ring.timestamps[slot]
+                frame = self.ring.frame(slot)
+                if self.is_valid(seq):
+                    return seq, timestamp, frame
+                self.dropped += 1
+                continue
+            if timeout is not None and time.time() - start > timeout:
+                return None
+            time.sleep(self.poll_interval)
+
+    def __iter__(self):
+        while True:
+            yield self.read()
+
+    def close(self):
+        self.ring = None
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
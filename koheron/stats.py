@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+''' Per command instrumentation of KoheronClient
+
+The time of a command is split into phases:
+    encode: encoding of the arguments
+    send: sending of the request
+    wait: first read of the reply (until the server answers)
+    recv: following reads of the reply
+    decode: rest of the decorated function (decoding of the reply)
+'''
+
+import threading
+import time
+
+timer = getattr(time, 'perf_counter', time.time)
+
+phases = ('encode', 'send', 'wait', 'recv', 'decode')
+
+class CommandStats(object):
+    ''' Counters of one (device, command) '''
+    def __init__(self):
+        self.calls = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.time = dict((phase, 0.0) for phase in phases)
+        self.max_time = dict((phase, 0.0) for phase in phases)
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'bytes_out': self.bytes_out,
+            'bytes_in': self.bytes_in,
+            'time': dict(self.time),
+            'max_time': dict(self.max_time)
+        }
+
+class StatsRecorder(object):
+    ''' Accumulate the phases of the commands called through @command
+
+    If provided, callback(device_name, cmd_name, sample) is called after each
+    command, with sample a dict of the bytes sent and received and of the phase times.
+    Commands called inside a pipeline are not recorded.
+    '''
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.commands = {}
+        self.lock = threading.Lock()
+        self.key = None
+
+    def begin(self, device_name, cmd_name):
+        self.key = (device_name, cmd_name)
+        self.sample = dict((phase, 0.0) for phase in phases)
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.n_reads = 0
+        self.start = timer()
+
+    def add_send(self, encode_time, send_time, n_bytes):
+        if self.key is not None:
+            self.sample['encode'] += encode_time
+            self.sample['send'] += send_time
+            self.bytes_out += n_bytes
+
+    def add_recv(self, recv_time, n_bytes):
+        if self.key is not None:
+            self.sample['wait' if self.n_reads == 0 else 'recv'] += recv_time
+            self.n_reads += 1
+            self.bytes_in += n_bytes
+
+    def add_late_recv(self, key, recv_time, n_bytes):
+        ''' Count a read of the reply of the command key after its end (e.g. of the chunks of a VectorChunks) '''
+        with self.lock:
+            stats = self.commands.get(key)
+            if stats is not None:
+                stats.bytes_in += n_bytes
+                stats.time['recv'] += recv_time
+
+    def end(self):
+        sample = self.sample
+        sample['decode'] = max(0.0, timer() - self.start - sum(sample.values()))
+        key, self.key = self.key, None
+        with self.lock:
+            stats = self.commands.get(key)
+            if stats is None:
+                stats = self.commands[key] = CommandStats()
+            stats.calls += 1
+            stats.bytes_out += self.bytes_out
+            stats.bytes_in += self.bytes_in
+            for phase in phases:
+                stats.time[phase] += sample[phase]
+                stats.max_time[phase] = max(stats.max_time[phase], sample[phase])
+        if self.callback is not None:
+            sample = dict(sample, bytes_out=self.bytes_out, bytes_in=self.bytes_in)
+            self.callback(key[0], key[1], sample)
+
+    def stats(self):
+        ''' Dict of the counters, keyed by (device name, command name) '''
+        with self.lock:
+            return dict((key, stats.as_dict()) for key, stats in self.commands.items())
+
+    def reset(self):
+        with self.lock:
+            self.commands = {}
+
+def prometheus_text(stats, prefix='koheron_command'):
+    ''' Prometheus text exposition of the stats returned by StatsRecorder.stats() '''
+    metrics = [
+        ('calls_total', 'counter', 'Number of calls', lambda s: [('', s['calls'])]),
+        ('bytes_sent_total', 'counter', 'Bytes sent', lambda s: [('', s['bytes_out'])]),
+        ('bytes_received_total', 'counter', 'Bytes received', lambda s: [('', s['bytes_in'])]),
+        ('seconds_total', 'counter', 'Cumulative time per phase',
+         lambda s: [(',phase="{}"'.format(phase), s['time'][phase]) for phase in phases]),
+        ('seconds_max', 'gauge', 'Maximum time per phase',
+         lambda s: [(',phase="{}"'.format(phase), s['max_time'][phase]) for phase in phases])
+    ]
+    lines = []
+    for name, metric_type, description, values in metrics:
+        name = '{}_{}'.format(prefix, name)
+        lines.append('# HELP {} {}'.format(name, description))
+        lines.append('# TYPE {} {}'.format(name, metric_type))
+        for (device_name, cmd_name), s in sorted(stats.items()):
+            for labels, value in values(s):
+                lines.append('{}{{device="{}",command="{}"{}}} {}'.format(
+                             name, device_name, cmd_name, labels, repr(value)))
+    return '\n'.join(lines) + '\n'
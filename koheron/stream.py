@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import numpy as np
+
+from .koheron import OutputTooSmallError
+
+class Stream(object):
+    ''' Background acquisition into a preallocated ring buffer
+
+    The method (a @command method of a driver) is called repeatedly on a
+    background thread. It must accept an out keyword argument that it passes
+    to recv_array or recv_vector, so each frame is received in place into
+    a slot of the ring buffer:
+
+        class Adc(object):
+            @command()
+            def get_adc(self, out=None):
+                return self.client.recv_array(1024, dtype='float32', out=out)
+
+        with client.stream(adc.get_adc, depth=64) as stream:
+            for frame in stream:
+                process(frame)
+
+    The acquisition never waits for the consumer. If the consumer is late by
+    more than depth frames, the oldest frames are overwritten: they are counted
+    in overruns (by the acquisition thread) and dropped (by the consumer).
+    A yielded frame is a view on the ring buffer, valid until the acquisition
+    wraps around to its slot: valid(seq) tells whether the frame seq is still
+    intact, and the frames overwritten while the consumer was processing them
+    are counted in torn.
+
+    The slots are sized from the first frame, or for std::vector frames from
+    max_length elements if it is larger. A longer frame cannot be received in
+    place: it is lost (counted in lost) and the ring buffer is enlarged for
+    the following frames.
+
+    The client is used from the acquisition thread: other threads must not use
+    it while streaming, unless it is thread-safe.
+    '''
+    def __init__(self, method, depth=64, args=(), frames=None, max_length=None):
+        if depth < 2:
+            raise ValueError('Stream depth must be at least 2')
+        self.method = method
+        self.depth = depth
+        self.args = args
+        self.frames = frames
+        self.max_length = max_length
+        self.buffer = None
+        self.lengths = np.zeros(depth, dtype='int64')
+        # Sequence number of the frame in each slot (-1 while the slot is written)
+        self.seqs = np.full(depth, -1, dtype='int64')
+        self.timestamps = np.zeros(depth, dtype='float64')
+        self.n_acquired = 0
+        self.n_read = 0
+        self.overruns = 0
+        self.dropped = 0
+        self.torn = 0
+        self.lost = 0
+        self.error = None
+        self.running = False
+        self.thread = None
+        self.cond = threading.Condition()
+
+    def start(self):
+        ''' Acquire the first frame to allocate the ring buffer and start the acquisition thread '''
+        timestamp = time.time()
+        frame = np.asarray(self.method(*self.args))
+        shape = frame.shape
+        if self.max_length is not None and frame.ndim == 1:
+            shape = (max(self.max_length, frame.size),)
+        self.buffer = np.zeros((self.depth,) + shape, dtype=frame.dtype)
+        self._store(0, timestamp, frame)
+        self.seqs[0] = 0
+        self.n_acquired = 1
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def _store(self, slot, timestamp, frame):
+        if not np.may_share_memory(frame, self.buffer[slot]):
+            self.buffer[slot].reshape(-1)[:frame.size] = frame.reshape(-1)
+        self.lengths[slot] = frame.size
+        self.timestamps[slot] = timestamp
+
+    def _run(self):
+        try:
+            while self.running and (self.frames is None or self.n_acquired < self.frames):
+                seq = self.n_acquired
+                slot = seq % self.depth
+                if seq - self.n_read >= self.depth - 1:
+                    self.overruns += 1
+                timestamp = time.time()
+                self.seqs[slot] = -1
+                try:
+                    frame = self.method(*self.args, out=self.buffer[slot])
+                except OutputTooSmallError as e:
+                    self.lost += 1
+                    self._grow(e.n_bytes)
+                    continue
+                self._store(slot, timestamp, frame)
+                with self.cond:
+                    self.seqs[slot] = seq
+                    self.n_acquired += 1
+                    self.cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.cond:
+                self.running = False
+                self.cond.notify_all()
+
+    def _grow(self, n_bytes):
+        ''' Enlarge the slots to n_bytes (std::vector frames) '''
+        if self.buffer.ndim != 2:
+            raise ValueError('Only the slots of 1D frames can be enlarged')
+        buffer = np.zeros((self.depth, n_bytes // self.buffer.dtype.itemsize), dtype=self.buffer.dtype)
+        with self.cond:
+            buffer[:, :self.buffer.shape[1]] = self.buffer
+            self.buffer = buffer
+
+    def valid(self, seq):
+        ''' True if the frame seq has not been overwritten in the ring buffer '''
+        return self.seqs[seq % self.depth] == seq
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def items(self, timeout=None):
+        ''' Generator of (sequence number, timestamp, frame) '''
+        while True:
+            with self.cond:
+                while self.n_read == self.n_acquired and self.running and self.error is None:
+                    if not self.cond.wait(timeout) and timeout is not None:
+                        return
+                if self.error is not None:
+                    raise self.error
+                if self.n_read == self.n_acquired:
+                    return # Acquisition stopped
+                # The slot of frame n_acquired - depth is being overwritten
+                oldest = self.n_acquired - self.depth + 1
+                if self.n_read < oldest:
+                    self.dropped += oldest - self.n_read
+                    self.n_read = oldest
+                seq = self.n_read
+                self.n_read += 1
+                slot = seq % self.depth
+                frame = self.buffer[slot]
+                if self.lengths[slot] != frame.size:
+                    frame = frame.reshape(-1)[:self.lengths[slot]]
+                timestamp = self.timestamps[slot]
+            try:
+                yield seq, timestamp, frame
+            finally:
+                # Overwritten while the consumer was processing it
+                if not self.valid(seq):
+                    self.torn += 1
+
+    def __iter__(self):
+        for seq, timestamp, frame in self.items():
+            yield frame
+
+    def __enter__(self):
+        if not self.running and self.thread is None:
+            self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import asyncio
+import pytest
+import numpy as np
+
+sys.path = [".."] + sys.path
+from koheron import AsyncKoheronClient, async_command, ConnectionError
+from koheron.aio import connect_all
+
+class Tests:
+    def __init__(self, client):
+        self.client = client
+
+    @async_command()
+    async def read_uint(self):
+        return await self.client.recv_uint32()
+
+    @async_command()
+    async def read_double(self):
+        return await self.client.recv_double()
+
+    @async_command()
+    async def set_unsigned(self, u8, u16, u32):
+        return await self.client.recv_bool()
+
+    @async_command()
+    async def send_std_array2(self, mul):
+        return await self.client.recv_array(512, dtype='uint32')
+
+    @async_command()
+    async def send_std_vector2(self, out=None):
+        return await self.client.recv_vector(dtype='uint32', out=out)
+
+    @async_command()
+    async def rcv_std_vector2(self, u, f, vec, d, i):
+        return await self.client.recv_bool()
+
+    @async_command()
+    async def get_std_string(self):
+        return await self.client.recv_string()
+
+    @async_command()
+    async def get_tuple(self):
+        return await self.client.recv_tuple('Idd?')
+
+unixsock = os.getenv('PYTEST_UNIXSOCK','/tmp/kserver_local.sock')
+port = int(os.getenv('PYTEST_PORT', '36000'))
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+@pytest.fixture(params=['tcp', 'unix'])
+def client(request):
+    if request.param == 'tcp':
+        client = AsyncKoheronClient('127.0.0.1', port)
+    else:
+        client = AsyncKoheronClient(unixsock=unixsock)
+    run(client.connect())
+    yield client
+    client.close()
+    run(client.wait_closed())
+
+def test_sequential(client):
+    async def main():
+        tests = Tests(client)
+        assert await tests.read_uint() == 301062138
+        assert abs(await tests.read_double() - 2.2250738585072009) < 1E-14
+        assert await tests.set_unsigned(255, 65535, 4294967295)
+        assert await tests.get_std_string() == 'Hello World !'
+        tup = await tests.get_tuple()
+        assert tup[0] == 501762438
+    run(main())
+
+def test_outstanding_requests(client):
+    async def main():
+        tests = Tests(client)
+        vec = np.log(np.arange(8192, dtype='float32') + 1)
+        out = np.zeros(20, dtype='uint32')
+        return await asyncio.gather(
+            tests.send_std_array2(10),
+            tests.rcv_std_vector2(4223453, 3.141592, vec, 2.654798454646, -56789),
+            tests.send_std_vector2(out=out),
+            *[tests.read_uint() for i in range(50)])
+    results = run(main())
+    assert np.array_equal(results[0], 10 * np.arange(512))
+    assert results[1]
+    assert np.array_equal(results[2], np.arange(20) ** 2)
+    assert results[3:] == [301062138] * 50
+
+def test_connect_all():
+    async def main():
+        clients = await connect_all(['127.0.0.1'] * 20, port)
+        values = await asyncio.gather(*[Tests(client).read_uint() for client in clients])
+        for client in clients:
+            client.close()
+        return values
+    assert run(main()) == [301062138] * 20
+
+def test_connect_all_error(monkeypatch):
+    connect = AsyncKoheronClient.connect
+    clients = []
+    async def connect_or_fail(self):
+        clients.append(self)
+        if self.host == 'bad':
+            raise ConnectionError('Failed to connect to bad')
+        return await connect(self)
+    monkeypatch.setattr(AsyncKoheronClient, 'connect', connect_or_fail)
+    with pytest.raises(ConnectionError):
+        run(connect_all(['127.0.0.1', 'bad', '127.0.0.1'], port))
+    # The connected clients are closed
+    assert len(clients) == 3
+    assert not any(client.is_connected for client in clients)
+
+def test_async_context():
+    async def main():
+        async with AsyncKoheronClient('127.0.0.1', port) as client:
+            assert await Tests(client).read_uint() == 301062138
+        return client
+    client = run(main())
+    assert client.writer is None and client.closing_writer is None
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+''' Encoding and decoding benchmarks against the in-repo mock server
+
+Requires pytest-benchmark. Run with `make benchmark`, which fails when a
+benchmark is slower than the saved baseline by more than BENCHMARK_FAIL.
+'''
+
+import pytest
+import numpy as np
+
+pytest.importorskip('pytest_benchmark')
+
+from koheron import KoheronClient, command
+from koheron.koheron import make_command, build_payload
+from .mock_server import MockServer, MockDevice, MockCommand
+
+sizes = [1024, 65536, 1048576]
+
+vectors = dict((n, np.arange(n, dtype='float32')) for n in sizes)
+
+benchmarks_device = MockDevice('Benchmarks', [
+    MockCommand('read_uint', [], 'uint32_t', lambda: 42),
+    MockCommand('set_params', ['uint32_t', 'float', 'double', 'bool'], 'void', lambda u, f, d, b: None),
+    MockCommand('get_bytes', ['uint32_t'], 'std::vector<uint8_t>', lambda n: np.zeros(n, dtype='uint8')),
+    MockCommand('get_vector', ['uint32_t'], 'std::vector<float>', lambda n: vectors[n]),
+    MockCommand('get_array', [], 'std::array<float, 65536>', lambda: vectors[65536]),
+    MockCommand('set_vector', ['std::vector<float>'], 'uint32_t', lambda v: v.size)
+])
+
+class Benchmarks(object):
+    def __init__(self, client):
+        self.client = client
+
+    @command()
+    def read_uint(self):
+        return self.client.recv_uint32()
+
+    @command()
+    def set_params(self, u, f, d, b):
+        pass
+
+    @command()
+    def get_bytes(self, n):
+        self.client.recv_dynamic_length()
+        return self.client.recv_all(n)
+
+    @command()
+    def get_vector(self, n, out=None):
+        return self.client.recv_vector(dtype='float32', out=out)
+
+    @command()
+    def get_array(self, out=None):
+        return self.client.recv_array(65536, dtype='float32', out=out)
+
+    @command()
+    def set_vector(self, v):
+        return self.client.recv_uint32()
+
+@pytest.fixture(scope='module')
+def driver():
+    server = MockServer([benchmarks_device]).start()
+    client = KoheronClient(host=server.host, port=server.port)
+    yield Benchmarks(client)
+    client.sock.close()
+    server.stop()
+
+# Encoding
+
+scalar_args = [{'name': 'u', 'type': 'uint32_t'}, {'name': 'f', 'type': 'float'},
+               {'name': 'd', 'type': 'double'}, {'name': 'b', 'type': 'bool'}]
+vector_args = [{'name': 'u', 'type': 'uint32_t'}, {'name': 'v', 'type': 'std::vector<float>'}]
+
+def test_make_command_scalars(benchmark):
+    cmd = benchmark(make_command, 2, 3, scalar_args, 42, 3.14, 2.71, True)
+    assert len(cmd) == 8 + 4 + 4 + 8 + 1
+
+@pytest.mark.parametrize('n', sizes)
+def test_make_command_vector(benchmark, n):
+    cmd = benchmark(make_command, 2, 3, vector_args, 42, vectors[n])
+    assert len(cmd) == 8 + 4 + 4 + 4 * n
+
+@pytest.mark.parametrize('n', sizes)
+def test_build_payload(benchmark, n):
+    payload = benchmark(build_payload, vector_args, (42, vectors[n]))
+    assert len(payload) == 4 + 4 + 4 * n
+
+# Round trips
+
+def test_command_dispatch(benchmark, driver):
+    assert benchmark(driver.read_uint) == 42
+
+def test_command_dispatch_no_reply(benchmark, driver):
+    benchmark(driver.set_params, 42, 3.14, 2.71, True)
+    assert driver.read_uint() == 42 # Still in sync
+
+@pytest.mark.parametrize('n', sizes)
+def test_recv_all(benchmark, driver, n):
+    assert len(benchmark(driver.get_bytes, n)) == n
+
+@pytest.mark.parametrize('n', sizes)
+def test_recv_vector(benchmark, driver, n):
+    assert benchmark(driver.get_vector, n).size == n
+
+@pytest.mark.parametrize('n', sizes)
+def test_recv_vector_out(benchmark, driver, n):
+    out = np.empty(n, dtype='float32')
+    assert benchmark(driver.get_vector, n, out=out).size == n
+
+def test_recv_array(benchmark, driver):
+    data = benchmark(driver.get_array)
+    assert np.array_equal(data, vectors[65536])
+
+@pytest.mark.parametrize('n', sizes)
+def test_send_vector(benchmark, driver, n):
+    assert benchmark(driver.set_vector, vectors[n]) == n
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import pytest
+
+sys.path = [".."] + sys.path
+from koheron import KoheronClient
+from koheron.cache import MetadataCache
+from .tests import Tests, port
+
+def test_commands_cache(tmpdir):
+    cache = MetadataCache(str(tmpdir))
+    client = KoheronClient('127.0.0.1', port, cache=cache, instrument='tests-0123456')
+    key = client.cache_key
+    assert key == client.server_version + '/tests-0123456'
+    assert cache.get(key, 'commands') == client.commands
+
+    # The second connection uses the cached table
+    commands = client.commands + [{'class': 'Cached', 'id': len(client.commands) + 2, 'functions': []}]
+    cache.set(key, 'commands', commands)
+    client = KoheronClient('127.0.0.1', port, cache=cache, instrument='tests-0123456')
+    assert 'Cached' in client.devices_idx
+    assert Tests(client).read_uint() == 301062138
+
+    # Another instrument version does not use it
+    client = KoheronClient('127.0.0.1', port, cache=cache, instrument='tests-789abcd')
+    assert 'Cached' not in client.devices_idx
+
+def test_cached():
+    client = KoheronClient('127.0.0.1', port)
+    assert client.cache is None
+    assert client.cached('config', lambda: 42) == 42
+
+def test_cache_without_instrument(tmpdir, caplog):
+    # No HTTP API on the test host: the cache is keyed on the commands table
+    cache = MetadataCache(str(tmpdir))
+    client = KoheronClient('127.0.0.1', port, cache=cache)
+    assert 'Failed to get the live instrument' in caplog.text
+    key = client.cache_key
+    assert key.startswith(client.server_version + '/commands-')
+    assert client.cached('config', lambda: {'name': 'tests'}) == {'name': 'tests'}
+    assert cache.get(key, 'config') == {'name': 'tests'}
+    client = KoheronClient('127.0.0.1', port, cache=cache)
+    assert client.cache_key == key
+    assert client.cached('config', lambda: None) == {'name': 'tests'}
+
+def test_cache_json(tmpdir):
+    cache = MetadataCache(str(tmpdir))
+    cache.set('key', 'commands', [{'class': 'Tests', 'id': 2}])
+    assert os.listdir(str(tmpdir)) == [os.path.basename(cache.filename('key'))]
+    assert cache.filename('key').endswith('.json')
+    assert MetadataCache(str(tmpdir)).get('key', 'commands') == [{'class': 'Tests', 'id': 2}]
+    cache.clear()
+    assert os.listdir(str(tmpdir)) == []
@@ -6,6 +6,7 @@ import os
 import pytest
 import click
 import json
+import numpy as np
 from click.testing import CliRunner
 
 from .. import cli
@@ -46,3 +47,41 @@ def test_sdk_build_exception():
     result = runner.invoke(cli.sdk, ['build', '.'])
     assert result.exit_code == 1
     assert result.output == "Error: '.' is not an instrument directory [No config.yml found]\n"
+
+def test_bench():
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, ['--host=127.0.0.1', 'bench', '-n', '50', '--sizes=16,1024',
+                                     '--recv=Tests.send_std_vector2', '--send=Tests.rcv_std_string', '--json'])
+    assert result.exit_code == 0
+    results = json.loads(result.output)
+    assert [r['workload'] for r in results] == ['latency', 'recv', 'send', 'send']
+    assert results[0]['command'] == 'KServer.get_version'
+    for r in results:
+        assert r['iterations'] == 50
+        assert r['latency_us']['p50'] <= r['latency_us']['p99'] <= r['latency_us']['p99.9']
+        assert sum(r['latency_us']['histogram']['counts']) == 50
+        assert r['commands_per_s'] > 0
+    assert results[3]['bytes_out'] > results[2]['bytes_out']
+
+def test_bench_args():
+    from ..bench import make_args, latency_stats
+    cmd_args = [{'name': 'mul', 'type': 'uint8_t'}, {'name': 'n_pts', 'type': 'uint32_t'},
+                {'name': 'size', 'type': 'uint16_t'}, {'name': 'vec', 'type': 'std::vector<float>'}]
+    args = make_args(cmd_args, 1 << 20)
+    assert args[:3] == [1, 1 << 20, 65535]
+    assert args[3].size == 1 << 20
+    assert make_args([{'name': 'mul', 'type': 'uint32_t'}], 1024) is None
+    assert latency_stats([])['p50'] == 0
+    assert sum(latency_stats([0, 1E-6, 1E-3])['histogram']['counts']) == 3
+
+def test_record(tmpdir):
+    from ..record import load_recording
+    path = str(tmpdir.join('frames.bin'))
+    runner = CliRunner()
+    result = runner.invoke(cli.cli, ['--host=127.0.0.1', 'record', 'Tests.send_std_array2', path, '3',
+                                     '-n', '20', '--chunk-frames', '8'])
+    assert result.exit_code == 0
+    assert result.output == 'Recorded 20 frames to {}\n'.format(path)
+    frames, index = load_recording(path)
+    assert frames.shape == (20, 512)
+    assert (frames == 3 * np.arange(512)).all()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+''' Fixtures shared by the tests
+
+The tests run either against koheron-server (PYTEST_PORT, PYTEST_UNIXSOCK),
+which serves the Tests device (see the Tests driver in tests.py), or against
+devices defined in Python and served by MockServer (see mock_server.py).
+'''
+
+import pytest
+
+from .mock_server import MockServer
+
+@pytest.fixture
+def mock_server():
+    ''' Start a MockServer: mock_server(devices) returns the started server, stopped after the test '''
+    servers = []
+    def start(devices, **kwargs):
+        server = MockServer(devices, **kwargs).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.stop()
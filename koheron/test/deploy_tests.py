@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import socket
+import zipfile
+import pytest
+from click.testing import CliRunner
+
+sys.path = [".."] + sys.path
+from koheron import cli
+from koheron.deploy import deploy, deploy_host
+from koheron import http
+from koheron.http import run_instrument, update_instrument, upload_instrument, is_uploaded, MultipartFile
+from .mock_server import MockHttpApi
+
+@pytest.fixture
+def instrument_zip(tmpdir):
+    filename = str(tmpdir.join('blink-1234567.zip'))
+    with zipfile.ZipFile(filename, 'w') as f:
+        f.writestr('config.yml', 'instrument: blink\n')
+    return filename
+
+@pytest.fixture
+def apis():
+    apis = [MockHttpApi(instruments={'blink': ['0000000', '1111111']}).start() for i in range(4)]
+    yield apis
+    for api in apis:
+        api.stop()
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmpdir, monkeypatch):
+    cache_dir = str(tmpdir.join('cache'))
+    monkeypatch.setenv('KOHERON_CACHE_DIR', cache_dir)
+    return cache_dir
+
+def unused_host():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    host = '127.0.0.1:{}'.format(sock.getsockname()[1])
+    sock.close()
+    return host
+
+def test_api_timeout(monkeypatch):
+    # The host accepts the connection but never replies
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(1)
+    monkeypatch.setattr(http, 'api_timeout', 0.2)
+    with pytest.raises(http.requests.Timeout):
+        http.live_instrument('127.0.0.1:{}'.format(sock.getsockname()[1]))
+    sock.close()
+
+def test_update_instrument(apis, instrument_zip):
+    api = apis[0]
+    update_instrument(api.host, instrument_zip, run=True)
+    assert api.instruments == {'blink': ['1234567']}
+    assert api.live == ('blink', '1234567')
+    assert list(api.uploads.keys()) == ['blink-1234567.zip']
+    assert api.uploads['blink-1234567.zip'] == open(instrument_zip, 'rb').read()
+
+def test_upload_skip(apis, instrument_zip):
+    api = apis[0]
+    api.instruments['blink'].append('1234567')
+    assert is_uploaded(api.host, instrument_zip)
+    assert not upload_instrument(api.host, instrument_zip, run=True)
+    assert ('POST', '/api/instruments/upload') not in api.requests
+    assert api.live == ('blink', '1234567')
+
+    # Already live: no restart
+    n_requests = len(api.requests)
+    assert not upload_instrument(api.host, instrument_zip, run=True)
+    assert ('GET', '/api/instruments/run/blink/1234567') not in api.requests[n_requests:]
+
+    assert upload_instrument(api.host, instrument_zip, run=True, force=True)
+    assert api.requests[-2:] == [('POST', '/api/instruments/upload'), ('GET', '/api/instruments/run/blink/1234567')]
+
+def test_upload_content_hash(apis, instrument_zip, cache_dir):
+    api = apis[0]
+    assert upload_instrument(api.host, instrument_zip, cache=cache_dir)
+    assert not upload_instrument(api.host, instrument_zip, cache=cache_dir)
+    # Rebuilt with the same version
+    with zipfile.ZipFile(instrument_zip, 'a') as f:
+        f.writestr('bitstream.bin', b'\x00' * 1024)
+    assert not is_uploaded(api.host, instrument_zip, cache=cache_dir)
+    assert is_uploaded(api.host, instrument_zip) # Without the hashes
+    assert upload_instrument(api.host, instrument_zip, cache=cache_dir)
+    assert api.uploads['blink-1234567.zip'] == open(instrument_zip, 'rb').read()
+
+def test_update_skip(apis, instrument_zip):
+    api = apis[0]
+    api.instruments['blink'].append('1234567')
+    assert not update_instrument(api.host, instrument_zip)
+    assert api.instruments == {'blink': ['1234567']}
+    assert ('POST', '/api/instruments/upload') not in api.requests
+    # The local store is listed once
+    assert api.requests.count(('GET', '/api/instruments/local')) == 1
+
+def test_upload_progress(apis, tmpdir):
+    filename = str(tmpdir.join('blink-89abcde.zip'))
+    with open(filename, 'wb') as f:
+        f.write(os.urandom(100000))
+    calls = []
+    assert upload_instrument(apis[0].host, filename, progress=lambda n, total: calls.append((n, total)))
+    assert len(calls) > 1
+    assert calls[-1][0] == calls[-1][1] > 100000
+    assert apis[0].uploads['blink-89abcde.zip'] == open(filename, 'rb').read()
+
+def test_multipart_file(tmpdir):
+    filename = str(tmpdir.join('blink-89abcde.zip'))
+    content = os.urandom(10000)
+    with open(filename, 'wb') as f:
+        f.write(content)
+    body = MultipartFile('field', filename)
+    blocks = []
+    while True:
+        block = body.read(1000)
+        if not block:
+            break
+        assert len(block) <= 1000
+        blocks.append(block)
+    body.close()
+    data = b''.join(blocks)
+    assert len(data) == len(body)
+    assert data.startswith('--{}\r\n'.format(body.boundary).encode())
+    assert data.endswith('\r\n--{}--\r\n'.format(body.boundary).encode())
+    assert '\r\n\r\n'.encode() + content + b'\r\n' in data
+
+def test_run_instrument_session(apis):
+    import requests
+    api = apis[0]
+    with requests.Session() as session:
+        assert run_instrument(api.host, 'blink', '1111111', session=session) == ('blink', '1111111')
+        assert run_instrument(api.host, session=session) == ('blink', '1111111')
+    assert api.connections == 1
+
+def test_deploy(apis, instrument_zip):
+    results = deploy([api.host for api in apis], instrument_zip, run=True, workers=2)
+    assert sorted(results.keys()) == sorted(api.host for api in apis)
+    for api in apis:
+        result = results[api.host]
+        assert result.ok and result.error is None and result.attempts == 1
+        assert api.instruments == {'blink': ['1234567']}
+        assert api.live == ('blink', '1234567')
+        # local, 2 deletes, upload and run on one connection
+        assert len(api.requests) == 5
+        assert api.connections == 1
+
+def test_deploy_no_update(apis, instrument_zip):
+    results = deploy([apis[0].host], instrument_zip, update=False)
+    assert results[apis[0].host].ok
+    assert apis[0].instruments == {'blink': ['0000000', '1111111', '1234567']}
+    assert apis[0].live == ('blink', '0000000')
+
+def test_deploy_skip(apis, instrument_zip):
+    apis[0].instruments['blink'].append('1234567')
+    results = deploy([api.host for api in apis], instrument_zip)
+    assert not results[apis[0].host].uploaded
+    assert all(results[api.host].uploaded for api in apis[1:])
+    assert all(api.instruments == {'blink': ['1234567']} for api in apis)
+
+def test_deploy_retry(apis, instrument_zip):
+    apis[1].fail_requests = 1
+    results = deploy([api.host for api in apis], instrument_zip, retry_delay=0.01)
+    assert all(result.ok for result in results.values())
+    assert results[apis[0].host].attempts == 1
+    assert results[apis[1].host].attempts == 2
+
+def test_deploy_failure(apis, instrument_zip):
+    host = unused_host()
+    result = deploy_host(host, instrument_zip, retries=1, retry_delay=0.01, timeout=1)
+    assert not result.ok
+    assert result.attempts == 2
+    assert result.error is not None
+    assert result.as_dict()['ok'] is False
+
+def test_cli_deploy(apis, instrument_zip):
+    runner = CliRunner()
+    hosts = ','.join(api.host for api in apis[:2])
+    result = runner.invoke(cli.cli, ['deploy', '--hosts', hosts, '--hosts', apis[2].host, '--run', instrument_zip])
+    assert result.exit_code == 0
+    for api in apis[:3]:
+        assert '{}: OK, uploaded'.format(api.host) in result.output
+        assert api.live == ('blink', '1234567')
+    assert apis[3].live == ('blink', '0000000')
+
+def test_cli_deploy_failure(apis, instrument_zip):
+    runner = CliRunner()
+    host = unused_host()
+    result = runner.invoke(cli.cli, ['deploy', '--hosts', apis[0].host, '--hosts', host,
+                                     '--retries', '0', '--timeout', '1', instrument_zip])
+    assert result.exit_code == 1
+    assert '{}: FAILED after 1 attempts'.format(host) in result.output
+    assert 'Deployment failed on 1 of 2 hosts' in result.output
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import pytest
+import numpy as np
+
+sys.path = [".."] + sys.path
+from koheron import KoheronClient
+from koheron.koheron import CommandError
+from koheron.driver import make_decoder
+from .mock_server import MockDevice, MockCommand
+
+unixsock = os.getenv('PYTEST_UNIXSOCK','/tmp/kserver_local.sock')
+port = int(os.getenv('PYTEST_PORT', '36000'))
+
+client = KoheronClient('127.0.0.1', port)
+client_unix = KoheronClient(unixsock=unixsock)
+
+@pytest.mark.parametrize('client', [client, client_unix])
+def test_scalars(client):
+    tests = client.driver('Tests')
+    assert tests.read_uint() == 301062138
+    assert tests.read_int() == -214748364
+    assert tests.read_uint64() == 2**63
+    assert abs(tests.read_float() - 3.141592) < 1E-7
+    assert tests.read_double() == 2.2250738585072009
+    assert tests.rcv_many_params(429496729, 2048, 3.14, True)
+    assert tests.set_unsigned(255, 65535, 4294967295)
+
+@pytest.mark.parametrize('client', [client, client_unix])
+def test_containers(client):
+    tests = client.driver('Tests')
+    assert np.array_equal(tests.send_std_array2(10), 10 * np.arange(512))
+    assert np.array_equal(tests.send_std_vector(), np.arange(10, dtype='float32')**3)
+    assert tests.rcv_std_vector(np.arange(8192, dtype='uint32'))
+    assert tests.rcv_std_string('Hello World')
+    assert tests.get_std_string() == 'Hello World !'
+    assert tests.get_cstr() == 'Hello !'
+
+@pytest.mark.parametrize('client', [client, client_unix])
+def test_tuple(client):
+    tests = client.driver('Tests')
+    tup = tests.get_tuple()
+    assert tup[0] == 501762438
+    assert abs(tup[1] - 507.3858) < 5E-6
+    assert tup[3] is True
+
+@pytest.mark.parametrize('client', [client, client_unix])
+def test_out(client):
+    tests = client.driver('Tests')
+    out = np.zeros(512, dtype='uint32')
+    assert tests.send_std_array2(3, out=out) is out
+    assert np.array_equal(out, 3 * np.arange(512))
+
+def test_pipeline():
+    tests = client.driver('Tests')
+    with client.pipeline() as pipe:
+        tests.read_uint()
+        tests.get_std_string()
+    assert pipe.results == [301062138, 'Hello World !']
+
+def test_generated_class():
+    tests = client.driver('Tests')
+    # Shared by the clients with the same commands table
+    assert type(client_unix.driver('Tests')) is type(tests)
+    assert type(tests).__name__ == 'Tests'
+    assert tests.read_uint.__name__ == 'read_uint'
+    assert tests.set_float.__doc__ == 'bool set_float(float {})'.format(
+        client.get_command('Tests', 'set_float').args[0]['name'])
+    with pytest.raises(ValueError):
+        tests.set_float(1.0, 2.0)
+    with pytest.raises(KeyError):
+        client.driver('NotADevice')
+
+def test_unsupported_ret_type():
+    with pytest.raises(ValueError):
+        make_decoder('std::map<int, int>')
+
+def test_unsupported_command(mock_server):
+    server = mock_server([
+        MockDevice('Partial', [
+            MockCommand('get_value', [], 'uint32_t', lambda: 42),
+            MockCommand('get_map', [], 'std::map<uint32_t, float>', lambda: None),
+            MockCommand('get_ulong', [], 'unsigned long', lambda: 1)
+        ])
+    ])
+    client = KoheronClient('127.0.0.1', server.port)
+    partial = client.driver('Partial')
+    # Only the unsupported commands raise
+    assert partial.get_value() == 42
+    with pytest.raises(ValueError) as excinfo:
+        partial.get_map()
+    assert 'Partial::get_map: Unsupported return type' in str(excinfo.value)
+    with pytest.raises(ValueError):
+        partial.get_ulong()
+    assert partial.get_value() == 42
+    client.sock.close()
+
+def test_error_reply(mock_server):
+    errors = [CommandError('Scalar failed'), 7, CommandError('Tuple failed'), (1, 2.5)]
+    server = mock_server([
+        MockDevice('Failing', [
+            MockCommand('get_scalar', [], 'uint32_t', lambda: errors.pop(0)),
+            MockCommand('get_tuple', [], 'std::tuple<uint32_t, float>', lambda: errors.pop(0))
+        ])
+    ])
+    client = KoheronClient('127.0.0.1', server.port)
+    failing = client.driver('Failing')
+    with pytest.raises(CommandError) as excinfo:
+        failing.get_scalar()
+    assert 'Scalar failed' in str(excinfo.value)
+    assert failing.get_scalar() == 7
+    with pytest.raises(CommandError) as excinfo:
+        failing.get_tuple()
+    assert 'Tuple failed' in str(excinfo.value)
+    assert failing.get_tuple() == (1, 2.5)
+    client.sock.close()
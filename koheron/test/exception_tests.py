@@ -29,6 +29,14 @@ class ExceptionTests:
     def std_vector_exception(self):
         return self.client.recv_vector(dtype='float32') # Instead of uint32
 
+    @command(classname='Tests', funcname='send_std_vector2')
+    def std_vector_length_exception(self):
+        return self.client.recv_vector(dtype='S3', check_type=False) # 80 bytes
+
+    @command(classname='Tests', funcname='get_std_string')
+    def get_std_string(self):
+        return self.client.recv_string()
+
     @command()
     def std_array_type_exception(self):
         return self.client.recv_array(shape=10, dtype='uint32') # Instead of float
@@ -41,6 +49,10 @@ class ExceptionTests:
     def std_tuple_exception(self):
         return self.client.recv_uint32() # Instead of tuple
 
+    @command(funcname='std_tuple_exception')
+    def std_tuple_fmt_exception(self):
+        return self.client.recv_tuple('Id') # Instead of If
+
 port = int(os.getenv('PYTEST_PORT', '36000'))
 
 def test_tcp_connect_fail_exception():
@@ -93,6 +105,16 @@ def test_std_vector_exception(port):
         tests.std_vector_exception()
     assert str(excinfo.value) == 'ExceptionTests::std_vector_exception expects elements of type uint32_t.'
 
+@pytest.mark.parametrize('port', [port])
+def test_std_vector_length_exception(port):
+    client = KoheronClient('127.0.0.1', port)
+    tests = ExceptionTests(client)
+    with pytest.raises(ValueError) as excinfo:
+        tests.std_vector_length_exception()
+    assert str(excinfo.value).startswith('Invalid vector length. 80 bytes is not a multiple of the 3 bytes')
+    # The reply was read
+    assert tests.get_std_string() == 'Hello World !'
+
 @pytest.mark.parametrize('port', [port])
 def test_std_array_type_exception(port):
     client = KoheronClient('127.0.0.1', port)
@@ -116,3 +138,11 @@ def test_std_tuple_exception(port):
     with pytest.raises(TypeError) as excinfo:
         tests.std_tuple_exception()
     assert str(excinfo.value) == 'ExceptionTests::std_tuple_exception returns a std::tuple<unsigned int, float>.'
+
+@pytest.mark.parametrize('port', [port])
+def test_std_tuple_fmt_exception(port):
+    client = KoheronClient('127.0.0.1', port)
+    tests = ExceptionTests(client)
+    with pytest.raises(TypeError) as excinfo:
+        tests.std_tuple_fmt_exception()
+    assert str(excinfo.value) == 'ExceptionTests::std_tuple_exception returns a std::tuple<unsigned int, float> (format "If").'
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import socket
+import time
+import pytest
+import numpy as np
+
+sys.path = [".."] + sys.path
+from koheron import KoheronFleet, command
+from .mock_server import MockDevice, MockCommand
+
+class Board(object):
+    def __init__(self, client):
+        self.client = client
+
+    @command()
+    def get_id(self):
+        return self.client.recv_uint32()
+
+    @command(funcname='get_id')
+    def get_even_id(self):
+        board_id = self.client.recv_uint32()
+        if board_id % 2 == 1:
+            raise ValueError('Odd board id')
+        return board_id
+
+    @command()
+    def get_data(self, offset):
+        return self.client.recv_array(16, dtype='float32')
+
+    @command()
+    def wait(self, delay):
+        return self.client.recv_bool()
+
+def board_device(board_id):
+    return MockDevice('Board', [
+        MockCommand('get_id', [], 'uint32_t', lambda: board_id),
+        MockCommand('get_data', ['float'], 'std::array<float, 16>',
+                    lambda offset: board_id + offset + np.arange(16, dtype='float32')),
+        MockCommand('wait', ['double'], 'bool', lambda delay: time.sleep(delay) is None)
+    ])
+
+@pytest.fixture
+def servers(mock_server):
+    return [mock_server([board_device(i)]) for i in range(4)]
+
+def hosts(servers):
+    return ['127.0.0.1:{}'.format(server.port) for server in servers]
+
+def test_fleet_call(servers):
+    with KoheronFleet(hosts(servers)) as fleet:
+        ids = fleet.call(Board, 'get_id')
+        assert list(ids.keys()) == hosts(servers)
+        assert list(ids.values()) == [0, 1, 2, 3]
+        assert fleet.driver(Board).get_id() == ids
+        assert fleet.errors == {}
+
+def test_fleet_stack(servers):
+    with KoheronFleet(hosts(servers)) as fleet:
+        data = fleet.driver(Board).get_data(0.5, stack=True)
+        assert data.shape == (4, 16)
+        assert np.array_equal(data[:, 0], [0.5, 1.5, 2.5, 3.5])
+
+def test_fleet_concurrent(servers):
+    with KoheronFleet(hosts(servers)) as fleet:
+        start = time.time()
+        assert all(fleet.driver(Board).wait(0.2).values())
+        # The boards wait at the same time
+        assert time.time() - start < 0.6
+
+def test_fleet_timeout(servers):
+    servers[1].devices[2].commands[2].func = lambda delay: time.sleep(10 * delay) is None
+    with KoheronFleet(hosts(servers), timeout=0.5) as fleet:
+        results = fleet.driver(Board).wait(0.1)
+        assert list(results.keys()) == hosts(servers)[:1] + hosts(servers)[2:]
+        assert list(fleet.errors.keys()) == [hosts(servers)[1]]
+        # The failed host is left out
+        assert list(fleet.driver(Board).get_id().values()) == [0, 2, 3]
+        time.sleep(0.6)
+        fleet.reconnect()
+        assert fleet.errors == {}
+        assert list(fleet.driver(Board).get_id().values()) == [0, 1, 2, 3]
+
+def test_fleet_connection_error(servers):
+    servers[2].stop()
+    with KoheronFleet(hosts(servers)) as fleet:
+        assert list(fleet.errors.keys()) == [hosts(servers)[2]]
+        assert list(fleet.driver(Board).get_id().values()) == [0, 1, 3]
+
+def test_fleet_decode_error(servers):
+    with KoheronFleet(hosts(servers), timeout=1.0) as fleet:
+        with pytest.raises(ValueError):
+            fleet.driver(Board).get_even_id()
+        # The hosts whose reply failed are closed and left out
+        assert set(fleet.errors.keys()) == set([hosts(servers)[1], hosts(servers)[3]])
+        assert list(fleet.driver(Board).get_even_id().values()) == [0, 2]
+        assert fleet.driver(Board).get_data(0.5, stack=True).shape == (2, 16)
+
+def test_fleet_argument_error(servers):
+    with KoheronFleet(hosts(servers), timeout=1.0) as fleet:
+        with pytest.raises(TypeError):
+            fleet.driver(Board).get_data('x')
+        with pytest.raises(ValueError):
+            fleet.driver(Board).get_data(0.5, 1)
+        # Nothing was sent: the hosts are kept
+        assert fleet.errors == {}
+        assert list(fleet.driver(Board).get_id().values()) == [0, 1, 2, 3]
+
+def test_fleet_empty(servers):
+    for server in servers:
+        server.stop()
+    with KoheronFleet(hosts(servers), timeout=1.0) as fleet:
+        assert len(fleet.errors) == 4
+        assert fleet.driver(Board).get_data(0.5, stack=True).size == 0
+        assert fleet.driver(Board).get_id() == {}
+
+def test_fleet_connect_timeout(servers):
+    # Accepts the connection but never replies
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(1)
+    host = '127.0.0.1:{}'.format(sock.getsockname()[1])
+    start = time.time()
+    with KoheronFleet(hosts(servers) + [host], timeout=0.2) as fleet:
+        assert list(fleet.errors.keys()) == [host]
+        assert list(fleet.driver(Board).get_id().values()) == [0, 1, 2, 3]
+    assert time.time() - start < 2
+    sock.close()
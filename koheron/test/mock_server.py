@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+''' Pure Python stand-in for koheron-server
+
+Serves the koheron-server protocol for devices defined in Python, so the
+client can be tested and benchmarked without hardware or network:
+
+    server = MockServer([
+        MockDevice('Adc', [
+            MockCommand('get_adc', [], 'std::array<float, 1024>', lambda: data)
+        ])
+    ]).start()
+    client = KoheronClient(host='127.0.0.1', port=server.port)
+
+The KServer device (id 1) is always served: get_version (op 0) and
+get_cmds (op 1), which returns the JSON commands table of the devices.
+'''
+
+import json
+import os
+import re
+import socket
+import struct
+import threading
+import numpy as np
+
+try:
+    import socketserver
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError: # Python 2
+    import SocketServer as socketserver
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from ..koheron import (cpp_to_struct_fmt, cpp_to_np_types, is_std_array, is_std_vector,
+                       is_std_string, is_std_tuple, get_std_array_params, get_std_vector_params,
+                       TupleStruct, sock_recv_all, ConnectionError, CommandError, error_reply,
+                       _header, _length, _dynamic_header)
+from ..version import __version__
+
+server_version = __version__ + '.mock'
+
+class MockCommand(object):
+    ''' Command implemented by func, called with the decoded arguments
+
+    If func returns a CommandError, an error reply is sent.
+    '''
+    def __init__(self, name, args, ret_type, func):
+        self.name = name
+        self.args = [{'name': 'arg{}'.format(i), 'type': _type} for i, _type in enumerate(args)]
+        self.ret_type = ret_type
+        self.func = func
+
+class MockDevice(object):
+    def __init__(self, name, commands):
+        self.name = name
+        self.commands = commands
+
+# --------------------------------------------
+# Decode requests / Encode replies
+# --------------------------------------------
+
+def recv_args(sock, cmd_args):
+    args = []
+    for arg in cmd_args:
+        _type = arg['type'].strip()
+        if _type in cpp_to_struct_fmt:
+            fmt = '>' + cpp_to_struct_fmt[_type]
+            args.append(struct.unpack(fmt, sock_recv_all(sock, struct.calcsize(fmt)))[0])
+        elif is_std_array(_type):
+            params = get_std_array_params(_type)
+            dtype = np.dtype(cpp_to_np_types[params['T']])
+            args.append(np.frombuffer(sock_recv_all(sock, int(params['N']) * dtype.itemsize), dtype=dtype))
+        elif is_std_vector(_type):
+            length = _length.unpack(sock_recv_all(sock, _length.size))[0]
+            dtype = cpp_to_np_types[get_std_vector_params(_type)['T']]
+            args.append(np.frombuffer(sock_recv_all(sock, length), dtype=dtype))
+        elif is_std_string(_type):
+            length = _length.unpack(sock_recv_all(sock, _length.size))[0]
+            args.append(sock_recv_all(sock, length).decode('utf8'))
+        else:
+            raise ValueError('Unsupported type "' + arg['type'] + '"')
+    return args
+
+def encode_reply(ret_type, device_id, cmd_id, value):
+    ret_type = ret_type.strip()
+    if ret_type in cpp_to_struct_fmt:
+        return struct.pack('>IHH' + cpp_to_struct_fmt[ret_type], 0, device_id, cmd_id, value)
+    if is_std_array(ret_type):
+        dtype = np.dtype(cpp_to_np_types[get_std_array_params(ret_type)['T']]).newbyteorder('<')
+        return _header.pack(0, device_id, cmd_id) + np.ascontiguousarray(value, dtype=dtype).tobytes()
+    if is_std_vector(ret_type):
+        data = np.ascontiguousarray(value).tobytes()
+        return _dynamic_header.pack(0, device_id, cmd_id, len(data)) + data
+    if ret_type in ('std::string', 'const char *', 'const char*'):
+        data = value.encode('utf8')
+        return _dynamic_header.pack(0, device_id, cmd_id, len(data)) + data
+    if is_std_tuple(ret_type):
+        return TupleStruct(ret_type).pack(device_id, cmd_id, value)
+    raise ValueError('Unsupported return type "' + ret_type + '"')
+
+# --------------------------------------------
+# Server
+# --------------------------------------------
+
+class MockServer(object):
+    ''' Threaded server on a TCP port (0 picks a free port) or a unix socket '''
+    def __init__(self, devices, host='127.0.0.1', port=0, unixsock=''):
+        kserver = MockDevice('KServer', [
+            MockCommand('get_version', [], 'const char *', lambda: server_version),
+            MockCommand('get_cmds', [], 'std::string', lambda: json.dumps(self.commands))
+        ])
+        self.devices = {1: kserver}
+        for i, device in enumerate(devices):
+            self.devices[i + 2] = device
+        self.commands = [{
+            'class': device.name,
+            'id': device_id,
+            'functions': [{'name': cmd.name, 'id': cmd_id, 'args': cmd.args, 'ret_type': cmd.ret_type}
+                          for cmd_id, cmd in enumerate(device.commands)]
+        } for device_id, device in sorted(self.devices.items())]
+
+        server = self
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server.handle(self.request)
+
+        if unixsock:
+            if os.path.exists(unixsock):
+                os.remove(unixsock)
+            self.server = ThreadingUnixServer(unixsock, Handler)
+        else:
+            self.server = ThreadingTCPServer((host, port), Handler)
+        self.host = host
+        self.port = self.server.server_address[1] if not unixsock else None
+        self.unixsock = unixsock
+        self.thread = None
+
+    def handle(self, sock):
+        if not self.unixsock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                _, device_id, cmd_id = _header.unpack(sock_recv_all(sock, _header.size))
+                cmd = self.devices[device_id].commands[cmd_id]
+                value = cmd.func(*recv_args(sock, cmd.args))
+                if isinstance(value, CommandError):
+                    sock.sendall(error_reply(device_id, cmd_id, str(value)))
+                elif cmd.ret_type and cmd.ret_type.strip() != 'void':
+                    sock.sendall(encode_reply(cmd.ret_type, device_id, cmd_id, value))
+        except (ConnectionError, socket.error):
+            pass
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.unixsock and os.path.exists(self.unixsock):
+            os.remove(self.unixsock)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+# --------------------------------------------
+# HTTP API
+# --------------------------------------------
+
+class MockHttpApi(object):
+    ''' Instruments HTTP API of a board (/api/instruments/...)
+
+    instruments is a dict of the versions in the local store by instrument
+    name, and live the (name, version) of the running instrument.
+    The first fail_requests requests fail with a 500 error.
+    '''
+    def __init__(self, instruments=None, live=('blink', '0000000'), host='127.0.0.1', port=0, fail_requests=0):
+        self.instruments = instruments or {live[0]: [live[1]]}
+        self.live = live
+        self.fail_requests = fail_requests
+        self.requests = [] # (method, path)
+        self.uploads = {} # Uploaded zip files by filename
+        self.connections = 0
+
+        api = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                api.connections += 1
+
+            def do_GET(self):
+                api.handle(self, 'GET')
+
+            def do_POST(self):
+                api.handle(self, 'POST')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.host = '{}:{}'.format(host, self.server.server_address[1])
+        self.thread = None
+
+    def handle(self, request, method):
+        self.requests.append((method, request.path))
+        body = b''
+        if 'Content-Length' in request.headers:
+            body = request.rfile.read(int(request.headers['Content-Length']))
+        if self.fail_requests > 0:
+            self.fail_requests -= 1
+            return self.reply(request, 500, {})
+        path = request.path.strip('/').split('/')[2:]
+        if path == ['live']:
+            return self.reply(request, 200, {'name': self.live[0], 'sha': self.live[1]})
+        if path == ['local']:
+            return self.reply(request, 200, self.instruments)
+        if path == ['upload'] and method == 'POST':
+            match = re.search(b'filename="([^"]+)"', body)
+            filename = os.path.basename(match.group(1).decode())
+            content = body.split(b'\r\n\r\n', 1)[1].rsplit(b'\r\n--', 1)[0]
+            self.uploads[filename] = content
+            name, version = filename[:-len('.zip')].rsplit('-', 1)
+            self.instruments.setdefault(name, []).append(version)
+            return self.reply(request, 200, {})
+        if len(path) == 3 and path[0] == 'delete':
+            name, version = path[1:]
+            if version in self.instruments.get(name, []):
+                self.instruments[name].remove(version)
+            return self.reply(request, 200, {})
+        if len(path) == 3 and path[0] == 'run':
+            name, version = path[1:]
+            if version not in self.instruments.get(name, []):
+                return self.reply(request, 404, {})
+            self.live = (name, version)
+            return self.reply(request, 200, {})
+        self.reply(request, 404, {})
+
+    def reply(self, request, status, data):
+        body = json.dumps(data).encode()
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import stat
+import threading
+import time
+import pytest
+import numpy as np
+
+sys.path = [".."] + sys.path
+from koheron import KoheronClient, command
+from koheron.koheron import CommandError, ConnectionError, _header
+from koheron.proxy import KoheronProxy, default_proxy_path, make_proxy_dir, is_user_socket
+from .mock_server import MockDevice, MockCommand
+from .tests import Tests, port
+
+def serve_proxy(port, path):
+    ''' Start a proxy to the server at port, return the proxy and its thread '''
+    proxy = KoheronProxy('127.0.0.1', port, path=path)
+    thread = threading.Thread(target=proxy.serve_forever)
+    thread.daemon = True
+    thread.start()
+    while not os.path.exists(proxy.path):
+        time.sleep(0.01)
+    return proxy, thread
+
+@pytest.fixture(scope='module')
+def proxy():
+    proxy, thread = serve_proxy(port, '/tmp/koheron-proxy-tests.sock')
+    yield proxy
+    proxy.shutdown()
+    thread.join()
+
+def test_proxy_client(proxy):
+    client = KoheronClient(unixsock=proxy.path)
+    assert client.commands == proxy.board.commands
+    tests = Tests(client)
+    assert tests.read_uint() == 301062138
+    assert np.array_equal(tests.send_std_array2(3), 3 * np.arange(512))
+    assert np.array_equal(tests.send_std_vector2(), np.arange(20) ** 2)
+    vec = np.sin(np.arange(8192, dtype='float32'))
+    assert tests.rcv_std_string2('At vero eos', vec, 0.80773675317454, -361148845)
+    assert tests.get_tuple()[0] == 501762438
+
+def test_proxy_many_clients(proxy):
+    errors = []
+    def run(i):
+        try:
+            tests = Tests(KoheronClient(unixsock=proxy.path))
+            with tests.client.pipeline() as pipe:
+                for j in range(20):
+                    tests.send_std_array2(i)
+                    tests.read_uint()
+            for j in range(20):
+                assert np.array_equal(pipe.results[2 * j], i * np.arange(512))
+                assert pipe.results[2 * j + 1] == 301062138
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+class Unsupported(object):
+    def __init__(self, client):
+        self.client = client
+
+    @command()
+    def get_value(self):
+        return self.client.recv_uint32()
+
+    @command()
+    def get_map(self):
+        return self.client.recv(fmt='I')
+
+    @command()
+    def wait(self):
+        return self.client.recv_bool()
+
+@pytest.fixture
+def unsupported_proxy(mock_server):
+    server = mock_server([
+        MockDevice('Unsupported', [
+            MockCommand('get_value', [], 'uint32_t', lambda: 42),
+            MockCommand('get_map', [], 'std::map<uint32_t, float>', lambda: None),
+            MockCommand('wait', [], 'bool', lambda: time.sleep(1) is None)
+        ])
+    ])
+    proxy, thread = serve_proxy(server.port, '/tmp/koheron-proxy-unsupported-tests.sock')
+    yield proxy
+    proxy.shutdown()
+    thread.join()
+
+def test_proxy_socket_mode(proxy):
+    assert stat.S_IMODE(os.stat(proxy.path).st_mode) == 0o600
+
+def test_proxy_unsupported(unsupported_proxy):
+    client = KoheronClient(unixsock=unsupported_proxy.path)
+    driver = Unsupported(client)
+    with pytest.raises(CommandError) as excinfo:
+        driver.get_map()
+    assert 'Unsupported::get_map: Unsupported return type' in str(excinfo.value)
+    # The session is still in sync
+    assert driver.get_value() == 42
+
+    # Unknown command: error reply, then the session is closed
+    client.sock.sendall(_header.pack(0, 99, 0))
+    with pytest.raises(CommandError) as excinfo:
+        client.recv(fmt='I')
+    assert 'Unknown command 99::0' in str(excinfo.value)
+    with pytest.raises(ConnectionError):
+        driver.get_value()
+
+def test_proxy_shutdown(unsupported_proxy):
+    client = KoheronClient(unixsock=unsupported_proxy.path)
+    driver = Unsupported(client)
+    # The client waiting for a reply is disconnected
+    timer = threading.Timer(0.2, unsupported_proxy.shutdown)
+    timer.start()
+    start = time.time()
+    with pytest.raises(ConnectionError):
+        driver.wait()
+    assert time.time() - start < 0.9
+    timer.join()
+
+def test_default_proxy_path(monkeypatch, tmpdir):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmpdir))
+    assert default_proxy_path('192.168.1.10') == str(tmpdir.join('koheron-192.168.1.10-36000.sock'))
+    monkeypatch.delenv('XDG_RUNTIME_DIR')
+    monkeypatch.setattr('tempfile.tempdir', str(tmpdir))
+    directory = make_proxy_dir()
+    assert directory == str(tmpdir.join('koheron-{}'.format(os.getuid())))
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+    assert os.path.dirname(default_proxy_path('192.168.1.10')) == directory
+    # Not private
+    os.chmod(directory, 0o755)
+    with pytest.raises(RuntimeError):
+        make_proxy_dir()
+
+def test_proxy_user_socket(proxy, tmpdir):
+    assert is_user_socket(proxy.path)
+    path = tmpdir.join('file.sock')
+    path.write('')
+    assert not is_user_socket(str(path))
+    assert not is_user_socket(str(tmpdir.join('missing.sock')))
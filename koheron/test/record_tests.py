@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import time
+import json
+import pytest
+import numpy as np
+
+sys.path = [".."] + sys.path
+from koheron import KoheronClient
+from koheron.record import Recording, load_recording
+from .tests import Tests, port
+
+@pytest.mark.parametrize('chunk_frames', [1, 7, 1024])
+def test_record_array(tmpdir, chunk_frames):
+    path = str(tmpdir.join('array.bin'))
+    tests = Tests(KoheronClient('127.0.0.1', port))
+    with tests.client.record(tests.send_std_array2_out, path, frames=50, args=(3,), chunk_frames=chunk_frames) as recording:
+        recording.wait()
+    assert recording.n_written == 50
+    assert os.path.getsize(path) == 50 * 512 * 4
+    frames, index = load_recording(path)
+    assert frames.shape == (50, 512)
+    assert frames.dtype == np.uint32
+    assert (frames == 3 * np.arange(512)).all()
+    assert np.array_equal(index['seq'], np.arange(50))
+    assert (np.diff(index['timestamp']) >= 0).all()
+    assert (index['length'] == 512).all()
+
+def test_record_vector(tmpdir):
+    path = str(tmpdir.join('vector.bin'))
+    tests = Tests(KoheronClient('127.0.0.1', port))
+    recording = tests.client.record(tests.send_std_vector2_out, path, chunk_frames=4)
+    time.sleep(0.05)
+    recording.stop()
+    frames, index = load_recording(path)
+    assert frames.shape[0] == recording.n_written == len(index)
+    assert frames.shape[0] >= 1
+    assert (frames == np.arange(20) ** 2).all()
+    with open(path + '.json') as f:
+        assert json.load(f) == {'dtype': '<u4', 'shape': [20], 'frames': recording.n_written}
+
+def test_record_error(tmpdir):
+    path = str(tmpdir.join('error.bin'))
+    calls = []
+    def method(out=None):
+        calls.append(out)
+        if len(calls) == 10:
+            raise ValueError('Acquisition error')
+        if out is None:
+            out = np.empty(4, dtype='float32')
+        out[:] = len(calls)
+        return out
+    recording = Recording(method, path, chunk_frames=4).start()
+    with pytest.raises(ValueError):
+        recording.wait()
+    frames, index = load_recording(path)
+    # The frames acquired before the error are kept
+    assert frames.shape == (9, 4)
+    assert np.array_equal(frames[:, 0], np.arange(1, 10))
+    # Received in place into the file
+    assert all(isinstance(out, np.memmap) for out in calls[1:])
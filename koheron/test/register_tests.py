@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+import pytest
+import numpy as np
+
+sys.path = [".."] + sys.path
+from koheron import KoheronClient, Common
+from koheron.common import register_records, MemoryConfig
+from .mock_server import MockDevice, MockCommand
+
+instrument_config = {
+    'memory': [
+        {'name': 'control', 'offset': '0x60000000', 'range': '4K'},
+        {'name': 'config', 'offset': '0x40000000', 'range': '4K'},
+        {'name': 'status', 'offset': '0x50000000', 'range': '4K'}
+    ],
+    'config_registers': ['led', 'trigger', 'dac0', 'dac1'],
+    'status_registers': ['adc0', 'adc1', 'counter']
+}
+
+class Board(object):
+    ''' Config and status maps of a board (1024 uint32 registers each) '''
+    def __init__(self):
+        self.cfg = np.zeros(1024, dtype='uint32')
+        self.sts = np.zeros(1024, dtype='uint32')
+        self.sts[:8] = np.arange(8) # bitstream_id
+        self.sts[8:10] = [0x89abcdef, 0x1234567] # dna
+        self.sts[10:13] = [101, 102, 103]
+        self.calls = []
+
+    def call(self, name, func):
+        def wrapper(*args):
+            self.calls.append(name)
+            return func(*args)
+        return wrapper
+
+    def write(self, offset, value):
+        self.cfg[offset // 4] = value
+
+    def device(self):
+        return MockDevice('Common', [
+            MockCommand('cfg_write', ['uint32_t', 'uint32_t'], 'void', self.call('cfg_write', self.write)),
+            MockCommand('cfg_read', ['uint32_t'], 'uint32_t', self.call('cfg_read', lambda offset: self.cfg[offset // 4])),
+            MockCommand('sts_read', ['uint32_t'], 'uint32_t', self.call('sts_read', lambda offset: self.sts[offset // 4])),
+            MockCommand('cfg_read_all', [], 'std::array<uint32_t, 1024>', self.call('cfg_read_all', lambda: self.cfg)),
+            MockCommand('sts_read_all', [], 'std::array<uint32_t, 1024>', self.call('sts_read_all', lambda: self.sts)),
+            MockCommand('get_instrument_config', [], 'std::string', lambda: json.dumps(instrument_config))
+        ])
+
+@pytest.fixture
+def board(mock_server):
+    board = Board()
+    server = mock_server([board.device()])
+    board.common = Common(KoheronClient('127.0.0.1', server.port))
+    yield board
+    board.common.client.sock.close()
+
+def test_sts_snapshot(board):
+    sts = board.common.sts_snapshot()
+    assert board.calls == ['sts_read_all']
+    assert sts['adc0'] == 101
+    assert sts.counter == 103
+    assert sts.dna == 0x123456789abcdef
+    assert np.array_equal(sts.bitstream_id, np.arange(8))
+    assert sorted(sts.keys()) == ['adc0', 'adc1', 'bitstream_id', 'counter', 'dna']
+    assert 'adc1' in sts and 'led' not in sts
+    assert sts.as_dict()['adc1'] == 102
+    with pytest.raises(AttributeError):
+        sts.led
+
+def test_cfg_snapshot(board):
+    board.common.cfg_write(board.common.mem_cfg.cfg['dac1'], 42)
+    cfg = board.common.cfg_snapshot()
+    assert cfg.dac1 == 42
+    assert cfg['led'] == 0
+    assert len(cfg) == 4
+
+def test_register_records(board):
+    common = board.common
+    snapshots = []
+    for i in range(5):
+        board.sts[12] = i
+        snapshots.append(common.sts_read_all())
+    records = register_records(np.stack(snapshots), common.mem_cfg.sts_dtype)
+    assert records.shape == (5,)
+    assert np.array_equal(records['counter'], np.arange(5))
+    assert (records['adc0'] == 101).all()
+
+def test_cfg_cache(board):
+    common = board.common
+    board.cfg[0] = 7
+    with common.cfg_cache() as cfg:
+        assert board.calls == ['cfg_read_all']
+        cfg['led'] = 7 # Same value: dropped
+        cfg['dac0'] = 1
+        cfg['dac0'] = 2 # Coalesced
+        cfg.write(common.mem_cfg.cfg['dac1'], 3)
+        cfg['trigger'] = 4
+        cfg['trigger'] = 0 # Back to the board value: dropped
+        assert cfg['dac0'] == 2
+        assert board.calls == ['cfg_read_all']
+    # cfg_write has no reply: wait for the reply of a following command
+    assert common.cfg_read(common.mem_cfg.cfg['dac1']) == 3
+    assert board.calls == ['cfg_read_all', 'cfg_write', 'cfg_write', 'cfg_read']
+    assert list(board.cfg[:4]) == [7, 0, 2, 3]
+    # Nothing changed since the flush
+    cfg['dac0'] = 2
+    assert cfg.flush() == 0
+    cfg['dac0'] = 5
+    assert cfg.flush() == 1
+    assert common.cfg_read(common.mem_cfg.cfg['dac0']) == 5
+
+def test_cfg_cache_exception(board):
+    with pytest.raises(RuntimeError):
+        with board.common.cfg_cache() as cfg:
+            cfg['led'] = 1
+            raise RuntimeError
+    assert board.calls == ['cfg_read_all']
+    assert cfg.dirty
+    cfg.refresh()
+    assert not cfg.dirty and cfg['led'] == 0
+
+def test_cfg_cache_pipeline(board):
+    cfg = board.common.cfg_cache()
+    cfg['dac1'] = 9
+    with board.common.client.pipeline() as pipe:
+        cfg.flush()
+        board.common.cfg_read(board.common.mem_cfg.cfg['dac1'])
+    assert pipe.results == [None, 9]
+    # Written once the pipeline is executed
+    assert cfg.flush() == 0
+    cfg['dac1'] = 10
+    with pytest.raises(RuntimeError):
+        with board.common.client.pipeline():
+            assert cfg.flush() == 1
+            raise RuntimeError # The pipeline is not executed
+    assert cfg.flush() == 1
+    assert board.common.cfg_read(board.common.mem_cfg.cfg['dac1']) == 10
+    assert cfg.flush() == 0
+
+def test_cfg_cache_invalid_write(board):
+    cfg = board.common.cfg_cache()
+    for offset in (2, -4, 4096):
+        with pytest.raises(ValueError):
+            cfg.write(offset, 1)
+    for value in (-1, 1 << 32):
+        with pytest.raises(ValueError):
+            cfg['dac0'] = value
+    assert not cfg.dirty
+
+bitfields = {
+    'counter': {'overflow': [0, 1], 'count': [8, 16], 'state': [24, 8]},
+    'trigger': {'enable': [0, 1], 'mode': [1, 2]}
+}
+
+def test_bitfields_decode():
+    mem_cfg = MemoryConfig(instrument_config, bitfields)
+    assert list(mem_cfg.bitfields['counter']) == ['overflow', 'count', 'state']
+    # Stack of status snapshots
+    n = 10**6
+    data = np.zeros((n, 16), dtype='uint32') # First words of the maps
+    counts = np.arange(n, dtype='uint32') % 65536
+    data[:, 12] = (np.arange(n) % 2) | (counts << 8) | (np.uint32(0xab) << 24)
+    fields = mem_cfg.decode('counter', data)
+    assert np.array_equal(fields['overflow'], np.arange(n) % 2)
+    assert np.array_equal(fields['count'], counts)
+    assert (fields['state'] == 0xab).all()
+    assert mem_cfg.decode('counter', data[1])['count'] == 1
+
+def test_bitfields_encode():
+    mem_cfg = MemoryConfig(dict(instrument_config, bitfields={'trigger': bitfields['trigger']}))
+    value = mem_cfg.encode('trigger', enable=1, mode=3)
+    assert value == 7
+    assert mem_cfg.encode('trigger', value, mode=0) == 1
+    assert np.array_equal(mem_cfg.encode('trigger', [0, 6], enable=[1, 0]), [1, 6])
+    with pytest.raises(ValueError):
+        mem_cfg.encode('trigger', mode=4)
+    with pytest.raises(KeyError):
+        mem_cfg.encode('trigger', speed=1)
+    with pytest.raises(KeyError):
+        MemoryConfig(instrument_config, {'unknown': {'bit': [0, 1]}})
+    with pytest.raises(ValueError):
+        MemoryConfig(instrument_config, {'led': {'bits': [30, 4]}})
+
+def test_bitfields_cfg_cache(board):
+    common = board.common
+    common.mem_cfg.add_bitfields('trigger', bitfields['trigger'])
+    with common.cfg_cache() as cfg:
+        cfg['trigger'] = common.mem_cfg.encode('trigger', cfg['trigger'], enable=1, mode=2)
+    fields = common.mem_cfg.decode('trigger', common.cfg_read_all())
+    assert fields['enable'] == 1 and fields['mode'] == 2
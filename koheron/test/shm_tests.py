@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import uuid
+import multiprocessing
+import pytest
+import numpy as np
+
+sys.path = [".."] + sys.path
+from koheron import KoheronClient
+from .tests import Tests, port
+
+# multiprocessing.shared_memory requires Python >= 3.8
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 8), reason='requires Python >= 3.8')
+if sys.version_info >= (3, 8):
+    from koheron.shm import FramePublisher, FrameSubscriber
+
+def unique_name(prefix):
+    return '{}_{}'.format(prefix, uuid.uuid4().hex[:12])
+
+def subscribe(name, n_frames, ready, results):
+    subscriber = FrameSubscriber(name)
+    ready.set()
+    frames = []
+    for i in range(n_frames):
+        seq, timestamp, frame = subscriber.read(timeout=5)
+        frames.append((seq, int(frame.sum()), len(frame)))
+    subscriber.close()
+    results.put(frames)
+
+def test_publish_subscribe():
+    tests = Tests(KoheronClient('127.0.0.1', port))
+    n_frames = 20
+    with FramePublisher(unique_name('koheron_test_shm'), shape=512, dtype='uint32', depth=64) as publisher:
+        ready = [multiprocessing.Event() for i in range(3)]
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=subscribe, args=(publisher.name, n_frames, ready[i], results))
+                     for i in range(3)]
+        for process in processes:
+            process.start()
+        for event in ready:
+            assert event.wait(10)
+        for i in range(n_frames):
+            publisher.receive(tests.send_std_array2_out, i)
+        frames = [results.get(timeout=10) for process in processes]
+        for process in processes:
+            process.join()
+    expected = [(i, int(i * np.arange(512).sum()), 512) for i in range(n_frames)]
+    assert frames == [expected] * 3
+
+def test_vector_frames():
+    tests = Tests(KoheronClient('127.0.0.1', port))
+    with FramePublisher(unique_name('koheron_test_shm_vec'), shape=64, dtype='uint32', depth=4) as publisher:
+        subscriber = FrameSubscriber(publisher.name)
+        publisher.receive(tests.send_std_vector2_out)
+        seq, timestamp, frame = subscriber.read(timeout=1)
+        assert seq == 0
+        assert np.array_equal(frame, np.arange(20) ** 2)
+        # Overwritten frames are dropped
+        publisher.run(tests.send_std_vector2_out, frames=10)
+        seq, timestamp, frame = subscriber.read(timeout=1)
+        assert seq == 8
+        assert subscriber.dropped == 7
+        del frame
+        subscriber.close()
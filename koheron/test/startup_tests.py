@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Guard the startup time of the package and of the command line interface.
+
+import sys
+import os
+import subprocess
+import time
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+max_overhead_ms = float(os.getenv('KOHERON_STARTUP_MAX_MS', '100'))
+
+def run_python(code):
+    env = dict(os.environ, PYTHONPATH=root)
+    return subprocess.check_output([sys.executable, '-c', code], env=env).decode()
+
+def startup_time(code, n_runs=7):
+    ''' Median execution time (ms) of a Python process running code '''
+    env = dict(os.environ, PYTHONPATH=root)
+    times = []
+    for i in range(n_runs):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', code], env=env)
+        times.append(1000 * (time.time() - start))
+    return sorted(times)[n_runs // 2]
+
+loaded_modules = 'import sys; print(" ".join(m for m in ["numpy", "requests", "koheron.koheron"] if m in sys.modules))'
+
+def test_import_is_lazy():
+    assert run_python('import koheron; ' + loaded_modules).strip() == ''
+
+def test_cli_version_is_lazy():
+    code = 'from koheron.cli import cli; cli(["version"], standalone_mode=False); ' + loaded_modules
+    output = run_python(code).split('\n')
+    assert output[1].strip() == ''
+
+def test_lazy_attributes():
+    output = run_python('import koheron; koheron.KoheronClient; ' + loaded_modules)
+    assert output.strip() == 'numpy requests koheron.koheron'
+
+def test_cli_version_startup_time():
+    overhead = (startup_time('from koheron.cli import cli; cli(["version"], standalone_mode=False)')
+                - startup_time('pass'))
+    assert overhead < max_overhead_ms
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import pytest
+import numpy as np
+
+sys.path = [".."] + sys.path
+from koheron import KoheronClient
+from koheron.stats import phases
+from .tests import Tests, port, unixsock
+
+client = KoheronClient('127.0.0.1', port)
+client_unix = KoheronClient(unixsock=unixsock)
+
+@pytest.mark.parametrize('client', [client, client_unix])
+def test_stats_disabled(client):
+    client.disable_stats()
+    assert Tests(client).read_uint() == 301062138
+    assert client.stats() == {}
+
+@pytest.mark.parametrize('client', [client, client_unix])
+def test_stats(client):
+    client.enable_stats()
+    tests = Tests(client)
+    for i in range(10):
+        assert tests.read_uint() == 301062138
+    assert tests.send_std_array2(1)[1] == 1
+    assert tests.rcv_std_vector(np.arange(8192, dtype='uint32'))
+
+    stats = client.stats()
+    assert sorted(stats.keys()) == [('Tests', 'rcv_std_vector'), ('Tests', 'read_uint'), ('Tests', 'send_std_array2')]
+
+    s = stats[('Tests', 'read_uint')]
+    assert s['calls'] == 10
+    assert s['bytes_out'] == 10 * 8
+    assert s['bytes_in'] == 10 * 12
+    for phase in phases:
+        assert 0 <= s['max_time'][phase] <= s['time'][phase]
+    assert s['time']['wait'] > 0
+
+    s = stats[('Tests', 'send_std_array2')]
+    assert s['bytes_out'] == 8 + 4
+    assert s['bytes_in'] == 8 + 512 * 4
+
+    s = stats[('Tests', 'rcv_std_vector')]
+    assert s['bytes_out'] == 8 + 4 + 8192 * 4
+    assert s['bytes_in'] == 8 + 1
+    client.disable_stats()
+
+def test_stats_vector_chunks(tmpdir):
+    client.enable_stats()
+    tests = Tests(client)
+    # Chunks read after the command returned
+    chunks = [chunk.copy() for chunk in tests.send_std_vector2_chunks(chunk_size=12)]
+    assert len(chunks) == 7
+    path = str(tmpdir.join('vector.bin'))
+    with open(path, 'wb') as f:
+        assert tests.send_std_vector2_to(sink=f) == 80
+    stats = client.stats()
+    client.disable_stats()
+    s = stats[('Tests', 'send_std_vector2')]
+    assert s['calls'] == 2
+    assert s['bytes_in'] == 2 * (12 + 80)
+
+def test_stats_send_error():
+    client.enable_stats()
+    tests = Tests(client)
+    with pytest.raises(ValueError):
+        tests.set_unsigned(256, 0, 0) # uint8_t overflow
+    assert client.recorder.key is None
+    assert tests.read_uint() == 301062138
+    stats = client.stats()
+    client.disable_stats()
+    assert stats[('Tests', 'read_uint')]['calls'] == 1
+
+def test_stats_callback():
+    samples = []
+    client.enable_stats(callback=lambda device_name, cmd_name, sample: samples.append((device_name, cmd_name, sample)))
+    Tests(client).read_uint()
+    client.disable_stats()
+    assert len(samples) == 1
+    device_name, cmd_name, sample = samples[0]
+    assert (device_name, cmd_name) == ('Tests', 'read_uint')
+    assert sample['bytes_out'] == 8 and sample['bytes_in'] == 12
+    assert all(sample[phase] >= 0 for phase in phases)
+
+def test_stats_pipeline_not_recorded():
+    client.enable_stats()
+    tests = Tests(client)
+    with client.pipeline():
+        result = tests.read_uint()
+    assert result.result() == 301062138
+    assert client.stats() == {}
+    client.disable_stats()
+
+def test_stats_prometheus():
+    client.enable_stats()
+    Tests(client).read_uint()
+    text = client.stats_prometheus()
+    client.disable_stats()
+    assert '# TYPE koheron_command_calls_total counter' in text
+    assert 'koheron_command_calls_total{device="Tests",command="read_uint"} 1\n' in text
+    assert 'koheron_command_seconds_total{device="Tests",command="read_uint",phase="wait"}' in text
+    assert 'koheron_command_seconds_max{device="Tests",command="read_uint",phase="decode"}' in text
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import time
+import pytest
+import numpy as np
+
+sys.path = [".."] + sys.path
+from koheron import KoheronClient, command
+from .mock_server import MockDevice, MockCommand
+from .tests import Tests, port
+
+def test_stream_array():
+    tests = Tests(KoheronClient('127.0.0.1', port))
+    n_frames = 0
+    with tests.client.stream(tests.send_std_array2_out, depth=8, args=(3,), frames=100) as stream:
+        for seq, timestamp, frame in stream.items():
+            assert np.array_equal(frame, 3 * np.arange(512))
+            n_frames += 1
+    assert stream.buffer.shape == (8, 512)
+    assert n_frames + stream.dropped == 100
+
+def test_stream_vector():
+    tests = Tests(KoheronClient('127.0.0.1', port))
+    stream = tests.client.stream(tests.send_std_vector2_out, depth=4)
+    frames = []
+    for frame in stream:
+        frames.append(frame.copy())
+        if len(frames) == 10:
+            break
+    stream.stop()
+    for frame in frames:
+        assert np.array_equal(frame, np.arange(20) ** 2)
+
+def test_stream_overruns():
+    tests = Tests(KoheronClient('127.0.0.1', port))
+    stream = tests.client.stream(tests.send_std_array2_out, depth=4, args=(1,), frames=50)
+    stream.thread.join()
+    seqs = [seq for seq, timestamp, frame in stream.items()]
+    assert seqs == [47, 48, 49]
+    assert stream.dropped == 47
+    assert stream.overruns > 0
+
+class Growing(object):
+    def __init__(self, client):
+        self.client = client
+
+    @command()
+    def get_frame(self, out=None):
+        return self.client.recv_vector(dtype='uint32', out=out)
+
+def growing_device(lengths):
+    lengths = iter(lengths)
+    def get_frame():
+        return np.arange(next(lengths), dtype='uint32')
+    return MockDevice('Growing', [MockCommand('get_frame', [], 'std::vector<uint32_t>', get_frame)])
+
+def test_stream_longer_frame(mock_server):
+    server = mock_server([growing_device([10, 10, 30, 30, 5])])
+    driver = Growing(KoheronClient('127.0.0.1', server.port))
+    stream = driver.client.stream(driver.get_frame, depth=8, frames=4)
+    stream.thread.join()
+    frames = [frame.copy() for frame in stream]
+    # The first frame of 30 elements is lost, the slots are enlarged for the next ones
+    assert stream.error is None
+    assert stream.lost == 1
+    assert stream.buffer.shape == (8, 30)
+    assert [len(frame) for frame in frames] == [10, 10, 30, 5]
+    assert np.array_equal(frames[2], np.arange(30))
+
+def test_stream_max_length(mock_server):
+    server = mock_server([growing_device([10, 10, 30, 30])])
+    driver = Growing(KoheronClient('127.0.0.1', server.port))
+    stream = driver.client.stream(driver.get_frame, depth=8, frames=4, max_length=64)
+    stream.thread.join()
+    assert stream.lost == 0
+    assert [len(frame) for frame in stream] == [10, 10, 30, 30]
+
+def test_stream_torn():
+    tests = Tests(KoheronClient('127.0.0.1', port))
+    with tests.client.stream(tests.send_std_array2_out, depth=4, args=(1,)) as stream:
+        for seq, timestamp, frame in stream.items():
+            assert stream.valid(seq)
+            time.sleep(0.05) # The acquisition wraps around meanwhile
+            assert not stream.valid(seq)
+            break
+    assert stream.torn == 1
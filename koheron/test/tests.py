@@ -7,9 +7,11 @@ import pytest
 import struct
 import numpy as np
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path = [".."] + sys.path
-from koheron import KoheronClient, command, __version__
+from koheron import KoheronClient, command, ConnectionError, __version__
+from koheron.koheron import CommandEncoder
 
 # http://stackoverflow.com/questions/32234169/sha1-string-regex-for-python
 def is_valid_sha1(sha):
@@ -91,6 +93,10 @@ class Tests:
     def send_std_array4(self, add):
         return self.client.recv_array(48, dtype='uint32')
 
+    @command(funcname='send_std_array2')
+    def send_std_array2_out(self, mul, out=None):
+        return self.client.recv_array(512, dtype='uint32', out=out)
+
     @command()
     def send_std_vector(self):
         return self.client.recv_vector(dtype='float32')
@@ -103,6 +109,22 @@ class Tests:
     def send_std_vector3(self):
         return self.client.recv_vector(dtype='int32')
 
+    @command(funcname='send_std_vector2')
+    def send_std_vector2_out(self, out=None):
+        return self.client.recv_vector(dtype='uint32', out=out)
+
+    @command(funcname='send_std_vector2')
+    def send_std_vector2_chunks(self, chunk_size=1 << 20):
+        return self.client.recv_vector_chunks(dtype='uint32', chunk_size=chunk_size)
+
+    @command(funcname='send_std_vector2')
+    def send_std_vector2_chunks_unchecked(self, dtype='uint32'):
+        return self.client.recv_vector_chunks(dtype=dtype, check_type=False)
+
+    @command(funcname='send_std_vector2')
+    def send_std_vector2_to(self, sink=None):
+        return self.client.recv_vector_to(sink, dtype='uint32', chunk_size=32)
+
     @command()
     def rcv_std_array(self, u, f, arr, d, i):
         return self.client.recv_bool()
@@ -191,6 +213,10 @@ class Tests:
     def get_tuple4(self):
         return self.client.recv_tuple('bbhhii')
 
+    @command(funcname='get_tuple2')
+    def get_tuple2_typed(self):
+        return self.client.recv_tuple() # Format compiled from the return type
+
 # Unit Tests
 
 unixsock = os.getenv('PYTEST_UNIXSOCK','/tmp/kserver_local.sock')
@@ -282,6 +308,82 @@ def test_send_std_vector3(tests):
     for i in range(len(array)):
         assert array[i] == -i*i
 
+@pytest.mark.parametrize('tests', [tests, tests_unix])
+def test_send_std_vector2_out(tests):
+    out = np.zeros(32, dtype='uint32')
+    array = tests.send_std_vector2_out(out=out)
+    assert len(array) == 20
+    assert np.shares_memory(array, out)
+    for i in range(len(array)):
+        assert out[i] == i*i
+
+@pytest.mark.parametrize('tests', [tests, tests_unix])
+def test_send_std_vector2_chunks(tests):
+    chunks = [chunk.copy() for chunk in tests.send_std_vector2_chunks(chunk_size=12)]
+    assert [len(chunk) for chunk in chunks] == [3, 3, 3, 3, 3, 3, 2]
+    assert np.array_equal(np.concatenate(chunks), np.arange(20) ** 2)
+    # The chunks not read are discarded
+    with tests.send_std_vector2_chunks(chunk_size=12) as chunks:
+        assert np.array_equal(next(chunks), [0, 1, 4])
+    assert chunks.remaining == 0
+    assert tests.get_std_string() == 'Hello World !'
+
+def test_send_std_vector2_chunks_del():
+    client = KoheronClient('127.0.0.1', port, thread_safe=True)
+    tests = Tests(client)
+    chunks = tests.send_std_vector2_chunks(chunk_size=12)
+    assert np.array_equal(next(chunks), [0, 1, 4])
+    # The chunks not read are discarded and the client unlocked
+    del chunks
+    def try_lock():
+        if client.lock.acquire(False):
+            client.lock.release()
+            return True
+        return False
+    with ThreadPoolExecutor(1) as executor:
+        assert executor.submit(try_lock).result()
+    assert tests.get_std_string() == 'Hello World !'
+    client.sock.close()
+
+def test_send_std_vector2_chunks_thread():
+    client = KoheronClient('127.0.0.1', port, thread_safe=True)
+    tests = Tests(client)
+    chunks = tests.send_std_vector2_chunks(chunk_size=12)
+    with ThreadPoolExecutor(1) as executor:
+        for func in (lambda: next(chunks), chunks.close, lambda: chunks.readinto(bytearray(80))):
+            with pytest.raises(RuntimeError):
+                executor.submit(func).result()
+    # Still usable by the thread that called the command
+    assert len(np.concatenate(list(chunks))) == 20
+    assert tests.get_std_string() == 'Hello World !'
+    client.sock.close()
+
+def test_send_std_vector2_chunks_errors():
+    client = KoheronClient('127.0.0.1', port)
+    tests = Tests(client)
+    with pytest.raises(ValueError):
+        tests.send_std_vector2_chunks_unchecked(dtype='S3') # 80 bytes
+    client = KoheronClient('127.0.0.1', port)
+    tests = Tests(client)
+    with pytest.raises(RuntimeError):
+        with client.pipeline():
+            tests.send_std_vector2_chunks()
+    assert client.pipe is None
+
+@pytest.mark.parametrize('tests', [tests, tests_unix])
+def test_send_std_vector2_to(tests, tmpdir):
+    path = str(tmpdir.join('vector.bin'))
+    with open(path, 'wb') as f:
+        assert tests.send_std_vector2_to(sink=f) == 80
+    assert np.array_equal(np.fromfile(path, dtype='uint32'), np.arange(20) ** 2)
+    out = np.memmap(path, dtype='uint32', mode='r+', shape=(20,))
+    out[:] = 0
+    assert tests.send_std_vector2_to(sink=out) == 80
+    assert np.array_equal(out, np.arange(20) ** 2)
+    with pytest.raises(ValueError):
+        tests.send_std_vector2_to(sink=bytearray(16))
+    assert tests.get_std_string() == 'Hello World !'
+
 @pytest.mark.parametrize('tests', [tests, tests_unix])
 def test_send_std_array(tests):
     array = tests.send_std_array()
@@ -294,6 +396,27 @@ def test_send_std_array2(tests):
     for i in range(len(array)):
         assert array[i] == 10 * i
 
+@pytest.mark.parametrize('tests', [tests, tests_unix])
+def test_send_std_array2_out(tests):
+    out = np.zeros(512, dtype='uint32')
+    array = tests.send_std_array2_out(10, out=out)
+    assert array is out
+    for i in range(len(array)):
+        assert out[i] == 10 * i
+
+@pytest.mark.parametrize('tests', [tests, tests_unix])
+def test_invalid_out(tests):
+    # The reply is consumed before raising: the next command reads its own reply
+    with pytest.raises(TypeError):
+        tests.send_std_array2_out(10, out=np.zeros(512, dtype='float32'))
+    assert tests.get_std_string() == 'Hello World !'
+    with pytest.raises(ValueError):
+        tests.send_std_array2_out(10, out=np.zeros(256, dtype='uint32'))
+    assert tests.get_std_string() == 'Hello World !'
+    with pytest.raises(ValueError):
+        tests.send_std_vector2_out(out=np.zeros((4, 8), dtype='uint32')[:, :4])
+    assert tests.get_std_string() == 'Hello World !'
+
 @pytest.mark.parametrize('tests', [tests, tests_unix])
 def test_send_std_array3(tests):
     array = tests.send_std_array3(5890)
@@ -311,6 +434,11 @@ def test_rcv_std_array(tests):
     arr = np.arange(8192, dtype='uint32')
     assert tests.rcv_std_array(4223453, 3.141592, arr, 2.654798454646, -56789)
 
+@pytest.mark.parametrize('tests', [tests, tests_unix])
+def test_rcv_std_array_2d(tests):
+    arr = np.arange(8192, dtype='uint32').reshape(64, 128)
+    assert tests.rcv_std_array(4223453, 3.141592, arr, 2.654798454646, -56789)
+
 @pytest.mark.parametrize('tests', [tests, tests_unix])
 def test_rcv_std_array2(tests):
     arr = np.log(np.arange(8192, dtype='float32') + 1)
@@ -451,6 +579,10 @@ def test_get_tuple2(tests):
     assert abs(tup[3] - 3.14159265358979323846) < 1E-14
     assert tup[4] == -9223372036854775807
 
+@pytest.mark.parametrize('tests', [tests, tests_unix])
+def test_get_tuple2_typed(tests):
+    assert tests.get_tuple2_typed() == tests.get_tuple2()
+
 @pytest.mark.parametrize('tests', [tests, tests_unix])
 def test_get_tuple3(tests):
     tup = tests.get_tuple3()
@@ -469,3 +601,103 @@ def test_get_tuple4(tests):
     assert tup[3] == 32767
     assert tup[4] == -2147483647
     assert tup[5] == 2147483647
+
+@pytest.mark.parametrize('tests', [tests, tests_unix])
+def test_pipeline(tests):
+    vec = np.log(np.arange(8192, dtype='float32') + 1)
+    with tests.client.pipeline() as pipe:
+        res_uint = tests.read_uint()
+        res_array = tests.send_std_array2(10)
+        for i in range(50):
+            tests.rcv_std_vector2(4223453, 3.141592, vec, 2.654798454646, -56789)
+        res_string = tests.get_std_string()
+    assert len(pipe.results) == 53
+    assert res_uint.result() == 301062138
+    assert np.array_equal(res_array.result(), 10 * np.arange(512))
+    assert all(pipe.results[2:52])
+    assert res_string.result() == 'Hello World !'
+    # Back to synchronous calls
+    assert tests.read_int() == -214748364
+
+def test_pipeline_large_batch():
+    # Large commands and large replies: sent by groups, interleaved with reading
+    tests = Tests(KoheronClient('127.0.0.1', port))
+    vec = np.log(np.arange(8192, dtype='float32') + 1)
+    with tests.client.pipeline() as pipe:
+        for i in range(200):
+            tests.rcv_std_vector2(4223453, 3.141592, vec, 2.654798454646, -56789)
+            tests.send_std_array2(i)
+    assert len(pipe.results) == 400
+    assert all(pipe.results[0::2])
+    assert np.array_equal(pipe.results[-1], 199 * np.arange(512))
+    assert tests.read_int() == -214748364
+
+def test_pipeline_decode_error():
+    client = KoheronClient('127.0.0.1', port)
+    tests = Tests(client)
+    with pytest.raises(TypeError):
+        with client.pipeline():
+            tests.read_uint()
+            tests.send_std_array2_out(10, out=np.zeros(512, dtype='float32'))
+            tests.read_int()
+    # The replies after the error are lost: the connection is closed
+    with pytest.raises(ConnectionError):
+        tests.read_int()
+
+def test_bound_commands():
+    client = KoheronClient('127.0.0.1', port)
+    tests = Tests(client)
+    assert tests.read_uint() == 301062138
+    cmd = client.get_command('Tests', 'read_uint')
+    assert [c for _, c in tests._koheron_commands.values()] == [cmd]
+    assert client.last_command is cmd
+    assert (client.last_device_called, client.last_cmd_called) == ('Tests', 'read_uint')
+
+    # Resolved again after reloading the commands
+    client.load_devices()
+    assert not cmd.valid
+    assert tests.read_uint() == 301062138
+    assert client.last_command is not cmd
+    assert client.last_command is client.get_command('Tests', 'read_uint')
+
+    # and with another client
+    tests.client = client_unix
+    assert tests.read_uint() == 301062138
+    assert client_unix.last_command is client_unix.get_command('Tests', 'read_uint')
+
+def test_command_encoder():
+    cmd_args = [{'name': 'u8', 'type': 'uint8_t'}, {'name': 'i16', 'type': 'int16_t'},
+                {'name': 'f', 'type': 'float'}, {'name': 'arr', 'type': 'std::array<uint32_t, 4>'},
+                {'name': 'b', 'type': 'bool'}, {'name': 'u64', 'type': 'uint64_t'},
+                {'name': 's', 'type': 'std::string'}, {'name': 'vec', 'type': 'std::vector<float>'}]
+    encoder = CommandEncoder(cmd_args)
+    arr = np.arange(4, dtype='uint32')
+    vec = np.ones(3, dtype='float32')
+    parts = encoder.encode_parts(2, 7, (255, -2, 1.5, arr, True, 2**63, 'abc', vec))
+    assert b''.join(bytes(part) for part in parts) == (
+        struct.pack('>IHHBhf', 0, 2, 7, 255, -2, 1.5) + arr.tobytes() +
+        struct.pack('>?QI', True, 2**63, 3) + b'abc' + struct.pack('>I', 12) + vec.tobytes())
+
+def test_command_encoder_exceptions():
+    encoder = CommandEncoder([{'name': 'u8', 'type': 'uint8_t'}, {'name': 'arr', 'type': 'std::array<uint32_t, 2>'},
+                              {'name': 'u32', 'type': 'uint32_t'}])
+    arr = np.zeros(2, dtype='uint32')
+    with pytest.raises(ValueError):
+        encoder.encode_parts(2, 7, (256, arr, 0)) # Out of range
+    with pytest.raises(ValueError):
+        encoder.encode_parts(2, 7, (0, arr, -1)) # Out of range (after a slot)
+    with pytest.raises(TypeError):
+        encoder.encode_parts(2, 7, ('a', arr, 0))
+    with pytest.raises(TypeError):
+        encoder.encode_parts(2, 7, (1.5, arr, 0))
+    with pytest.raises(ValueError):
+        encoder.encode_parts(2, 7, (0, arr)) # Missing argument
+    # Decided from the argument types, not from the struct error message
+    encoder = CommandEncoder([{'name': 'u8', 'type': 'uint8_t'}, {'name': 'f', 'type': 'float'}])
+    with pytest.raises(TypeError):
+        encoder.encode_parts(2, 7, (1, 'x'))
+    with pytest.raises(TypeError):
+        encoder.encode_parts(2, 7, (None, 1.0))
+    with pytest.raises(ValueError):
+        encoder.encode_parts(2, 7, (np.int64(-1), 1))
+    assert len(encoder.encode_parts(2, 7, (np.uint8(3), np.float32(1.5)))) == 1
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import threading
+import time
+import pytest
+import numpy as np
+
+sys.path = [".."] + sys.path
+from koheron import KoheronClient, KoheronPool, ConnectionError
+from .tests import Tests, port
+
+def run_threads(target, n_threads=8):
+    errors = []
+    def run(i):
+        try:
+            target(i)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+def check_calls(tests, i):
+    for j in range(50):
+        assert tests.read_uint() == 301062138
+        assert np.array_equal(tests.send_std_array2(i + j), (i + j) * np.arange(512))
+        assert tests.get_std_string() == 'Hello World !'
+
+def test_thread_safe_client():
+    tests = Tests(KoheronClient('127.0.0.1', port, thread_safe=True))
+    run_threads(lambda i: check_calls(tests, i))
+
+def test_thread_safe_pipeline():
+    tests = Tests(KoheronClient('127.0.0.1', port, thread_safe=True))
+    def target(i):
+        with tests.client.pipeline() as pipe:
+            for j in range(10):
+                tests.send_std_array2(i)
+        for arr in pipe.results:
+            assert np.array_equal(arr, i * np.arange(512))
+    run_threads(target)
+
+def test_pool():
+    pool = KoheronPool('127.0.0.1', size=3, port=port)
+    def target(i):
+        with pool.driver(Tests) as tests:
+            check_calls(tests, i)
+    run_threads(target)
+    assert len(pool.clients) <= 3
+    pool.close()
+
+def test_pool_close():
+    pool = KoheronPool('127.0.0.1', size=2, port=port)
+    idle = pool.acquire()
+    busy = pool.acquire()
+    pool.release(idle)
+    pool.close()
+    assert idle.sock.fileno() == -1
+    # Still usable until released
+    assert Tests(busy).read_uint() == 301062138
+    pool.release(busy)
+    assert busy.sock.fileno() == -1
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+
+def test_pool_discard():
+    pool = KoheronPool('127.0.0.1', size=1, port=port)
+    with pytest.raises(RuntimeError):
+        with pool.driver(Tests) as tests:
+            raise RuntimeError
+    # Closed and replaced by a new connection
+    assert tests.client.sock.fileno() == -1
+    assert pool.clients == []
+    with pool.driver(Tests) as tests_:
+        assert tests_.client is not tests.client
+        assert tests_.read_uint() == 301062138
+    pool.close()
+
+def test_pool_wait():
+    pool = KoheronPool('127.0.0.1', size=1, port=port, timeout=5)
+    client = pool.acquire()
+    start = time.time()
+    with pytest.raises(ConnectionError):
+        pool.acquire(timeout=0)
+    assert time.time() - start < 1
+    # Woken when the connection is discarded
+    threading.Timer(0.1, pool.discard, args=(client,)).start()
+    client_ = pool.acquire()
+    assert client_ is not client and time.time() - start < 1
+    # Woken when the pool is closed
+    threading.Timer(0.1, pool.close).start()
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    assert time.time() - start < 1
+    pool.release(client_)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import pytest
+import numpy as np
+
+sys.path = [".."] + sys.path
+from koheron import KoheronClient, command
+from koheron.koheron import TupleStruct, get_std_tuple_types, same_struct_format
+from .mock_server import MockDevice, MockCommand
+
+status_type = 'std::tuple<uint32_t, std::array<float, 4>, bool, std::array<uint16_t, 3>>'
+
+class Sensor(object):
+    def __init__(self, client):
+        self.client = client
+
+    @command()
+    def get_status(self):
+        return self.client.recv_tuple()
+
+    @command(funcname='get_status')
+    def get_status_fmt(self):
+        return self.client.recv_tuple('>I16s?6s')
+
+    @command(funcname='get_status')
+    def get_status_counted_fmt(self):
+        return self.client.recv_tuple('1I16s1?6s')
+
+    @command(funcname='get_status')
+    def get_status_wrong_fmt(self):
+        return self.client.recv_tuple('I16s?')
+
+    @command()
+    def get_counts(self, fmt=None):
+        return self.client.recv_tuple(fmt)
+
+@pytest.fixture
+def server(mock_server):
+    return mock_server([
+        MockDevice('Sensor', [
+            MockCommand('get_status', [], status_type,
+                        lambda: (42, np.arange(4, dtype='float32') / 2, True, np.array([1, 2, 3]))),
+            MockCommand('get_counts', [], 'std::tuple<uint32_t, uint32_t>', lambda: (3, 4))
+        ])
+    ])
+
+def test_std_tuple_types():
+    assert get_std_tuple_types(status_type) == ['uint32_t', 'std::array<float, 4>', 'bool', 'std::array<uint16_t, 3>']
+    assert get_std_tuple_types('std::tuple<int, double>') == ['int', 'double']
+
+def test_tuple_struct():
+    tuple_struct = TupleStruct(status_type)
+    assert tuple_struct.fmt == 'I16s?6s'
+    assert tuple_struct.size == 8 + 4 + 16 + 1 + 6
+    data = tuple_struct.pack(2, 0, (7, [1, 2, 3, 4], False, [4, 5, 6]))
+    value = tuple_struct.unpack(data)
+    assert value[0] == 7
+    assert np.array_equal(value[1], [1, 2, 3, 4]) and value[1].dtype == np.float32
+    assert value[2] is False
+    assert np.array_equal(value[3], [4, 5, 6]) and value[3].dtype == np.uint16
+    with pytest.raises(ValueError):
+        TupleStruct('std::tuple<uint32_t, std::vector<float>>')
+
+def test_same_struct_format():
+    assert same_struct_format('>2I', 'II')
+    assert same_struct_format('I16s?6s', '!1I16s?6s')
+    assert not same_struct_format('I16s', 'I4f')
+    assert not same_struct_format('Ii', 'II')
+
+def test_recv_tuple(server):
+    client = KoheronClient('127.0.0.1', server.port)
+    sensor = Sensor(client)
+    for status in (sensor.get_status(), sensor.get_status_fmt(), sensor.get_status_counted_fmt()):
+        assert status[0] == 42
+        assert np.array_equal(status[1], np.arange(4) / 2)
+        assert status[2] is True
+        assert np.array_equal(status[3], [1, 2, 3])
+    # Compiled once per command
+    assert client.get_command('Sensor', 'get_status').tuple_struct is client.last_command.tuple_struct
+    with pytest.raises(TypeError):
+        sensor.get_status_wrong_fmt()
+    # The reply was read
+    assert sensor.get_status()[0] == 42
+    client.sock.close()
+
+def test_recv_tuple_unsupported(server):
+    client = KoheronClient('127.0.0.1', server.port)
+    sensor = Sensor(client)
+    # size_t is not supported by TupleStruct: the format given is used
+    cmd = client.get_command('Sensor', 'get_counts')
+    cmd.ret_type = 'std::tuple<uint32_t, size_t>'
+    assert cmd.tuple_struct is None
+    assert sensor.get_counts(fmt='>II') == (3, 4)
+    with pytest.raises(TypeError):
+        sensor.get_counts()
+    client.sock.close()